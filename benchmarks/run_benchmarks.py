@@ -0,0 +1,450 @@
+"""
+Offline benchmarks for the scraping and processing hot paths.
+
+Everything runs on recorded fixtures (the saved Google pages and the municipality list),
+so no network, browser or database is needed; the Mongo push uses mongomock
+(pip install -r benchmarks/requirements.txt).
+
+Usage:
+    python benchmarks/run_benchmarks.py                  # run all, save and compare with the last run
+    python benchmarks/run_benchmarks.py -k price         # only benchmarks whose name contains "price"
+    python benchmarks/run_benchmarks.py --list
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/a.json benchmarks/results/b.json
+
+Each run is saved to benchmarks/results/<timestamp>_<commit>.json with the timings, throughput
+and peak memory of every benchmark. A benchmark whose median time or peak memory grew by more
+than --threshold (default 20%) against the baseline is reported as a regression; with
+--fail-on-regression the script then exits with status 1. A benchmark that raises is
+recorded with its error and the rest still run.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import shutil
+import tempfile
+import statistics
+import subprocess
+import tracemalloc
+import contextlib
+import importlib.util
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DAY2_DIR = os.path.join(ROOT, 'day2(25-6-25)')
+SRC_DIR = os.path.join(ROOT, 'src')
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+# Recorded fixtures
+HTML_FIXTURES = [os.path.join(DAY2_DIR, 'google_response.html'), os.path.join(DAY2_DIR, 'last_google_response.html')]
+MUNICIPALITIES_FILE = os.path.join(ROOT, 'data', 'municipalities.json')
+COORDINATES_FILE = os.path.join(ROOT, 'data', 'uscities.xlsx')
+
+# Both folders have a utils.py; day2 comes first, as in the root scrapper.py
+sys.path.insert(0, SRC_DIR)
+sys.path.insert(0, DAY2_DIR)
+
+BENCHMARKS = []
+
+def benchmark(name, repeat=5, items=None):
+    """
+    Registers a benchmark. The decorated function does the (untimed) setup and returns
+    the zero-argument callable that is timed. `items` is the number of units one call
+    processes, used to report throughput.
+    """
+    def register(setup):
+        BENCHMARKS.append({"name": name, "setup": setup, "repeat": repeat, "items": items})
+        return setup
+    return register
+
+def scratch_dir(name):
+    """A directory for benchmark output inside the run's working directory (removed after the run)."""
+    path = os.path.join(os.getcwd(), name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def read_fixtures():
+    pages = []
+    for path in HTML_FIXTURES:
+        with open(path, 'r', encoding='utf-8') as f:
+            pages.append(f.read())
+    return pages
+
+def load_municipalities():
+    with open(MUNICIPALITIES_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+MUNICIPALITY_COUNT = len(load_municipalities())
+
+# --- Price extraction ---
+
+@benchmark("extract_price_from_text", items=len(HTML_FIXTURES))
+def bench_extract_price_from_text():
+    from config import SERVICES
+    from google_scraper import extract_price_from_text, page_text_from_html
+    texts = [page_text_from_html(page) for page in read_fixtures()]
+    return lambda: [extract_price_from_text(text, svc) for text in texts for svc in SERVICES]
+
+@benchmark("price_extractor.extract_prices", items=len(HTML_FIXTURES))
+def bench_price_extractor():
+    from price_extractor import extract_prices
+    from google_scraper import page_text_from_html
+    texts = [page_text_from_html(page) for page in read_fixtures()]
+    return lambda: [extract_prices(text) for text in texts]
+
+@benchmark("html_text.visible_text", items=len(HTML_FIXTURES))
+def bench_visible_text():
+    from html_text import visible_text
+    pages = read_fixtures()
+    return lambda: [visible_text(page) for page in pages]
+
+@benchmark("extract_prices_from_full_html", items=len(HTML_FIXTURES))
+def bench_extract_prices_from_full_html():
+    # The root Yelp script shares its module name with day2/scrapper.py, so load it by path
+    spec = importlib.util.spec_from_file_location("yelp_scrapper", os.path.join(ROOT, 'scrapper.py'))
+    yelp_scrapper = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(yelp_scrapper)
+    pages = read_fixtures()
+    return lambda: [yelp_scrapper.extract_prices_from_full_html(page) for page in pages]
+
+CLEAN_PRICE_SAMPLES = 10000
+
+@benchmark("clean_price", items=CLEAN_PRICE_SAMPLES)
+def bench_clean_price():
+    from utils import clean_price
+    rng = random.Random(0)
+    formats = ["${:,}", "USD {:,}.00", "from ${}", "{} dollars", "Starting at ${:,}.99", "call for price"]
+    samples = [rng.choice(formats).format(rng.randint(50, 5000)) for _ in range(CLEAN_PRICE_SAMPLES)]
+    return lambda: [clean_price(sample) for sample in samples]
+
+# --- Price statistics ---
+
+SKETCH_SAMPLES = 100000
+
+@benchmark("PriceAggregator.update (city/state/national sketches)", repeat=3, items=SKETCH_SAMPLES)
+def bench_price_aggregator():
+    from price_sketch import PriceAggregator
+    rng = random.Random(0)
+    municipalities = [(m["state"], m["city"]) for m in load_municipalities()[:2000]]
+    samples = [(*rng.choice(municipalities), f"service{rng.randrange(10)}", rng.lognormvariate(5.5, 0.5))
+               for _ in range(SKETCH_SAMPLES)]
+
+    def run():
+        aggregator = PriceAggregator()
+        for state, city, service, price in samples:
+            aggregator.update(state, city, service, price)
+        return aggregator.summary()
+    return run
+
+# --- Interpolation ---
+
+def load_catalog_for_bench():
+    from municipality_catalog import load_catalog
+    return load_catalog(MUNICIPALITIES_FILE, COORDINATES_FILE,
+                        path=os.path.join(scratch_dir('catalog'), 'municipalities.catalog'))
+
+@benchmark("interpolate_missing (all municipalities)", repeat=3, items=MUNICIPALITY_COUNT)
+def bench_interpolate_missing():
+    # interpolate_city (one random same-state sample per row) was replaced by this batch pass
+    import numpy as np
+    import pandas as pd
+    from config import SERVICES
+    from interpolator import interpolate_missing, coordinates_from_catalog
+
+    with load_catalog_for_bench() as catalog:
+        df = pd.DataFrame({"state": catalog.state_names(), "city": catalog.cities()})
+        coords = coordinates_from_catalog(catalog)
+    # Roughly the scrape hit rate: 10% of cities have a price per service
+    rng = np.random.default_rng(0)
+    prices = np.where(rng.random((len(df), len(SERVICES))) < 0.1, rng.integers(100, 500, (len(df), len(SERVICES))), np.nan)
+    price_df = pd.concat([df, pd.DataFrame(prices, columns=SERVICES)], axis=1)
+    return lambda: interpolate_missing(price_df, coords)
+
+@benchmark("city_records (master document assembly)", repeat=3, items=MUNICIPALITY_COUNT)
+def bench_city_records():
+    # Replaces a groupby + iterrows loop with per-cell .at lookups (~15s for all municipalities)
+    import numpy as np
+    import pandas as pd
+    from config import SERVICES
+    from main import city_records
+
+    with load_catalog_for_bench() as catalog:
+        df = pd.DataFrame({"state": catalog.state_names(), "city": catalog.cities()})
+    rng = np.random.default_rng(0)
+    filled = pd.DataFrame(np.where(rng.random((len(df), len(SERVICES))) < 0.01, np.nan, 250.0), columns=SERVICES)
+    interpolated = pd.DataFrame(rng.random((len(df), len(SERVICES))) < 0.9, columns=SERVICES)
+    return lambda: sum(1 for _ in city_records(df, filled, interpolated))
+
+# --- Static pricing pipeline ---
+
+def _process_all(output_dir, profiles=False):
+    from data_processor import process_and_save_municipality
+    municipalities = load_municipalities()
+    return lambda: [process_and_save_municipality(m, output_dir, profiles=profiles) for m in municipalities]
+
+@benchmark("process_and_save_municipality (all, json)", repeat=3, items=MUNICIPALITY_COUNT)
+def bench_process_and_save():
+    return _process_all(scratch_dir('output_json'))
+
+@benchmark("process_and_save_municipality (all, profiles)", repeat=3, items=MUNICIPALITY_COUNT)
+def bench_process_and_save_profiles():
+    return _process_all(scratch_dir('output_profiles'), profiles=True)
+
+@benchmark("columnar store write+read (all)", repeat=3, items=MUNICIPALITY_COUNT)
+def bench_columnar_store():
+    from data_processor import process_municipality, MANDATORY_SERVICES
+    from output_store import ColumnarStoreWriter, read_store
+    municipalities = load_municipalities()
+    path = os.path.join(scratch_dir('output_store'), 'municipalities.repstore')
+
+    def run():
+        with ColumnarStoreWriter(path, MANDATORY_SERVICES) as writer:
+            for m in municipalities:
+                data = process_municipality(m)
+                writer.add(m['state'], m['city'], data["United States"][m['state']][m['city']]["services"])
+        return sum(1 for _ in read_store(path).rows())
+    return run
+
+# --- MongoDB push ---
+
+MONGO_FILES = 2000
+
+@benchmark("push_all_json_in_dir (mongomock)", repeat=3, items=MONGO_FILES)
+def bench_mongo_push():
+    import mongomock
+    from data_processor import process_and_save_municipality
+    from push_to_mongo import push_all_json_in_dir
+    output_dir = scratch_dir('output_mongo')
+    for m in load_municipalities()[:MONGO_FILES]:
+        process_and_save_municipality(m, output_dir)
+    # Re-pushing into the same client also measures the upsert (update) path
+    client = mongomock.MongoClient()
+    return lambda: push_all_json_in_dir(output_dir, client=client)
+
+# --- Price lookup service ---
+
+LOOKUPS = 10000
+HTTP_LOOKUPS = 1000
+
+def _lookup_store(rng, path=""):
+    from data_processor import MANDATORY_SERVICES
+    from output_store import ColumnarStoreWriter
+    writer = ColumnarStoreWriter(path, MANDATORY_SERVICES)
+    for m in load_municipalities():
+        writer.add(m['state'], m['city'], {svc: {"price": rng.randint(100, 500), "interpolation_used": rng.random() < 0.9}
+                                           for svc in MANDATORY_SERVICES})
+    return writer
+
+def _lookup_keys(rng, services, count):
+    """Mostly city lookups, with some state and national rollups mixed in."""
+    municipalities = load_municipalities()
+    keys = []
+    for _ in range(count):
+        m = rng.choice(municipalities)
+        level = rng.random()
+        keys.append((m['state'] if level < 0.95 else None, m['city'] if level < 0.9 else None, rng.choice(services)))
+    return keys
+
+@benchmark("PriceIndex.lookup_encoded (no LRU)", items=LOOKUPS)
+def bench_lookup_uncached():
+    from lookup_service import PriceIndex
+    rng = random.Random(0)
+    index = PriceIndex(_lookup_store(rng).to_store(), cache_size=0)
+    keys = _lookup_keys(rng, index.services, LOOKUPS)
+    return lambda: [index.lookup_encoded(*key) for key in keys]
+
+@benchmark("PriceIndex.lookup_encoded (hot keys in LRU)", items=LOOKUPS)
+def bench_lookup_cached():
+    from lookup_service import PriceIndex
+    rng = random.Random(0)
+    index = PriceIndex(_lookup_store(rng).to_store(), cache_size=LOOKUPS)
+    keys = _lookup_keys(rng, index.services, LOOKUPS)
+    for key in keys:
+        index.lookup_encoded(*key)
+    return lambda: [index.lookup_encoded(*key) for key in keys]
+
+@benchmark("lookup service HTTP round trip (keep-alive)", repeat=3, items=HTTP_LOOKUPS)
+def bench_lookup_http():
+    import http.client
+    from urllib.parse import urlencode
+    from lookup_service import LookupService
+    rng = random.Random(0)
+    path = os.path.join(scratch_dir('lookup'), 'municipalities.repstore')
+    _lookup_store(rng, path).close()
+    service = LookupService(path, reload_interval=0)
+    server = service.serve(0)
+    urls = ["/price?" + urlencode({name: value for name, value in zip(("state", "city", "service"), key) if value})
+            for key in _lookup_keys(rng, service.index.services, HTTP_LOOKUPS)]
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1])
+
+    def run():
+        for url in urls:
+            conn.request("GET", url)
+            conn.getresponse().read()
+    return run
+
+# --- Runner ---
+
+def measure(entry):
+    """
+    Times one benchmark; returns its result dict, a dict with 'skipped' if it can't run here,
+    or a dict with 'error' if it raised (the other benchmarks still run).
+    """
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        try:
+            func = entry["setup"]()
+        except ImportError as e:
+            return {"skipped": f"missing dependency: {e.name or e}"}
+        except Exception as e:
+            return {"error": f"{type(e).__name__}: {e}"}
+        try:
+            func()  # warm-up (imports, caches, first-touch allocations)
+
+            times = []
+            for _ in range(entry["repeat"]):
+                start = time.perf_counter()
+                func()
+                times.append(time.perf_counter() - start)
+
+            tracemalloc.start()
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        except Exception as e:
+            return {"error": f"{type(e).__name__}: {e}"}
+        finally:
+            tracemalloc.stop()
+
+    median = statistics.median(times)
+    result = {
+        "repeat": entry["repeat"],
+        "min": min(times),
+        "median": median,
+        "mean": statistics.mean(times),
+        "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "peak_memory_bytes": peak,
+    }
+    if entry["items"]:
+        result["items"] = entry["items"]
+        result["items_per_second"] = entry["items"] / median if median else None
+    return result
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return "unknown"
+
+def latest_result():
+    """The most recent saved results file, if any."""
+    if not os.path.isdir(RESULTS_DIR):
+        return None
+    files = sorted(f for f in os.listdir(RESULTS_DIR) if f.endswith('.json'))
+    return os.path.join(RESULTS_DIR, files[-1]) if files else None
+
+def compare(baseline, current, threshold):
+    """Prints the change per benchmark; returns the names that regressed."""
+    regressions = []
+    print(f"\nComparison with {baseline.get('commit')} ({baseline.get('timestamp')}):")
+    for name, result in current["benchmarks"].items():
+        before = baseline["benchmarks"].get(name)
+        if not before or "median" not in before:
+            continue
+        if "error" in result:
+            # Ran in the baseline, fails now
+            regressions.append(name)
+            print(f"  {name:<48} FAILED   REGRESSION")
+            continue
+        if "median" not in result:
+            continue
+        time_change = result["median"] / before["median"] - 1 if before["median"] else 0.0
+        memory_change = (result["peak_memory_bytes"] / before["peak_memory_bytes"] - 1
+                         if before["peak_memory_bytes"] else 0.0)
+        regressed = time_change > threshold or memory_change > threshold
+        if regressed:
+            regressions.append(name)
+        print(f"  {name:<48} time {time_change:+7.1%}   memory {memory_change:+7.1%}"
+              f"{'   REGRESSION' if regressed else ''}")
+    return regressions
+
+def print_result(name, result):
+    if "skipped" in result:
+        print(f"  {name:<48} skipped ({result['skipped']})")
+        return
+    if "error" in result:
+        print(f"  {name:<48} FAILED ({result['error']})")
+        return
+    throughput = f"{result['items_per_second']:>12,.0f} items/s" if result.get("items_per_second") else ""
+    print(f"  {name:<48} median {result['median'] * 1000:>10.2f} ms  "
+          f"peak {result['peak_memory_bytes'] / 1024 / 1024:>8.1f} MB  {throughput}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the scraping and processing hot paths.")
+    parser.add_argument('-k', dest='keyword', help="Only run benchmarks whose name contains this")
+    parser.add_argument('--list', action='store_true', help="List the benchmarks and exit")
+    parser.add_argument('--baseline', help="Results file to compare with (default: the previous run)")
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help="Only compare two saved results files")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Relative slowdown/memory growth reported as a regression (default: 0.2)")
+    parser.add_argument('--no-save', action='store_true', help="Don't write a results file")
+    parser.add_argument('--fail-on-regression', action='store_true', help="Exit with status 1 on a regression")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for entry in BENCHMARKS:
+            print(entry["name"])
+        return 0
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        return 1 if regressions and args.fail_on_regression else 0
+
+    selected = [entry for entry in BENCHMARKS if not args.keyword or args.keyword in entry["name"]]
+    current = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "benchmarks": {},
+    }
+
+    # Benchmark output, caches and debug files go to a scratch working directory, not the repo
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="benchmarks_")
+    os.chdir(workdir)
+    try:
+        print(f"Running {len(selected)} benchmarks (commit {current['commit']})")
+        for entry in selected:
+            result = measure(entry)
+            current["benchmarks"][entry["name"]] = result
+            print_result(entry["name"], result)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline_path = args.baseline or latest_result()
+    saved_path = None
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        saved_path = os.path.join(RESULTS_DIR, f"{stamp}_{current['commit']}.json")
+        with open(saved_path, 'w') as f:
+            json.dump(current, f, indent=2)
+        print(f"\nSaved results to {saved_path}")
+
+    regressions = []
+    if baseline_path and baseline_path != saved_path:
+        with open(baseline_path) as f:
+            regressions = compare(json.load(f), current, args.threshold)
+    return 1 if regressions and args.fail_on_regression else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
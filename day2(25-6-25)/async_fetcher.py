@@ -0,0 +1,260 @@
+import os
+import sys
+import asyncio
+import logging
+import time
+from urllib.parse import urlparse
+
+import aiohttp
+
+from config import (
+    MAX_CONCURRENT_REQUESTS, MAX_CONNECTIONS_PER_HOST,
+    RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST, CITY_CONCURRENCY
+)
+from google_scraper import (
+    get_scrapeops_url, get_response_cache, extract_search_result_urls, extract_site_observations,
+    aggregate_prices, SEARCH_HEADERS, PROXY_HOST, resilience
+)
+from site_registry import get_site_registry
+from query_planner import get_query_planner
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from metrics import metrics
+from resilience import tuple_status
+
+
+_DEFAULT_CACHE = object()
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter: allows `burst` requests at once, refilled at `rate` tokens per second.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AsyncFetcher:
+    """
+    Shared asyncio HTTP client for the scrapers.
+
+    All requests go through one keep-alive connection pool, at most `max_in_flight`
+    requests run at once, and each target host gets its own token bucket.
+    Failed requests are retried with backoff, and a circuit breaker per contacted host
+    (the proxy, or the target with use_proxy=False) stops calls to a host that keeps failing.
+    With use_proxy=False URLs are requested directly, e.g. against a local stub server.
+    Responses go through the on-disk response cache (pass cache=None to bypass it).
+
+        async with AsyncFetcher() as fetcher:
+            status, html = await fetcher.fetch("https://www.google.com/search?q=...")
+    """
+
+    def __init__(self, max_in_flight=MAX_CONCURRENT_REQUESTS, per_host_limit=MAX_CONNECTIONS_PER_HOST,
+                 rate=RATE_LIMIT_PER_SECOND, burst=RATE_LIMIT_BURST, timeout=30, use_proxy=True,
+                 cache=_DEFAULT_CACHE):
+        self.max_in_flight = max_in_flight
+        self.per_host_limit = per_host_limit
+        self.rate = rate
+        self.burst = burst
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.use_proxy = use_proxy
+        self.cache = get_response_cache() if cache is _DEFAULT_CACHE else cache
+        self.session = None
+        self.semaphore = None
+        self.buckets = {}
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.max_in_flight,
+            limit_per_host=self.per_host_limit,
+            ssl=False,  # Same as verify=False in the requests-based scraper
+        )
+        self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        self.semaphore = asyncio.Semaphore(self.max_in_flight)
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    def bucket_for(self, url):
+        """Returns the token bucket for the host of the target URL (not the proxy)."""
+        host = urlparse(url).netloc.lower()
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(self.rate, self.burst)
+        return self.buckets[host]
+
+    async def fetch(self, url, headers=None):
+        """Fetch a URL. Returns (status_code, text)."""
+        # Cache lookups and writes are blocking SQLite and file I/O, so they run off the event loop
+        entry = await asyncio.to_thread(self.cache.get, url) if self.cache else None
+        if entry and entry.is_fresh:
+            logging.info(f"Cache hit: {url}")
+            metrics.inc("cache_requests_total", result="hit")
+            return entry.status, entry.body
+
+        request_headers = dict(headers or {})
+        if entry:
+            request_headers.update(entry.conditional_headers())
+
+        request_url = get_scrapeops_url(url) if self.use_proxy else url
+
+        async def request():
+            await self.bucket_for(url).acquire()
+            if self.use_proxy:
+                metrics.inc("proxy_calls_total")
+            async with self.semaphore:
+                async with self.session.get(request_url, headers=request_headers) as response:
+                    text = await response.text(errors='replace')
+                    status, response_headers = response.status, dict(response.headers)
+            metrics.inc("http_responses_total", status=status)
+            return status, text, response_headers
+
+        host = PROXY_HOST if self.use_proxy else urlparse(url).netloc.lower()
+        status, text, response_headers = await resilience.call_async(
+            host, request, status_of=tuple_status, retry_on=(aiohttp.ClientError, asyncio.TimeoutError)
+        )
+
+        if status == 304 and entry:
+            await asyncio.to_thread(self.cache.refresh, url, headers=response_headers)
+            metrics.inc("cache_requests_total", result="hit")
+            return entry.status, entry.body
+        metrics.inc("cache_requests_total", result="miss")
+        if status == 200 and self.cache:
+            await asyncio.to_thread(self.cache.put, url, text, status=status, headers=response_headers)
+        return status, text
+
+
+async def fetch_from_google_business_async(city, state, fetcher, registry=None, planner=None, observations=None):
+    """
+    Async version of google_scraper.fetch_from_google_business.
+    Searches follow the query planner (best query first, stopping once the city has enough
+    prices or sites); the sites each search finds are scraped concurrently.
+    Sites already scraped for another city in this run are reused from the site registry.
+    Every price found is also appended to `observations` (an ObservationStore), if given.
+    Returns None when every search failed (e.g. the proxy is down), so the city can be retried.
+    """
+    if registry is None:
+        registry = get_site_registry()
+    plan = (planner or get_query_planner()).plan(city, state)
+
+    async def search(query):
+        # The other Google host is only tried if the preferred one fails
+        for google_url in query.urls:
+            logging.info(f"Requesting Google search for: {query.text}")
+            try:
+                with metrics.span("search_fetch"):
+                    status, html = await fetcher.fetch(google_url, headers=SEARCH_HEADERS)
+                if status != 200:
+                    logging.error(f"Failed to get search results: {status}")
+                    continue
+                with metrics.span("parse"):
+                    return extract_search_result_urls(html)
+            except Exception as e:
+                logging.error(f"Error during search for {query.text}: {str(e)}")
+        return None
+
+    async def scrape_site(url):
+        logging.info(f"Scraping website: {url}")
+        try:
+            with metrics.span("site_fetch"):
+                status, html = await fetcher.fetch(url)
+            if status != 200:
+                logging.warning(f"Failed to scrape {url}: {status}")
+                return None
+            with metrics.span("extract"):
+                return extract_site_observations(html)
+        except Exception as e:
+            logging.warning(f"Failed to scrape website {url}: {str(e)}")
+            return None
+
+    while True:
+        query = plan.next_query()
+        if query is None:
+            break
+        site_urls = await search(query)
+        plan.record_search(query, site_urls)
+        sites = plan.new_sites(site_urls)
+        results = await asyncio.gather(*(registry.get_or_scrape_async(url, scrape_site) for url in sites))
+        for found in results:
+            plan.record_site(query, found)
+        if observations is not None:
+            # Store writes are blocking SQLite commits; keep them off the event loop
+            await asyncio.to_thread(_record_observations, observations, state, city, list(zip(sites, results)))
+
+    logging.info(f"{city}, {state}: {plan.searches} searches, {plan.sites} sites scraped")
+    prices = plan.finish()
+    if plan.failed():
+        logging.warning(f"{city}, {state}: every search failed")
+        return None
+    if observations is not None:
+        # Recorded even without prices, so reaggregate.py doesn't fall back to an older run
+        await asyncio.to_thread(observations.mark_scraped, state, city)
+    return aggregate_prices(prices)
+
+
+def _record_observations(observations, state, city, found_by_url):
+    for url, found in found_by_url:
+        observations.add(state, city, url, found)
+
+
+async def fetch_cities_async(cities, fetcher=None, city_concurrency=CITY_CONCURRENCY, on_result=None,
+                             observations=None):
+    """
+    Scrape many (city, state) pairs with overlapping searches.
+    Returns the aggregated prices in the same order as `cities` (None for a city whose
+    searches all failed). on_result(index, prices) is called as each city finishes,
+    e.g. to checkpoint it; it runs in a worker thread, so blocking writes there don't
+    hold up the other cities' requests.
+    Every price found is also appended to `observations` (an ObservationStore), if given.
+    """
+    own_fetcher = fetcher is None
+    if own_fetcher:
+        fetcher = AsyncFetcher()
+        await fetcher.open()
+
+    semaphore = asyncio.Semaphore(city_concurrency)
+
+    async def run_city(index, city, state):
+        async with semaphore:
+            prices = await fetch_from_google_business_async(city, state, fetcher, observations=observations)
+        if on_result:
+            await asyncio.to_thread(on_result, index, prices)
+        return prices
+
+    try:
+        return await asyncio.gather(*(run_city(index, city, state) for index, (city, state) in enumerate(cities)))
+    finally:
+        if own_fetcher:
+            await fetcher.close()
+        # Keep the per-query yields for ordering the next run's searches
+        get_query_planner().save()
+
+
+def fetch_cities(cities, city_concurrency=CITY_CONCURRENCY, on_result=None, observations=None):
+    """Blocking wrapper around fetch_cities_async for use from main.py."""
+    return asyncio.run(fetch_cities_async(cities, city_concurrency=city_concurrency, on_result=on_result,
+                                          observations=observations))
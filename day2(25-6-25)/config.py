@@ -20,11 +20,40 @@ SERVICES = [
 CITY_LIST_SOURCE = "us"  # or path to custom CSV of cities/states
 
 SCRAPE_TIMEOUT = 10  # seconds
-RETRY_COUNT = 3
+RETRY_COUNT = 3  # attempts per request, including the first
+
+# Retries and circuit breakers (../src/resilience.py)
+RETRY_BACKOFF_BASE = 1.0          # first retry waits up to this long; doubles per retry (full jitter)
+RETRY_BACKOFF_MAX = 30.0          # longest wait between attempts, unless Retry-After asks for more
+RETRY_BUDGET_RATIO = 0.2          # retries allowed per run: 10 plus 20% of all requests made
+CIRCUIT_FAILURE_THRESHOLD = 5     # consecutive failures before a host (e.g. the proxy) is skipped
+CIRCUIT_RESET_SECONDS = 60        # how long an open circuit fails fast before a trial request
 USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
               "AppleWebKit/537.36 (KHTML, like Gecko) "
               "Chrome/90.0.4430.93 Safari/537.36")
 
 OUTPUT_FOLDER = "output/"
 INTERPOLATION_NEAREST_K = 5
+CITY_COORDINATES_FILE = "../data/uscities.xlsx"  # simplemaps US cities (lat/lng) used for interpolation
 REGIONAL_ADJUSTMENT_FACTOR = 1.1  # use higher cost-of-living +10%
+OUTLIER_STD = 2  # prices further than this many standard deviations from a city's mean are dropped
+OBSERVATIONS_FILE = "output/observations.sqlite"  # every scraped price with its site and text, for reaggregate.py
+PRICE_STATS_FILE = "output/price_stats.json"  # per-service quantile sketches per city, state and nationally
+
+# Async fetcher (async_fetcher.py)
+MAX_CONCURRENT_REQUESTS = 10   # requests in flight across all cities
+MAX_CONNECTIONS_PER_HOST = 10  # keep-alive pool size per host (all proxy calls share one host)
+RATE_LIMIT_PER_SECOND = 0.5    # token-bucket refill rate per target host
+RATE_LIMIT_BURST = 2           # requests a host may receive back to back
+CITY_CONCURRENCY = 5           # cities whose searches overlap
+
+# Search planning (query_planner.py)
+MAX_SITES_PER_CITY = 5         # business websites scraped per city
+MIN_SOURCES_PER_SERVICE = 2    # stop searching once every service has this many prices
+QUERY_STATS_FILE = "cache/query_stats.json"  # per-query-template yield, kept across runs
+
+# HTTP response cache (http_cache.py)
+CACHE_ENABLED = True
+CACHE_DIR = "cache/"
+CACHE_TTL_SECONDS = 7 * 24 * 3600  # re-fetch pages older than a week
+CACHE_MAX_BYTES = 500 * 1024 * 1024  # evict least recently used pages above 500 MB
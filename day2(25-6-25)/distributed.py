@@ -0,0 +1,196 @@
+# Shards a national scrape across worker processes and hosts through a shared job queue.
+#
+#   python distributed.py enqueue          # coordinator: one job per municipality
+#   python distributed.py work --batch 5   # on every worker, as many as you like
+#   python distributed.py status
+#   python distributed.py merge            # once the queue is drained: interpolate + write_json,
+#                                          # and merge the workers' price statistics
+#
+# All commands use the same queue file (--queue, default output/queue.sqlite);
+# put it on a filesystem every worker can reach. The queue and observation files use
+# SQLite's rollback journal, which works over a network filesystem; WAL
+# (QUEUE_JOURNAL_MODE / OBSERVATION_JOURNAL_MODE=WAL) is faster but for one host only.
+import os
+import sys
+import time
+import socket
+import argparse
+import logging
+import threading
+from config import SERVICES, OUTPUT_FOLDER, OBSERVATIONS_FILE, PRICE_STATS_FILE
+from async_fetcher import fetch_cities
+from query_planner import get_query_planner
+from main import load_cities, write_output, save_price_stats
+from json_writer import add_output_arguments, output_options
+from utils import setup_logging
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from work_queue import WorkQueue, DEFAULT_VISIBILITY_TIMEOUT, DEFAULT_MAX_ATTEMPTS
+from observation_store import ObservationStore
+from price_sketch import PriceAggregator
+from metrics import metrics
+
+def job_key(state, city):
+    return f"{state}|{city}"
+
+class PendingObservations:
+    """
+    Passes a worker's observations through to the store, and holds each city's until its
+    job is settled, so the statistics shard only counts results the queue accepted.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.cities = {}
+        self.lock = threading.Lock()
+
+    def add(self, state, city, url, observations):
+        if observations:
+            with self.lock:
+                self.cities.setdefault((state, city), []).append(observations)
+        return self.store.add(state, city, url, observations)
+
+    def pop(self, state, city):
+        """The observations recorded for a city since the last pop()."""
+        with self.lock:
+            return self.cities.pop((state, city), [])
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+def enqueue(queue, args):
+    df, _ = load_cities()
+    # The services are part of the payload, so changing them re-queues finished cities
+    added = queue.enqueue(
+        (job_key(state, city), {"state": state, "city": city, "services": SERVICES})
+        for state, city in zip(df.state, df.city)
+    )
+    logging.info(f"Queued {added} of {len(df)} municipalities: {queue.counts()}")
+
+def work(queue, args):
+    worker = args.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    logging.info(f"Worker {worker} starting")
+    # Each worker keeps its own price statistics shard; merge combines them
+    aggregator = PriceAggregator()
+    shard_path = os.path.join(args.stats_shards, f"{worker}.json")
+    if os.path.exists(shard_path):
+        aggregator = PriceAggregator.load(shard_path)
+    store = ObservationStore(args.observations)
+    observations = PendingObservations(store)
+    done = 0
+    while True:
+        jobs = queue.lease(worker, count=args.batch)
+        if not jobs:
+            if queue.is_finished() or not args.wait:
+                break
+            # Other workers still hold leases that may expire and come back
+            time.sleep(args.poll_interval)
+            continue
+
+        finished = set()
+        stop = threading.Event()
+
+        def heartbeat():
+            # Keep the batch invisible to other workers while it is being scraped
+            while not stop.wait(queue.visibility_timeout / 3):
+                for index, job in enumerate(jobs):
+                    if index not in finished:
+                        queue.extend(job)
+
+        def on_result(index, prices):
+            finished.add(index)
+            payload = jobs[index].payload
+            scraped = observations.pop(payload["state"], payload["city"])
+            if prices is None:
+                # No search succeeded: count it as a failed attempt so it is retried
+                if not queue.fail(jobs[index], "every search failed"):
+                    logging.warning(f"Lease lost for {jobs[index].key}")
+            elif not queue.complete(jobs[index], prices):
+                logging.warning(f"Lease lost for {jobs[index].key}; result discarded")
+            else:
+                # Only committed results count, so a city scraped twice is in the stats once
+                for found in scraped:
+                    aggregator.add(payload["state"], payload["city"], found)
+
+        beat = threading.Thread(target=heartbeat, daemon=True)
+        beat.start()
+        try:
+            fetch_cities([(job.payload["city"], job.payload["state"]) for job in jobs], on_result=on_result,
+                         observations=observations)
+        except Exception as e:
+            logging.error(f"Batch failed: {e}")
+            for index, job in enumerate(jobs):
+                if index not in finished:
+                    observations.pop(job.payload["state"], job.payload["city"])
+                    queue.fail(job, str(e))
+        finally:
+            stop.set()
+            beat.join()
+        done += len(finished)
+        aggregator.save(shard_path)
+        logging.info(f"Worker {worker}: {done} cities scraped; queue: {queue.counts()}")
+        if args.max_jobs and done >= args.max_jobs:
+            break
+    store.close()
+    get_query_planner().log_stats()
+    logging.info("Time per stage:\n" + metrics.summary())
+
+def status(queue, args):
+    print(queue.counts())
+
+def merge(queue, args):
+    if not queue.is_finished() and not args.partial:
+        logging.error(f"Queue not drained yet: {queue.counts()} (use --partial to merge anyway)")
+        sys.exit(1)
+    results = {job_key(payload["state"], payload["city"]): result for _, payload, result in queue.results()}
+    df, coords = load_cities()
+    prices = [results.get(job_key(state, city)) or {} for state, city in zip(df.state, df.city)]
+    logging.info(f"Merging {len(results)} scraped municipalities; {len(df) - len(results)} have no result and are fully interpolated")
+    write_output(df, prices, coords, **output_options(args))
+
+    aggregator = PriceAggregator()
+    shards = sorted(name for name in os.listdir(args.stats_shards) if name.endswith(".json")) \
+        if os.path.isdir(args.stats_shards) else []
+    for name in shards:
+        aggregator.merge(PriceAggregator.load(os.path.join(args.stats_shards, name)))
+    logging.info(f"Merged price statistics from {len(shards)} workers")
+    save_price_stats(aggregator, args.price_stats)
+
+def retry(queue, args):
+    logging.info(f"Re-queued {queue.retry_failed()} failed jobs")
+
+COMMANDS = {"enqueue": enqueue, "work": work, "status": status, "merge": merge, "retry-failed": retry}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Distributed scrape through a shared job queue.")
+    parser.add_argument('command', choices=sorted(COMMANDS))
+    parser.add_argument('--queue', default=os.path.join(OUTPUT_FOLDER, "queue.sqlite"),
+                        help="Queue file shared by the coordinator and all workers")
+    parser.add_argument('--visibility-timeout', type=float, default=DEFAULT_VISIBILITY_TIMEOUT,
+                        help="Seconds before an unfinished leased job is handed to another worker")
+    parser.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS,
+                        help="Leases per job before it is marked failed")
+    parser.add_argument('--observations', default=OBSERVATIONS_FILE,
+                        help="Observation store workers append every scraped price to (shared like --queue)")
+    parser.add_argument('--stats-shards', default=os.path.join(OUTPUT_FOLDER, "price_stats"),
+                        help="Folder of per-worker price statistics (shared like --queue)")
+    parser.add_argument('--price-stats', default=PRICE_STATS_FILE,
+                        help="Where merge saves the combined price statistics")
+    parser.add_argument('--worker-id', default=None, help="Worker name (default: host-pid)")
+    parser.add_argument('--batch', type=int, default=5, help="Cities a worker leases and scrapes at once")
+    parser.add_argument('--max-jobs', type=int, default=None, help="Stop the worker after this many cities")
+    parser.add_argument('--wait', action='store_true',
+                        help="Keep the worker polling while other workers still hold leases")
+    parser.add_argument('--poll-interval', type=float, default=30, help="Seconds between polls with --wait")
+    parser.add_argument('--partial', action='store_true', help="Merge before every job is done")
+    add_output_arguments(parser)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_logging()
+    with WorkQueue(args.queue, visibility_timeout=args.visibility_timeout, max_attempts=args.max_attempts) as queue:
+        COMMANDS[args.command](queue, args)
+
+if __name__ == "__main__":
+    main()
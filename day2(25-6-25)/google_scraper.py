@@ -1,18 +1,83 @@
+import os
+import sys
 import requests
 import logging
 from bs4 import BeautifulSoup
 from urllib.parse import urlencode, quote_plus
-from config import SERVICES, SCRAPEOPS_API_KEY
+from config import (
+    SCRAPEOPS_API_KEY, CACHE_ENABLED, RETRY_COUNT, RETRY_BACKOFF_BASE, RETRY_BACKOFF_MAX,
+    RETRY_BUDGET_RATIO, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS, OUTLIER_STD
+)
 from utils import clean_price
+from http_cache import ResponseCache, cached_fetch
+from site_registry import get_site_registry
+from query_planner import SEARCH_QUERY_TEMPLATES, GOOGLE_SEARCH_URLS, get_query_planner
+from price_extractor import SERVICE_VARIATIONS, extract_observations_from_html
+from html_text import visible_text
 import urllib3
 import json
 import time
 import random
 import re
 
+# Shared instrumentation lives in ../src
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from metrics import metrics
+from resilience import configure_resilience, tuple_status
+
 # Disable SSL verification warnings
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+PROXY_HOST = "proxy.scrapeops.io"
+
+# One engine for the run: backoff, per-host circuit breakers and the retry budget
+resilience = configure_resilience(
+    max_attempts=RETRY_COUNT,
+    base_delay=RETRY_BACKOFF_BASE,
+    max_delay=RETRY_BACKOFF_MAX,
+    budget_ratio=RETRY_BUDGET_RATIO,
+    failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+    reset_timeout=CIRCUIT_RESET_SECONDS,
+)
+
+_response_cache = None
+
+def get_response_cache():
+    """Returns the shared on-disk response cache, or None if caching is disabled."""
+    global _response_cache
+    if CACHE_ENABLED and _response_cache is None:
+        _response_cache = ResponseCache()
+    return _response_cache
+
+def fetch_via_proxy(url, headers=None):
+    """
+    GET a URL through the ScrapeOps proxy, using the response cache.
+    Errors, 429s and 5xx responses are retried with backoff; raises CircuitOpenError
+    while the proxy is failing. Returns (status_code, text, from_cache).
+    """
+    def fetch_once(target_url, request_headers):
+        metrics.inc("proxy_calls_total")
+        response = requests.get(
+            get_scrapeops_url(target_url),
+            headers=request_headers,
+            verify=False,
+            timeout=30
+        )
+        metrics.inc("http_responses_total", status=response.status_code)
+        return response.status_code, response.text, dict(response.headers)
+
+    def fetch(target_url, request_headers):
+        return resilience.call(
+            PROXY_HOST,
+            lambda: fetch_once(target_url, request_headers),
+            status_of=tuple_status,
+            retry_on=(requests.RequestException,)
+        )
+
+    status, text, from_cache = cached_fetch(get_response_cache(), url, fetch, headers=headers)
+    metrics.inc("cache_requests_total", result="hit" if from_cache else "miss")
+    return status, text, from_cache
+
 def get_scrapeops_url(url, extra_params=None):
     """Generates a ScrapeOps proxy URL for the given target URL."""
     if not SCRAPEOPS_API_KEY or SCRAPEOPS_API_KEY == "YOUR_API_KEY_HERE":
@@ -31,7 +96,7 @@ def get_scrapeops_url(url, extra_params=None):
     if extra_params:
         payload.update(extra_params)
         
-    return 'https://proxy.scrapeops.io/v1/?' + urlencode(payload)
+    return f'https://{PROXY_HOST}/v1/?' + urlencode(payload)
 
 def extract_price_from_text(text, service):
     """Extract price from text for a specific service."""
@@ -40,18 +105,7 @@ def extract_price_from_text(text, service):
     service_lower = service.lower()
     
     # Different variations of service names
-    service_variations = {
-        'photography': ['photo', 'photography', 'pictures', 'photos'],
-        'videography': ['video', 'videography', 'film', 'filming'],
-        'drone photography': ['drone photo', 'aerial photo', 'drone photography'],
-        'drone video': ['drone video', 'aerial video', 'drone film'],
-        '3d virtual tour': ['3d tour', 'virtual tour', 'matterport', '3d walkthrough'],
-        'floor plans': ['floor plan', 'floorplan', 'floor maps'],
-        'virtual staging': ['virtual staging', 'digital staging'],
-        'twilight photography': ['twilight', 'sunset photo', 'dusk photo'],
-        'agent intro/outro': ['agent intro', 'agent video', 'realtor intro'],
-        'voiceover': ['voice over', 'voiceover', 'narration']
-    }
+    service_variations = {svc.lower(): names for svc, names in SERVICE_VARIATIONS.items()}
     
     # Get variations for the current service
     variations = service_variations.get(service_lower, [service_lower])
@@ -88,136 +142,166 @@ def extract_price_from_text(text, service):
     
     return None
 
-def fetch_from_google_business(city, state):
+SEARCH_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'DNT': '1',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1'
+}
+
+EXCLUDED_DOMAINS = [
+    'google.com', 'youtube.com', 'facebook.com',
+    'instagram.com', 'linkedin.com', 'twitter.com',
+    'pinterest.com', 'yelp.com', 'amazon.com'
+]
+
+def build_search_queries(city, state):
+    """Search query variations used to find local business websites."""
+    return [template.format(city=city, state=state) for template in SEARCH_QUERY_TEMPLATES]
+
+def build_google_urls(query):
+    """Equivalent Google search URLs (different domains) for a query; the first is preferred."""
+    encoded_query = quote_plus(query)
+    return [url.format(query=encoded_query) for url in GOOGLE_SEARCH_URLS]
+
+def extract_search_result_urls(html):
     """
-    Scrapes Google search results via the ScrapeOps API to find business websites
-    and then scrapes those websites for pricing information.
+    Extract external business website URLs from a Google results page, in result order
+    (best ranked first) without duplicates.
     """
-    results = {svc: [] for svc in SERVICES}
-    
-    # Construct search queries for different variations
-    queries = [
-        f"real estate photography videography pricing packages {city} {state}",
-        f"real estate photographer rates pricing packages {city} {state}",
-        f"real estate video production cost pricing {city} {state}",
-        f"3d virtual tour matterport pricing {city} {state}",
-        f"drone real estate photography video pricing {city}"
-    ]
-    
-    all_website_urls = set()
-    
-    for query in queries:
-        encoded_query = quote_plus(query)
-        
-        # Use different Google domains and parameters
-        google_urls = [
-            f'https://www.google.com/search?q={encoded_query}&num=100&hl=en&gl=us',
-            f'https://google.com/search?q={encoded_query}&num=100&hl=en&gl=us',
-        ]
-        
-        for google_url in google_urls:
-            logging.info(f"Requesting Google search for: {query}")
-            
-            try:
-                # Add random delay between requests
-                time.sleep(random.uniform(2, 4))
-                
-                response = requests.get(
-                    get_scrapeops_url(google_url),
-                    headers={
-                        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                        'Accept-Language': 'en-US,en;q=0.5',
-                        'Accept-Encoding': 'gzip, deflate, br',
-                        'DNT': '1',
-                        'Connection': 'keep-alive',
-                        'Upgrade-Insecure-Requests': '1'
-                    },
-                    verify=False,
-                    timeout=30
-                )
-                
-                if response.status_code != 200:
-                    logging.error(f"Failed to get search results: {response.status_code}")
-                    continue
-                
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                # Try multiple selectors for Google search results
-                for selector in [
-                    'div.g div.yuRUbf > a[href]',  # Modern format
-                    'div.g > div > div > div > a[href]',  # Alternative format
-                    'div.g a[href]',  # Basic format
-                    'a[href^="http"]'  # Any external link
-                ]:
-                    links = soup.select(selector)
-                    if links:
-                        logging.info(f"Found {len(links)} links with selector: {selector}")
-                        for link in links:
-                            url = link.get('href', '')
-                            if (url.startswith('http') and 
-                                not any(x in url.lower() for x in [
-                                    'google.com', 'youtube.com', 'facebook.com', 
-                                    'instagram.com', 'linkedin.com', 'twitter.com',
-                                    'pinterest.com', 'yelp.com', 'amazon.com'
-                                ])):
-                                all_website_urls.add(url)
-                                logging.info(f"Added URL: {url}")
-                
-            except Exception as e:
-                logging.error(f"Error during search for {query}: {str(e)}")
-                continue
-    
-    logging.info(f"Found {len(all_website_urls)} unique websites to scrape")
-    
-    # Scrape each individual website found
-    for url in list(all_website_urls)[:5]:  # Limit to first 5 for efficiency
-        try:
-            logging.info(f"Scraping website: {url}")
-            
-            # Add random delay between requests
-            time.sleep(random.uniform(1, 2))
-            
-            site_response = requests.get(
-                get_scrapeops_url(url),
-                verify=False,
-                timeout=30
-            )
-            
-            if site_response.status_code != 200:
-                logging.warning(f"Failed to scrape {url}: {site_response.status_code}")
-                continue
-            
-            site_soup = BeautifulSoup(site_response.text, "html.parser")
-            
-            # Get all text content
-            text_elements = site_soup.find_all(['p', 'div', 'span', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li'])
-            page_text = ' '.join(element.get_text(' ', strip=True) for element in text_elements)
-            
-            # Look for pricing information for each service
-            for svc in SERVICES:
-                price = extract_price_from_text(page_text, svc)
-                if price:
-                    logging.info(f"Found price for {svc}: ${price}")
-                    results[svc].append(price)
-            
-        except Exception as e:
-            logging.warning(f"Failed to scrape website {url}: {str(e)}")
-            continue
+    urls = {}
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Try multiple selectors for Google search results
+    for selector in [
+        'div.g div.yuRUbf > a[href]',  # Modern format
+        'div.g > div > div > div > a[href]',  # Alternative format
+        'div.g a[href]',  # Basic format
+        'a[href^="http"]'  # Any external link
+    ]:
+        links = soup.select(selector)
+        if links:
+            logging.info(f"Found {len(links)} links with selector: {selector}")
+            for link in links:
+                url = link.get('href', '')
+                if (url.startswith('http') and
+                    not any(x in url.lower() for x in EXCLUDED_DOMAINS)):
+                    if url not in urls:
+                        urls[url] = None
+                        logging.info(f"Added URL: {url}")
+    return list(urls)
+
+def page_text_from_html(html):
+    """Visible text of a page, as used for price extraction (streamed, no soup tree)."""
+    return visible_text(html)
 
-    # Aggregate the results
+def extract_site_observations(html):
+    """
+    Extract a price per service from a business website, with the text it was found in.
+    Returns dict: service -> {"price": price, "context": snippet}.
+    """
+    # Look for pricing information for every service in a single pass
+    observations = extract_observations_from_html(html)
+    for svc, found in observations.items():
+        logging.info(f"Found price for {svc}: ${found['price']}")
+    return observations
+
+def aggregate_prices(results, outlier_std=OUTLIER_STD):
+    """Average the prices found per service, dropping outliers. Returns dict: service -> price or None."""
     aggregated = {}
     for svc, vals in results.items():
         if vals:
-            # Remove outliers (prices outside 2 standard deviations)
+            # Remove outliers (prices more than outlier_std standard deviations from the mean)
             if len(vals) > 2:
                 mean = sum(vals) / len(vals)
                 std = (sum((x - mean) ** 2 for x in vals) / len(vals)) ** 0.5
-                filtered_vals = [x for x in vals if mean - 2 * std <= x <= mean + 2 * std]
+                filtered_vals = [x for x in vals if mean - outlier_std * std <= x <= mean + outlier_std * std]
                 vals = filtered_vals if filtered_vals else vals
-            
+
             aggregated[svc] = float(sum(vals) / len(vals))
         else:
             aggregated[svc] = None
-            
-    return aggregated 
\ No newline at end of file
+
+    return aggregated
+
+def fetch_from_google_business(city, state, observations=None):
+    """
+    Scrapes Google search results via the ScrapeOps API to find business websites
+    and then scrapes those websites for pricing information.
+    Searches are planned by the query planner: most productive query first, one Google
+    host per query, and no more searches once the city has enough prices or sites.
+    Every price found is also appended to `observations` (an ObservationStore), if given.
+    Returns None when every search failed (e.g. the proxy is down), so the city can be retried.
+    """
+    plan = get_query_planner().plan(city, state)
+    registry = get_site_registry()
+
+    def scrape_site(url):
+        logging.info(f"Scraping website: {url}")
+        try:
+            with metrics.span("site_fetch"):
+                status, html, from_cache = fetch_via_proxy(url)
+
+            # Add random delay between requests that actually hit the network
+            if not from_cache:
+                time.sleep(random.uniform(1, 2))
+
+            if status != 200:
+                logging.warning(f"Failed to scrape {url}: {status}")
+                return None
+
+            with metrics.span("extract"):
+                return extract_site_observations(html)
+
+        except Exception as e:
+            logging.warning(f"Failed to scrape website {url}: {str(e)}")
+            return None
+
+    while True:
+        query = plan.next_query()
+        if query is None:
+            break
+        site_urls = None
+        # The other Google host is only tried if the preferred one fails
+        for google_url in query.urls:
+            logging.info(f"Requesting Google search for: {query.text}")
+            try:
+                with metrics.span("search_fetch"):
+                    status, html, from_cache = fetch_via_proxy(google_url, headers=SEARCH_HEADERS)
+
+                # Add random delay between requests that actually hit the network
+                if not from_cache:
+                    time.sleep(random.uniform(2, 4))
+
+                if status != 200:
+                    logging.error(f"Failed to get search results: {status}")
+                    continue
+
+                with metrics.span("parse"):
+                    site_urls = extract_search_result_urls(html)
+                break
+
+            except Exception as e:
+                logging.error(f"Error during search for {query.text}: {str(e)}")
+                continue
+
+        plan.record_search(query, site_urls)
+        # Sites already scraped for another city are reused from the site registry
+        for url in plan.new_sites(site_urls):
+            found = registry.get_or_scrape(url, scrape_site)
+            plan.record_site(query, found)
+            if observations is not None:
+                observations.add(state, city, url, found)
+
+    logging.info(f"{city}, {state}: {plan.searches} searches, {plan.sites} sites scraped")
+    prices = plan.finish()
+    if plan.failed():
+        logging.warning(f"{city}, {state}: every search failed")
+        return None
+    if observations is not None:
+        # Recorded even without prices, so reaggregate.py doesn't fall back to an older run
+        observations.mark_scraped(state, city)
+    return aggregate_prices(prices)
@@ -0,0 +1,85 @@
+from html.parser import HTMLParser
+
+# Text inside these tags is never visible on the page
+SKIP_TAGS = {'script', 'style', 'noscript', 'template', 'title', 'svg', 'iframe', 'object'}
+
+# Tags that never have an end tag
+VOID_TAGS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+    'link', 'meta', 'param', 'source', 'track', 'wbr'
+}
+
+
+class _TextChunkParser(HTMLParser):
+    """
+    SAX-style parser that collects (tag, text) chunks for visible text nodes.
+    `tag` is the innermost element the text sits in. Unlike joining get_text() over
+    nested block tags, every text node is emitted exactly once.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack = []
+        self.skip_depth = 0
+        self.chunks = []
+        self.pending = []
+
+    def flush(self):
+        """Emit the text collected since the last tag (a text node may arrive in several feeds)."""
+        if self.pending:
+            text = ' '.join(''.join(self.pending).split())
+            self.pending = []
+            if text:
+                self.chunks.append((self.stack[-1] if self.stack else '', text))
+
+    def handle_starttag(self, tag, attrs):
+        self.flush()
+        if tag in VOID_TAGS:
+            return
+        self.stack.append(tag)
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+
+    def handle_startendtag(self, tag, attrs):
+        self.flush()
+
+    def handle_endtag(self, tag):
+        self.flush()
+        # Browsers close any unclosed children; ignore stray end tags
+        if tag not in self.stack:
+            return
+        while self.stack:
+            open_tag = self.stack.pop()
+            if open_tag in SKIP_TAGS:
+                self.skip_depth -= 1
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.pending.append(data)
+
+
+def iter_text_chunks(html):
+    """
+    Yield (tag, text) for every visible text node in document order, skipping
+    script/style and other non-visible content.
+
+    `html` is either the whole page or an iterable of string pieces (e.g. a streamed
+    response body); pieces are parsed as they arrive, so no tree is ever built.
+    """
+    pieces = [html] if isinstance(html, str) else html
+    parser = _TextChunkParser()
+    for piece in pieces:
+        parser.feed(piece)
+        if parser.chunks:
+            yield from parser.chunks
+            parser.chunks = []
+    parser.close()
+    parser.flush()
+    yield from parser.chunks
+
+
+def visible_text(html):
+    """The visible text of a page as one space-separated string."""
+    return ' '.join(text for _, text in iter_text_chunks(html))
@@ -0,0 +1,214 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from email.utils import formatdate
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from config import CACHE_DIR, CACHE_TTL_SECONDS, CACHE_MAX_BYTES
+
+
+def normalize_url(url, params=None):
+    """
+    Normalize a URL (plus optional extra query params) into a cache key.
+    Scheme and host are lowercased, default ports and fragments dropped and
+    query params sorted, so equivalent URLs share one cache entry.
+    """
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and not (scheme == 'http' and parts.port == 80 or scheme == 'https' and parts.port == 443):
+        host = f"{host}:{parts.port}"
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if params:
+        query.extend((str(k), str(v)) for k, v in params.items())
+    return urlunsplit((scheme, host, parts.path or '/', urlencode(sorted(query)), ''))
+
+
+class CacheEntry:
+    """A cached response body plus the metadata needed for freshness checks and revalidation."""
+
+    def __init__(self, key, status, body, etag, last_modified, fetched_at, ttl):
+        self.key = key
+        self.status = status
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+        self.ttl = ttl
+
+    @property
+    def is_fresh(self):
+        return time.time() - self.fetched_at < self.ttl
+
+    def conditional_headers(self):
+        """Headers for a conditional GET that revalidates this entry."""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """
+    Persistent on-disk HTTP response cache.
+
+    Bodies are stored content-addressed (sha256 of the body) under `cache_dir/objects`,
+    so identical pages fetched from different URLs are kept once. A SQLite index maps
+    normalized URLs to bodies and tracks fetch time, last access and validators.
+    The total size is tracked as entries are written; only when it goes over `max_bytes`
+    are the least recently used entries evicted. Safe to share between threads.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, ttl=CACHE_TTL_SECONDS, max_bytes=CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, 'objects')
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(cache_dir, 'index.sqlite'), check_same_thread=False)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                status INTEGER NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self.db.commit()
+        self.total_bytes = self._stored_bytes()
+
+    def _stored_bytes(self):
+        return self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def get(self, url, params=None):
+        """Return the CacheEntry for a URL (fresh or stale), or None if it isn't cached."""
+        key = normalize_url(url, params)
+        with self.lock:
+            row = self.db.execute(
+                "SELECT digest, size, status, etag, last_modified, fetched_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if not row:
+                return None
+            digest, size, status, etag, last_modified, fetched_at = row
+            try:
+                with open(self._object_path(digest), 'r', encoding='utf-8') as f:
+                    body = f.read()
+            except FileNotFoundError:
+                self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.db.commit()
+                self.total_bytes -= size
+                return None
+            self.db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self.db.commit()
+        return CacheEntry(key, status, body, etag, last_modified, fetched_at, self.ttl)
+
+    def put(self, url, body, status=200, headers=None, params=None):
+        """Store a response body. `headers` are the response headers (for ETag/Last-Modified)."""
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        key = normalize_url(url, params)
+        data = body.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        now = time.time()
+        with self.lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            old = self.db.execute("SELECT digest, size FROM responses WHERE key = ?", (key,)).fetchone()
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, digest, len(data), status, headers.get('etag'),
+                 headers.get('last-modified') or formatdate(now, usegmt=True), now, now)
+            )
+            self.total_bytes += len(data) - (old[1] if old else 0)
+            if old and old[0] != digest:
+                self._remove_object_if_unused(old[0])
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+            self.db.commit()
+
+    def refresh(self, url, params=None, headers=None):
+        """Mark an entry as freshly validated (after a 304 Not Modified)."""
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        key = normalize_url(url, params)
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "UPDATE responses SET fetched_at = ?, accessed_at = ?, etag = COALESCE(?, etag) WHERE key = ?",
+                (now, now, headers.get('etag'), key)
+            )
+            self.db.commit()
+
+    def _remove_object_if_unused(self, digest):
+        in_use = self.db.execute("SELECT 1 FROM responses WHERE digest = ? LIMIT 1", (digest,)).fetchone()
+        if not in_use:
+            try:
+                os.remove(self._object_path(digest))
+            except FileNotFoundError:
+                pass
+
+    def _evict(self):
+        """Drop least recently used entries until the cache is under its size cap."""
+        # Another process may share the index, so recount before deleting anything
+        self.total_bytes = self._stored_bytes()
+        while self.total_bytes > self.max_bytes:
+            oldest = self.db.execute(
+                "SELECT key, digest, size FROM responses ORDER BY accessed_at LIMIT 100"
+            ).fetchall()
+            if not oldest:
+                break
+            for key, digest, size in oldest:
+                if self.total_bytes <= self.max_bytes:
+                    break
+                self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._remove_object_if_unused(digest)
+                self.total_bytes -= size
+                logging.info(f"Evicted cached response: {key}")
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+def cached_fetch(cache, url, fetch, headers=None):
+    """
+    Fetch a URL through the cache.
+
+    `fetch(url, headers)` performs the real request and returns (status, text, response_headers).
+    Fresh entries are returned without touching the network; stale entries are revalidated
+    with If-None-Match / If-Modified-Since. Returns (status, text, from_cache).
+    """
+    entry = cache.get(url) if cache else None
+    if entry and entry.is_fresh:
+        logging.info(f"Cache hit: {url}")
+        return entry.status, entry.body, True
+
+    request_headers = dict(headers or {})
+    if entry:
+        request_headers.update(entry.conditional_headers())
+
+    status, text, response_headers = fetch(url, request_headers)
+    if status == 304 and entry:
+        cache.refresh(url, headers=response_headers)
+        logging.info(f"Cache revalidated: {url}")
+        return entry.status, entry.body, True
+    if status == 200 and cache:
+        cache.put(url, text, status=status, headers=response_headers)
+    return status, text, False
@@ -1,52 +1,112 @@
+import logging
 import pandas as pd
 import numpy as np
-from config import INTERPOLATION_NEAREST_K, REGIONAL_ADJUSTMENT_FACTOR, SERVICES
-from us import states
+from scipy.spatial import cKDTree
+from config import INTERPOLATION_NEAREST_K, REGIONAL_ADJUSTMENT_FACTOR, SERVICES, CITY_COORDINATES_FILE
 
-def interpolate_city(target, city_df):
+EARTH_RADIUS_KM = 6371.0
+
+
+def load_city_coordinates(path=CITY_COORDINATES_FILE):
     """
-    Given a target city with missing values and a DataFrame of cities with complete pricing,
-    perform KNN geographic + regional adjustment interpolation.
+    Load (state, city, lat, lng) from the simplemaps US cities file (.xlsx or .csv).
+    Duplicate state+city rows keep the first entry (the file is sorted by population).
     """
-    # Determine the number of samples to take, ensuring it does not exceed available data
-    n_samples_available = len(city_df)
-    if target.name in city_df.index:
-        n_samples_available -= 1
-
-    if n_samples_available <= 0:
-        return {svc: None for svc in SERVICES} # Cannot interpolate if no other data is available
-
-    k = min(INTERPOLATION_NEAREST_K, n_samples_available)
-
-    # Simplification: group by state, use nearest K by cost-of-living
-    state = target['state']
-    regional = city_df[city_df.state == state]
-    
-    # Exclude the target city itself from the pool of potential neighbors
-    if target.name in regional.index:
-        regional = regional.drop(target.name)
-
-    # Decide whether to sample from regional or national data
-    if len(regional) >= k:
-        sample = regional.sample(k)
+    columns = ["state_name", "city", "lat", "lng"]
+    if path.endswith((".xlsx", ".xls")):
+        coords = pd.read_excel(path, usecols=columns)
     else:
-        # Fallback to national pool, excluding the target city
-        national_pool = city_df.drop(target.name, errors='ignore')
-        k_national = min(k, len(national_pool))
-        if k_national > 0:
-            sample = national_pool.sample(k_national)
-        else:
-            return {svc: None for svc in SERVICES} # No data to sample from
-
-    interpolated = {}
-    for svc in SERVICES:
-        # Only calculate for services that are actually missing
-        if pd.isna(target.get(svc)):
-            vals = sample[svc].dropna()
-            if not vals.empty:
-                avg = vals.mean()
-                interp = avg * REGIONAL_ADJUSTMENT_FACTOR
-                interpolated[svc] = round(interp, 2)
-            else:
-                interpolated[svc] = None
-    return interpolated
+        coords = pd.read_csv(path, usecols=columns)
+    coords = coords.rename(columns={"state_name": "state"})
+    return coords.drop_duplicates(["state", "city"]).reset_index(drop=True)
+
+
+def coordinates_from_catalog(catalog):
+    """The same (state, city, lat, lng) frame, taken from an open municipality catalog."""
+    coords = pd.DataFrame({
+        "state": catalog.state_names(),
+        "city": catalog.cities(),
+        "lat": np.array(catalog.lat),
+        "lng": np.array(catalog.lng),
+    })
+    return coords.dropna(subset=["lat", "lng"]).drop_duplicates(["state", "city"]).reset_index(drop=True)
+
+
+def _unit_vectors(lat, lng):
+    """Lat/lng in degrees -> points on the unit sphere, so Euclidean nearest = great-circle nearest."""
+    lat = np.radians(lat)
+    lng = np.radians(lng)
+    return np.column_stack([np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)])
+
+
+def attach_coordinates(price_df, coords):
+    """
+    Return (lat, lng) arrays aligned with price_df. Cities missing from the coordinates
+    file are placed at the centre of their state; anything still unknown stays NaN.
+    """
+    located = price_df[["state", "city"]].merge(coords, on=["state", "city"], how="left")
+    state_centres = coords.groupby("state")[["lat", "lng"]].mean()
+    centre = located[["state"]].join(state_centres, on="state")
+    lat = located["lat"].fillna(centre["lat"]).to_numpy(dtype=float)
+    lng = located["lng"].fillna(centre["lng"]).to_numpy(dtype=float)
+    return lat, lng
+
+
+def interpolate_missing(price_df, coords, k=INTERPOLATION_NEAREST_K, services=SERVICES,
+                        adjustment=REGIONAL_ADJUSTMENT_FACTOR):
+    """
+    Fill every missing service price for every city in one pass.
+
+    For each service a KD-tree is built once over the cities that have a price, and all
+    cities without one are queried together for their k nearest priced neighbours. The
+    estimate is the inverse-distance-weighted mean of those neighbours times
+    `adjustment` (REGIONAL_ADJUSTMENT_FACTOR by default). Cities with no known location, or
+    with no priced neighbour that has one, get the national mean. A service no city has a
+    price for stays empty.
+
+    Returns (filled, interpolated): a copy of price_df[services] with the gaps filled and
+    a boolean DataFrame marking the values that were interpolated.
+    """
+    prices = price_df[list(services)].apply(pd.to_numeric, errors="coerce")
+    filled = prices.copy()
+    interpolated = pd.DataFrame(False, index=prices.index, columns=list(services))
+
+    lat, lng = attach_coordinates(price_df, coords)
+    located = ~(np.isnan(lat) | np.isnan(lng))
+    points = np.zeros((len(price_df), 3))
+    points[located] = _unit_vectors(lat[located], lng[located])
+    if (~located).any():
+        logging.warning(f"{int((~located).sum())} cities have no coordinates; using national averages for them")
+
+    for svc in services:
+        values = prices[svc].to_numpy(dtype=float)
+        known = ~np.isnan(values)
+        missing = ~known
+        if not missing.any() or not known.any():
+            continue
+
+        estimates = np.full(len(values), np.nan)
+        source = known & located
+        targets = missing & located
+        if source.any() and targets.any():
+            n_neighbours = min(k, int(source.sum()))
+            tree = cKDTree(points[source])
+            distances, neighbours = tree.query(points[targets], k=n_neighbours)
+            if n_neighbours == 1:
+                distances = distances[:, None]
+                neighbours = neighbours[:, None]
+            # Chord length on the unit sphere -> km; floor it so co-located cities don't divide by zero
+            distances = np.maximum(2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(distances / 2, 1.0)), 1e-3)
+            weights = 1.0 / distances
+            neighbour_values = values[source][neighbours]
+            estimates[targets] = (weights * neighbour_values).sum(axis=1) / weights.sum(axis=1)
+
+        # Unlocated cities, and located ones when no priced city has coordinates
+        estimates[missing & np.isnan(estimates)] = values[known].mean()
+
+        estimates = np.round(estimates * adjustment, 2)
+        written = missing & np.isfinite(estimates)
+        filled.loc[written, svc] = estimates[written]
+        interpolated.loc[written, svc] = True
+
+    return filled, interpolated
@@ -1,18 +1,213 @@
+import io
+import gzip
 import json
 import os
+import shutil
+import tempfile
 from config import OUTPUT_FOLDER
 
-def write_json(data, by_state=False):
-    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
-    if by_state:
-        for state, cities in data["United States"].items():
-            # Create a folder for each state
-            state_folder = os.path.join(OUTPUT_FOLDER, state.replace(" ", "_"))
-            os.makedirs(state_folder, exist_ok=True)
-            fname = os.path.join(state_folder, f"US_{state.replace(' ', '_')}_REAL_ESTATE_PHOTOGRAPHY_VIDEOGRAPHY.json")
-            with open(fname, "w") as f:
-                json.dump({"United States": {state: cities}}, f, indent=2)
-    else:
-        fname = os.path.join(OUTPUT_FOLDER, "US_REAL_ESTATE_PHOTOGRAPHY_VIDEOGRAPHY_COMPLETE.json")
-        with open(fname, "w") as f:
-            json.dump(data, f, indent=2)
+try:
+    import zstandard
+except ImportError:  # zstd output is optional; gzip needs only the standard library
+    zstandard = None
+
+COUNTRY = "United States"
+FILE_SUFFIX = "REAL_ESTATE_PHOTOGRAPHY_VIDEOGRAPHY"
+FORMATS = ("json", "compact", "ndjson")
+COMPRESSIONS = {None: "", "gzip": ".gz", "zstd": ".zst"}
+COPY_CHUNK = 1 << 20
+
+def _open_text(path, mode, compression):
+    """Text stream over a plain, gzip or zstd file ('w' or 'r')."""
+    if compression is None:
+        return open(path, mode, encoding="utf-8")
+    if compression == "gzip":
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    if compression == "zstd":
+        if zstandard is None:
+            raise ImportError("zstd output requires the zstandard package (pip install zstandard)")
+        raw = open(path, mode + "b")
+        if mode == "w":
+            return io.TextIOWrapper(zstandard.ZstdCompressor().stream_writer(raw), encoding="utf-8")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw), encoding="utf-8")
+    raise ValueError(f"Unknown compression {compression!r}; expected one of {sorted(c for c in COMPRESSIONS if c)}")
+
+class _StateStream:
+    """One state's city entries, streamed to its own file; `body_chars` counts what follows the header."""
+
+    def __init__(self, path, compression, header):
+        self.path = path
+        self.compression = compression
+        self.header = header
+        self.file = _open_text(path, "w", compression)
+        self.file.write(header)
+        self.entries = 0
+        self.body_chars = 0
+
+    def write_entry(self, text, separator):
+        if self.entries:
+            text = separator + text
+        self.file.write(text)
+        self.entries += 1
+        self.body_chars += len(text)
+
+    def copy_body(self, out):
+        """Copies the entries written so far (without header/footer) into another text stream."""
+        with _open_text(self.path, "r", self.compression) as f:
+            f.read(len(self.header))
+            remaining = self.body_chars
+            while remaining:
+                chunk = f.read(min(COPY_CHUNK, remaining))
+                if not chunk:
+                    raise IOError(f"{self.path} is shorter than expected")
+                out.write(chunk)
+                remaining -= len(chunk)
+
+class StreamingJSONWriter:
+    """
+    Writes the per-state files and/or the COMPLETE file city by city, so the master
+    document never has to be held in memory.
+
+        with StreamingJSONWriter(by_state=True, complete=True) as writer:
+            writer.add("Texas", "Austin", {"services": {...}})
+
+    Formats:
+      json     same layout as json.dump(..., indent=2) of the nested master document
+      compact  the same document without whitespace
+      ndjson   one {"country", "state", "city", "services"} object per line
+    compression="gzip" or "zstd" (needs zstandard) compresses every file written.
+
+    Each state's file is streamed as its cities arrive (in any state order) and finished on
+    close(). The nested COMPLETE file is assembled on close() by copying each state's entries
+    across; without by_state those entries are spooled to temporary files instead.
+    """
+
+    def __init__(self, output_folder=None, by_state=True, complete=False, fmt="json", compression=None):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format {fmt!r}; expected one of {FORMATS}")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression {compression!r}; expected one of {sorted(c for c in COMPRESSIONS if c)}")
+        if not by_state and not complete:
+            raise ValueError("Nothing to write: enable by_state and/or complete")
+        self.output_folder = output_folder or OUTPUT_FOLDER
+        self.by_state = by_state
+        self.complete = complete
+        self.fmt = fmt
+        self.compression = compression
+        self.extension = (".ndjson" if fmt == "ndjson" else ".json") + COMPRESSIONS[compression]
+        self.states = {}
+        self.complete_stream = None
+        self.spool_dir = None
+        self.cities = 0
+        os.makedirs(self.output_folder, exist_ok=True)
+        if complete and fmt == "ndjson":
+            # NDJSON has no nesting, so the COMPLETE file can be streamed directly too
+            self.complete_stream = _open_text(self.complete_path(), "w", compression)
+        elif complete and not by_state:
+            self.spool_dir = tempfile.mkdtemp(prefix=".spool_", dir=self.output_folder)
+
+    def state_path(self, state):
+        state_folder = os.path.join(self.output_folder, state.replace(" ", "_"))
+        return os.path.join(state_folder, f"US_{state.replace(' ', '_')}_{FILE_SUFFIX}{self.extension}")
+
+    def complete_path(self):
+        return os.path.join(self.output_folder, f"US_{FILE_SUFFIX}_COMPLETE{self.extension}")
+
+    def _state_header(self, state):
+        if self.fmt == "json":
+            return '{\n  ' + json.dumps(COUNTRY) + ': {\n    ' + json.dumps(state) + ': {\n'
+        if self.fmt == "compact":
+            return '{' + json.dumps(COUNTRY) + ':{' + json.dumps(state) + ':{'
+        return ""
+
+    def _entry(self, state, city, city_data):
+        if self.fmt == "json":
+            return '      ' + json.dumps(city) + ': ' + json.dumps(city_data, indent=2).replace("\n", "\n      ")
+        if self.fmt == "compact":
+            return json.dumps(city) + ':' + json.dumps(city_data, separators=(",", ":"))
+        record = {"country": COUNTRY, "state": state, "city": city}
+        record.update(city_data)
+        return json.dumps(record, separators=(",", ":")) + "\n"
+
+    @property
+    def _separator(self):
+        return {"json": ",\n", "compact": ",", "ndjson": ""}[self.fmt]
+
+    def _stream_for(self, state):
+        stream = self.states.get(state)
+        if stream is None:
+            if self.by_state:
+                path = self.state_path(state)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                stream = _StateStream(path, self.compression, self._state_header(state))
+            else:
+                # Only the COMPLETE file is wanted: spool this state's entries uncompressed
+                path = os.path.join(self.spool_dir, f"{len(self.states)}.part")
+                stream = _StateStream(path, None, "")
+            self.states[state] = stream
+        return stream
+
+    def add(self, state, city, city_data):
+        """Appends one city, e.g. add("Texas", "Austin", {"services": {...}})."""
+        entry = self._entry(state, city, city_data)
+        if self.by_state or self.spool_dir:
+            self._stream_for(state).write_entry(entry, self._separator)
+        if self.complete_stream:
+            self.complete_stream.write(entry)
+        self.cities += 1
+
+    def _state_footer(self):
+        return {"json": '\n    }\n  }\n}', "compact": '}}}', "ndjson": ""}[self.fmt]
+
+    def _write_complete(self):
+        """Assembles the nested COMPLETE file from the per-state entries."""
+        indented = self.fmt == "json"
+        with _open_text(self.complete_path(), "w", self.compression) as out:
+            if not self.states:
+                out.write('{\n  "United States": {}\n}' if indented else '{"United States":{}}')
+                return
+            out.write('{\n  ' + json.dumps(COUNTRY) + ': {\n' if indented else '{' + json.dumps(COUNTRY) + ':{')
+            for index, (state, stream) in enumerate(self.states.items()):
+                if index:
+                    out.write(",\n" if indented else ",")
+                out.write('    ' + json.dumps(state) + ': {\n' if indented else json.dumps(state) + ':{')
+                stream.copy_body(out)
+                out.write('\n    }' if indented else '}')
+            out.write('\n  }\n}' if indented else '}}')
+
+    def close(self):
+        for stream in self.states.values():
+            if self.by_state:
+                stream.file.write(self._state_footer())
+            stream.file.close()
+        if self.complete_stream:
+            self.complete_stream.close()
+        elif self.complete:
+            self._write_complete()
+        if self.spool_dir:
+            shutil.rmtree(self.spool_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def write_json(data, by_state=False, fmt="json", compression=None):
+    """Writes an in-memory master document (per-state files, or the COMPLETE file)."""
+    with StreamingJSONWriter(by_state=by_state, complete=not by_state, fmt=fmt, compression=compression) as writer:
+        for state, cities in data[COUNTRY].items():
+            for city, city_data in cities.items():
+                writer.add(state, city, city_data)
+
+def add_output_arguments(parser):
+    """The output format options shared by main.py and distributed.py merge."""
+    parser.add_argument('--format', dest='output_format', choices=FORMATS, default="json",
+                        help="json (indented, as before), compact JSON, or ndjson (one city per line)")
+    parser.add_argument('--compression', choices=sorted(c for c in COMPRESSIONS if c), default=None,
+                        help="Compress the output files")
+    parser.add_argument('--complete', action='store_true',
+                        help="Also write the national COMPLETE file next to the per-state files")
+
+def output_options(args):
+    return {"fmt": args.output_format, "compression": args.compression, "complete": args.complete}
@@ -1,49 +1,162 @@
+import os
+import sys
+import argparse
 import logging
+import numpy as np
 import pandas as pd
 from us import states
-from config import SERVICES
-from google_scraper import fetch_from_google_business
-from interpolator import interpolate_city
-from json_writer import write_json
+from config import (
+    SERVICES, OUTPUT_FOLDER, CITY_COORDINATES_FILE, OBSERVATIONS_FILE, PRICE_STATS_FILE, REGIONAL_ADJUSTMENT_FACTOR
+)
+from async_fetcher import fetch_cities
+from query_planner import get_query_planner
+from interpolator import interpolate_missing, coordinates_from_catalog
+from json_writer import StreamingJSONWriter, add_output_arguments, output_options
 from utils import setup_logging
-import json
 
-def main():
+# The run manifest is shared with the src pipeline
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from manifest import RunManifest, input_hash
+from observation_store import ObservationStore
+from price_sketch import PriceAggregator
+from municipality_catalog import load_catalog
+from metrics import metrics
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape and interpolate prices for all municipalities.")
+    parser.add_argument('--resume', action='store_true',
+                        help="Skip cities the manifest records as scraped with the same input")
+    parser.add_argument('--max-age-days', type=float, default=None,
+                        help="With --resume, also re-scrape cities scraped longer ago than this")
+    parser.add_argument('--manifest', default=os.path.join(OUTPUT_FOLDER, "manifest.sqlite"),
+                        help="Checkpoint manifest recording per-city scrape results")
+    parser.add_argument('--observations', default=OBSERVATIONS_FILE,
+                        help="Store every scraped price with its site and text here (for reaggregate.py)")
+    parser.add_argument('--price-stats', default=PRICE_STATS_FILE,
+                        help="Where to save the city/state/national price statistics of the scraped prices")
+    add_output_arguments(parser)
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="Serve Prometheus metrics on this port while the run is going")
+    parser.add_argument('--metrics-host', default="127.0.0.1",
+                        help="Interface the metrics server binds (0.0.0.0 exposes it on every interface)")
+    parser.add_argument('--metrics-report', default="run_metrics.json",
+                        help="Where to write the JSON run report")
+    return parser.parse_args(argv)
+
+def load_cities():
+    """Cities and states (DataFrame) and their coordinates, from the catalog built from municipalities.json."""
+    catalog = load_catalog("municipalities.json", CITY_COORDINATES_FILE)
+    df = pd.DataFrame({"state": catalog.state_names(), "city": catalog.cities()})
+    coords = coordinates_from_catalog(catalog)
+    catalog.close()
+    return df, coords
+
+def price_frame(df, prices):
+    """Wide float frame: df plus one column per service, NaN where a city has no scraped price."""
+    return pd.concat([df, pd.DataFrame(prices, columns=SERVICES, index=df.index, dtype=float)], axis=1)
+
+def city_records(df, filled, interpolated):
+    """
+    Yields (state, city, {"services": ...}) grouped by state (in groupby order), from the
+    filled price and interpolation_used masks. The per-city dicts are only built here,
+    as each city is serialized.
+    A (state, city) listed more than once is yielded once, in the place of its first row
+    with the prices of its last, as the nested master dict used to keep it.
+    """
+    values = filled[SERVICES].to_numpy(dtype=float)
+    prices = values.astype(object)
+    prices[np.isnan(values)] = None
+    prices = prices.tolist()
+    flags = interpolated[SERVICES].to_numpy(dtype=bool).tolist()
+    state_names = df["state"].tolist()
+    cities = df["city"].tolist()
+    rows = {}
+    for i in np.argsort(df["state"].to_numpy(), kind="stable"):
+        rows[(state_names[i], cities[i])] = i
+    for i in rows.values():
+        yield state_names[i], cities[i], {"services": {
+            svc: {"price": price, "interpolation_used": flag}
+            for svc, price, flag in zip(SERVICES, prices[i], flags[i])
+        }}
+
+def aggregate_observations(observed, aggregator):
+    """Adds {(state, city): {service: [price, ...]}}, as ObservationStore.prices_by_city() returns it."""
+    for (state, city), services in observed.items():
+        for svc, vals in services.items():
+            for price in vals:
+                aggregator.update(state, city, svc, price)
+    return aggregator
+
+def save_price_stats(aggregator, path):
+    """Saves the price sketches and logs the national statistics per service."""
+    aggregator.save(path)
+    for svc, stats in aggregator.summary().items():
+        logging.info(f"{svc}: {stats['count']} prices, median ${stats['median']}, "
+                     f"p10-p90 ${stats['p10']}-${stats['p90']}, outliers outside {stats['outlier_bounds']}")
+
+def write_output(df, prices, coords, fmt="json", compression=None, complete=False,
+                 adjustment=REGIONAL_ADJUSTMENT_FACTOR):
+    """
+    Interpolates the missing prices (one dict per row of df) and streams the per-state
+    JSON files (plus the COMPLETE file with complete=True) city by city.
+    """
+    price_df = price_frame(df, prices)
+    # Fill all missing prices at once from each city's nearest priced neighbours
+    with metrics.span("interpolate"):
+        filled, interpolated = interpolate_missing(price_df, coords, adjustment=adjustment)
+    # Cities are written as they are built, so the master document is never held in memory
+    with metrics.span("write"), StreamingJSONWriter(by_state=True, complete=complete, fmt=fmt,
+                                                    compression=compression) as writer:
+        for state, city, city_data in city_records(df, filled, interpolated):
+            writer.add(state, city, city_data)
+    logging.info("JSON generation complete.")
+
+def main(argv=None):
+    args = parse_args(argv)
     setup_logging()
-    # Load list of cities and states from municipalities.json
-    with open("municipalities.json", "r", encoding="utf-8") as f:
-        city_records = json.load(f)
-    df = pd.DataFrame(city_records) # Process only the first city for testing
+    if args.metrics_port:
+        metrics.serve(args.metrics_port, args.metrics_host)
+    df, coords = load_cities()
+    cities = list(zip(df.city, df.state))
+
+    # Every scraped city is checkpointed, so a rerun after a crash only scrapes the rest
+    manifest = RunManifest(args.manifest)
+    hashes = [input_hash({"city": city, "state": state, "services": SERVICES}) for city, state in cities]
+    if args.resume:
+        max_age = args.max_age_days * 86400 if args.max_age_days is not None else None
+        todo = manifest.pending([{"state": state, "city": city} for city, state in cities], hashes, max_age=max_age)
+        logging.info(f"Resuming: {len(cities) - len(todo)} cities already scraped, {len(todo)} to scrape")
+    else:
+        todo = list(range(len(cities)))
+
+    def checkpoint(index, city_prices):
+        city, state = cities[todo[index]]
+        if city_prices is None:
+            # No search succeeded; --resume scrapes the city again
+            manifest.mark_failed(state, city, hashes[todo[index]], "every search failed")
+        else:
+            manifest.mark_done(state, city, hashes[todo[index]], result=city_prices)
+
     # Scrape data
-    prices = []
-    for idx, row in df.iterrows():
-        city = row.city
-        state = row.state
-        sp = fetch_from_google_business(city, state)
-        prices.append(sp)
-    price_df = pd.concat([df, pd.DataFrame(prices)], axis=1)
-    # Build final JSON structure
-    master = {"United States": {}}
-    for state, sub in price_df.groupby("state"):
-        master["United States"][state] = {}
-        for _, r in sub.iterrows():
-            svc_data = {}
-            missing = []
-            for svc in SERVICES:
-                p = r.get(svc)
-                used = False
-                if p is None:
-                    missing.append(True)
-                svc_data[svc] = {"price": p, "interpolation_used": False}
-            if any(pd.isna(list(r.get(svc) for svc in SERVICES))):
-                interp = interpolate_city(r, price_df)
-                for svc in SERVICES:
-                    if svc_data[svc]["price"] is None and interp.get(svc) is not None:
-                        svc_data[svc]["price"] = interp[svc]
-                        svc_data[svc]["interpolation_used"] = True
-            master["United States"][state][r.city] = {"services": svc_data}
-    write_json(master, by_state=True)
-    logging.info("JSON generation complete.")
+    # Cities are scraped concurrently and recorded in the manifest as each one finishes;
+    # the individual prices behind them go to the observation store and the price statistics
+    aggregator = PriceAggregator()
+    with ObservationStore(args.observations, aggregator=None if args.resume else aggregator) as observations:
+        fetch_cities([cities[index] for index in todo], on_result=checkpoint, observations=observations)
+        if args.resume:
+            # Cities skipped by --resume have no prices in this run, so the statistics are
+            # rebuilt from every city's latest scrape instead of covering this run alone
+            with metrics.span("load_observations"):
+                aggregate_observations(observations.prices_by_city(), aggregator)
+    save_price_stats(aggregator, args.price_stats)
+    get_query_planner().log_stats()
+    results = manifest.results()
+    prices = [results.get((state, city)) or {} for city, state in cities]
+    logging.info(f"Manifest: {manifest.summary()}")
+    manifest.close()
+    write_output(df, prices, coords, **output_options(args))
+    logging.info("Time per stage:\n" + metrics.summary())
+    metrics.write_report(args.metrics_report)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,270 @@
+import re
+from bisect import bisect_left
+
+from config import SERVICES
+from html_text import visible_text
+
+# Different variations of service names, in order of preference
+SERVICE_VARIATIONS = {
+    'Photography': ['photo', 'photography', 'pictures', 'photos'],
+    'Videography': ['video', 'videography', 'film', 'filming'],
+    'Drone Photography': ['drone photo', 'aerial photo', 'drone photography'],
+    'Drone Video': ['drone video', 'aerial video', 'drone film'],
+    '3D Virtual Tour': ['3d tour', 'virtual tour', 'matterport', '3d walkthrough'],
+    'Floor Plans': ['floor plan', 'floorplan', 'floor maps'],
+    'Virtual Staging': ['virtual staging', 'digital staging'],
+    'Twilight Photography': ['twilight', 'sunset photo', 'dusk photo'],
+    'Agent Intro/Outro': ['agent intro', 'agent video', 'realtor intro'],
+    'Voiceover': ['voice over', 'voiceover', 'narration'],
+}
+
+_NUMBER = r'\d+(?:,\d{3})*(?:\.\d{2})?'
+
+# All price formats in one regex, in order of preference:
+#   $325 / starting at $325 / from $325, "325 dollars", "325$"
+PRICE_PATTERN = re.compile(
+    rf'\$(?P<prefix>{_NUMBER})|(?<![\d,])(?P<number>{_NUMBER})(?:\s*(?P<word>dollars)|(?P<suffix>(?=\$)))'
+)
+# (the suffix form leaves its '$' unconsumed, so "1h00$499" still yields $499)
+PRICE_FORMS = ['prefix', 'word', 'suffix']
+
+# Every price contains one of these; the price regex only runs near them
+PRICE_ANCHOR_PATTERN = re.compile(r'\$|dollars')
+_ANCHOR_REACH = 32
+
+
+class PriceExtractor:
+    """
+    Finds a price for every service in one pass over the page text.
+
+    All service name variations are compiled into a single alternation and all price
+    formats into a single regex when the extractor is created. extract_prices() then
+    scans the text once for prices, once for service mentions near those prices, and
+    matches them up with binary searches instead of re-running regexes on a context
+    slice per mention.
+
+    A service gets the first price found within `context_chars` of one of its mentions,
+    trying variations in the order listed and, within the window, the price formats in
+    PRICE_PATTERN order, the same rules as google_scraper.extract_price_from_text.
+    With after_first=True a price after a mention is preferred: every mention's window
+    after it is searched before any window before one (the Yelp scraper's rule).
+    """
+
+    def __init__(self, service_variations=None, context_chars=100, min_price=50, max_price=5000, after_first=False):
+        service_variations = service_variations or {svc: SERVICE_VARIATIONS.get(svc, [svc.lower()]) for svc in SERVICES}
+        self.context_chars = context_chars
+        self.after_first = after_first
+        self.min_price = min_price
+        self.max_price = max_price
+
+        # variation text -> list of (service, preference rank within that service)
+        self.variation_services = {}
+        for service, variations in service_variations.items():
+            for rank, variation in enumerate(variations):
+                self.variation_services.setdefault(variation.lower(), []).append((service, rank))
+        self.services = list(service_variations)
+
+        # Longest first, so the alternation reports the longest variation at each position.
+        # Shorter variations matching at the same position are always prefixes of it.
+        variations = sorted(self.variation_services, key=len, reverse=True)
+        self.prefixes = {
+            variation: [other for other in variations if variation.startswith(other)]
+            for variation in variations
+        }
+        self.longest_variation = len(variations[0])
+        # The lookahead makes matches overlap, e.g. 'photo' inside 'drone photography'
+        self.mention_pattern = re.compile('(?=(' + '|'.join(re.escape(v) for v in variations) + '))')
+
+    def _valid_price(self, raw):
+        price = float(raw.replace(',', ''))
+        if self.min_price is not None and price < self.min_price:
+            return None
+        if self.max_price is not None and price > self.max_price:
+            return None
+        return price
+
+    @staticmethod
+    def _merge_regions(regions, text_length):
+        """Clips and merges sorted (start, end) regions."""
+        merged = []
+        for start, end in regions:
+            start, end = max(0, start), min(text_length, end)
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return merged
+
+    def _scan_prices(self, text):
+        """Returns {form: (starts, ends, prices)} for every valid price in the text, sorted by position."""
+        if (text.count('$') + text.count('dollars')) * 4 * _ANCHOR_REACH > len(text):
+            # Prices are dense; scanning the whole text is cheaper than building regions
+            regions = [[0, len(text)]]
+        else:
+            regions = self._merge_regions(
+                ((m.start() - _ANCHOR_REACH, m.end() + _ANCHOR_REACH) for m in PRICE_ANCHOR_PATTERN.finditer(text)),
+                len(text)
+            )
+        found = {form: ([], [], []) for form in PRICE_FORMS}
+        for start, end in regions:
+            # Don't start a region in the middle of a number
+            while start > 0 and text[start - 1] in '0123456789,.':
+                start -= 1
+            for match in PRICE_PATTERN.finditer(text, start, end):
+                form = 'prefix' if match.group('prefix') else match.lastgroup
+                price = self._valid_price(match.group('prefix') or match.group('number'))
+                if price is not None:
+                    starts, ends, prices = found[form]
+                    starts.append(match.start())
+                    ends.append(match.end())
+                    prices.append(price)
+        return found
+
+    def _scan_mentions(self, text, regions):
+        """Returns {service: [(rank, start, end), ...]} sorted by preference, for mentions inside regions."""
+        mentions = {service: [] for service in self.services}
+        for region_start, region_end in regions:
+            for match in self.mention_pattern.finditer(text, region_start, region_end):
+                start = match.start()
+                for variation in self.prefixes[match.group(1)]:
+                    for service, rank in self.variation_services[variation]:
+                        mentions[service].append((rank, start, start + len(variation)))
+        for service_mentions in mentions.values():
+            service_mentions.sort()
+        return mentions
+
+    @staticmethod
+    def _first_price_in(window_start, window_end, starts, ends):
+        i = bisect_left(starts, window_start)
+        if i < len(starts) and ends[i] <= window_end:
+            return i
+        return None
+
+    def find_candidates(self, text, first_only=False):
+        """
+        Returns {service: [price, ...]} with every candidate price per service, best first
+        (one candidate per service mention that has a price nearby).
+        With first_only=True each list holds at most the best candidate.
+        """
+        return {
+            service: [price for price, _, _ in spans]
+            for service, spans in self._candidate_spans(text.lower(), first_only).items()
+        }
+
+    def _candidate_spans(self, text, first_only):
+        """Like find_candidates, on lowercased text, with (price, start, end) spanning mention and price."""
+        found_prices = self._scan_prices(text)
+
+        # Only mentions close enough to a price can produce a candidate
+        reach = self.context_chars + self.longest_variation
+        price_count = sum(len(starts) for starts, _, _ in found_prices.values())
+        if price_count * 2 * reach > len(text):
+            regions = [[0, len(text)]]
+        else:
+            regions = self._merge_regions(
+                sorted(
+                    (start - reach, end + reach)
+                    for starts, ends, _ in found_prices.values()
+                    for start, end in zip(starts, ends)
+                ),
+                len(text)
+            )
+
+        context = self.context_chars
+        if self.after_first:
+            sides = [lambda start, end: (end, end + context), lambda start, end: (start - context, start)]
+        else:
+            sides = [lambda start, end: (start - context, end + context)]
+
+        candidates = {}
+        for service, mentions in self._scan_mentions(text, regions).items():
+            service_candidates = []
+            for window in sides:
+                for _, start, end in mentions:
+                    window_start, window_end = window(start, end)
+                    window_start, window_end = max(0, window_start), min(len(text), window_end)
+                    for form in PRICE_FORMS:
+                        starts, ends, prices = found_prices[form]
+                        i = self._first_price_in(window_start, window_end, starts, ends)
+                        if i is not None:
+                            service_candidates.append((prices[i], min(start, starts[i]), max(end, ends[i])))
+                            break
+                    if first_only and service_candidates:
+                        break
+                if first_only and service_candidates:
+                    break
+            candidates[service] = service_candidates
+        return candidates
+
+    def extract_prices(self, text):
+        """Returns {service: price} for every service with a price in the text."""
+        return {
+            service: prices[0]
+            for service, prices in self.find_candidates(text, first_only=True).items()
+            if prices
+        }
+
+    def extract_prices_from_html(self, html):
+        """Returns {service: price} from the visible text of a page (str or streamed pieces)."""
+        return self.extract_prices(visible_text(html))
+
+    def extract_observations(self, text, context_chars=60):
+        """
+        Same prices as extract_prices, each with the text around its service mention and price:
+        {service: {"price": price, "context": snippet}}.
+        """
+        text = text.lower()
+        observations = {}
+        for service, spans in self._candidate_spans(text, first_only=True).items():
+            if spans:
+                price, start, end = spans[0]
+                snippet = text[max(0, start - context_chars):end + context_chars]
+                observations[service] = {"price": price, "context": " ".join(snippet.split())}
+        return observations
+
+    def extract_observations_from_html(self, html):
+        return self.extract_observations(visible_text(html))
+
+
+_default_extractor = None
+
+def get_default_extractor():
+    global _default_extractor
+    if _default_extractor is None:
+        _default_extractor = PriceExtractor()
+    return _default_extractor
+
+def extract_prices(text):
+    """Extract a price per service from page text using the shared, precompiled extractor."""
+    return get_default_extractor().extract_prices(text)
+
+def extract_prices_from_html(html):
+    """Extract a price per service from a page's visible text using the shared extractor."""
+    return get_default_extractor().extract_prices_from_html(html)
+
+def extract_observations_from_html(html):
+    """Like extract_prices_from_html, with the text snippet each price was found in."""
+    return get_default_extractor().extract_observations_from_html(html)
+
+
+if __name__ == "__main__":
+    # Micro-benchmark against google_scraper.extract_price_from_text on the saved Google pages
+    import timeit
+    from google_scraper import extract_price_from_text, page_text_from_html
+
+    for page in ["google_response.html", "last_google_response.html"]:
+        with open(page, "r", encoding="utf-8") as f:
+            text = page_text_from_html(f.read())
+
+        old = {svc: extract_price_from_text(text, svc) for svc in SERVICES}
+        old = {svc: price for svc, price in old.items() if price}
+        new = extract_prices(text)
+
+        runs = 5
+        old_time = timeit.timeit(lambda: [extract_price_from_text(text, svc) for svc in SERVICES], number=runs) / runs
+        new_time = timeit.timeit(lambda: extract_prices(text), number=runs) / runs
+
+        print(f"{page} ({len(text)} chars)")
+        print(f"  extract_price_from_text x {len(SERVICES)} services: {old_time * 1000:.1f} ms")
+        print(f"  PriceExtractor.extract_prices:              {new_time * 1000:.1f} ms ({old_time / new_time:.1f}x faster)")
+        print(f"  same results: {old == new}")
@@ -0,0 +1,211 @@
+import os
+import sys
+import json
+import logging
+import threading
+from urllib.parse import quote_plus
+
+from config import SERVICES, QUERY_STATS_FILE, MIN_SOURCES_PER_SERVICE, MAX_SITES_PER_CITY
+from http_cache import normalize_url
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from metrics import metrics
+
+# Search query variations used to find local business websites
+SEARCH_QUERY_TEMPLATES = [
+    "real estate photography videography pricing packages {city} {state}",
+    "real estate photographer rates pricing packages {city} {state}",
+    "real estate video production cost pricing {city} {state}",
+    "3d virtual tour matterport pricing {city} {state}",
+    "drone real estate photography video pricing {city}",
+]
+
+# Google hosts that return the same results; the first is used, the others only if it fails
+GOOGLE_SEARCH_URLS = [
+    'https://www.google.com/search?q={query}&num=100&hl=en&gl=us',
+    'https://google.com/search?q={query}&num=100&hl=en&gl=us',
+]
+
+# Weight given to templates without history, so new templates still get tried
+PRIOR_HITS = 0.5
+
+class PlannedQuery:
+    """One search: its template, query text, and the equivalent URLs in the order to try them."""
+    __slots__ = ("template", "text", "urls")
+
+    def __init__(self, template, text, urls):
+        self.template = template
+        self.text = text
+        self.urls = urls
+
+class QueryPlanner:
+    """
+    Orders search queries by how well each template has found prices in the past, and keeps
+    per-template yield statistics (searches, failed searches, sites scraped and prices found
+    per service) across runs in `stats_path`. Safe to share between threads and tasks.
+    """
+
+    def __init__(self, stats_path=QUERY_STATS_FILE, min_sources=MIN_SOURCES_PER_SERVICE,
+                 max_sites=MAX_SITES_PER_CITY, templates=SEARCH_QUERY_TEMPLATES):
+        self.stats_path = stats_path
+        self.min_sources = min_sources
+        self.max_sites = max_sites
+        self.templates = list(templates)
+        self.lock = threading.Lock()
+        self.yields = {}
+        if stats_path and os.path.exists(stats_path):
+            with open(stats_path, 'r', encoding='utf-8') as f:
+                self.yields = json.load(f)
+        for template in self.templates:
+            self.yields.setdefault(template, {"searches": 0, "failed": 0, "sites": 0, "hits": {}})
+
+    def plan(self, city, state):
+        return CityPlan(self, city, state)
+
+    def score(self, template, missing):
+        """Expected number of still-missing services one more search with this template prices."""
+        stats = self.yields[template]
+        searches = stats["searches"] - stats["failed"]
+        return sum((stats["hits"].get(svc, 0) + PRIOR_HITS) / (searches + 1) for svc in missing)
+
+    def record_search(self, template, ok):
+        with self.lock:
+            self.yields[template]["searches"] += 1
+            if not ok:
+                self.yields[template]["failed"] += 1
+        metrics.inc("search_queries_total", template=self.templates.index(template),
+                    outcome="ok" if ok else "failed")
+
+    def record_site(self, template, found):
+        with self.lock:
+            stats = self.yields[template]
+            stats["sites"] += 1
+            for svc in found:
+                stats["hits"][svc] = stats["hits"].get(svc, 0) + 1
+
+    def stats(self):
+        """Per-template yield: searches, sites scraped, and prices found per service and per search."""
+        with self.lock:
+            report = {}
+            for template in self.templates:
+                stats = self.yields[template]
+                searches = stats["searches"] - stats["failed"]
+                report[template] = dict(
+                    stats,
+                    hits=dict(stats["hits"]),
+                    prices_per_search=round(sum(stats["hits"].values()) / searches, 2) if searches else None,
+                )
+            return report
+
+    def save(self):
+        if not self.stats_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.stats_path)), exist_ok=True)
+        with self.lock:
+            payload = json.dumps(self.yields, indent=2)
+        tmp_path = f"{self.stats_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(tmp_path, self.stats_path)
+
+    def log_stats(self):
+        for index, (template, stats) in enumerate(self.stats().items()):
+            logging.info(f"Query {index} ({template}): {stats['searches']} searches, {stats['failed']} failed, "
+                         f"{stats['sites']} sites, {stats['prices_per_search']} prices/search")
+
+class CityPlan:
+    """
+    The searches for one city, issued best template first until every service has
+    `min_sources` prices or `max_sites` sites have been scraped (the same site budget as
+    before, so stopping early scrapes as many sites as searching everything did).
+
+        plan = planner.plan(city, state)
+        while (query := plan.next_query()) is not None:
+            plan.record_search(query, site_urls_or_None)
+            for url in plan.new_sites(site_urls):
+                plan.record_site(query, scrape(url))  # {service: {"price": ..., "context": ...}}
+        prices = plan.finish()  # service -> list of prices
+    """
+
+    def __init__(self, planner, city, state):
+        self.planner = planner
+        self.prices = {svc: [] for svc in SERVICES}
+        self.remaining = []
+        issued = set()
+        for template in planner.templates:
+            text = template.format(city=city, state=state)
+            urls = [url.format(query=quote_plus(text)) for url in GOOGLE_SEARCH_URLS]
+            # Templates that produce the same search are only issued once
+            key = normalize_url(urls[0])
+            if key not in issued:
+                issued.add(key)
+                self.remaining.append(PlannedQuery(template, text, urls))
+        self.searches = 0
+        self.searches_ok = 0
+        self.sites = 0
+        self.seen_sites = set()
+
+    def missing(self):
+        return [svc for svc, found in self.prices.items() if len(found) < self.planner.min_sources]
+
+    def satisfied(self):
+        return not self.missing() or self.sites >= self.planner.max_sites
+
+    def next_query(self):
+        """The most promising remaining query for the services still missing, or None when done."""
+        if not self.remaining or self.satisfied():
+            return None
+        missing = self.missing()
+        best = max(self.remaining, key=lambda query: self.planner.score(query.template, missing))
+        self.remaining.remove(best)
+        self.searches += 1
+        return best
+
+    def record_search(self, query, site_urls):
+        """site_urls is None when every URL for the query failed."""
+        if site_urls is not None:
+            self.searches_ok += 1
+        self.planner.record_search(query.template, site_urls is not None)
+
+    def new_sites(self, site_urls):
+        """
+        Sites from a search that haven't been scraped for this city, up to the remaining site
+        budget. site_urls are in Google's order, so the budget goes to the best ranked sites.
+        """
+        sites = []
+        for url in site_urls or ():
+            key = normalize_url(url)
+            if key in self.seen_sites or self.sites >= self.planner.max_sites:
+                continue
+            self.seen_sites.add(key)
+            self.sites += 1
+            sites.append(url)
+        return sites
+
+    def record_site(self, query, found):
+        found = found or {}
+        self.planner.record_site(query.template, found)
+        for svc, observation in found.items():
+            if svc in self.prices:
+                self.prices[svc].append(observation["price"])
+
+    def failed(self):
+        """True when no search for the city succeeded, so its (lack of) prices says nothing."""
+        return self.searches_ok == 0
+
+    def finish(self):
+        """Counts the searches the plan made unnecessary and returns service -> prices found."""
+        if self.remaining:
+            metrics.inc("search_queries_skipped_total", len(self.remaining))
+        return self.prices
+
+_planner = None
+_planner_lock = threading.Lock()
+
+def get_query_planner():
+    """Returns the planner shared by every city in the current run."""
+    global _planner
+    with _planner_lock:
+        if _planner is None:
+            _planner = QueryPlanner()
+        return _planner
@@ -0,0 +1,72 @@
+# Rebuilds every city's prices from the observation store, without scraping anything.
+#
+#   python reaggregate.py                              # same rules as a scrape, e.g. after a crash
+#   python reaggregate.py --outlier-std 1.5 --adjustment-factor 1.05
+#   python reaggregate.py --run 20250625T101500-4242   # one run's observations only
+#   python reaggregate.py --list-runs
+#
+# Each city uses the observations of the latest run that scraped it, read in one query;
+# cities without observations are interpolated as usual. The price statistics
+# (--price-stats) are rebuilt from the same observations.
+import os
+import sys
+import argparse
+import logging
+from config import OBSERVATIONS_FILE, PRICE_STATS_FILE, OUTLIER_STD, REGIONAL_ADJUSTMENT_FACTOR
+from google_scraper import aggregate_prices
+from main import load_cities, write_output, save_price_stats, aggregate_observations
+from json_writer import add_output_arguments, output_options
+from utils import setup_logging
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from observation_store import ObservationStore
+from price_sketch import PriceAggregator
+from metrics import metrics
+
+def rebuild_prices(store, df, run_id=None, outlier_std=OUTLIER_STD, aggregator=None):
+    """
+    One {service: price} dict per row of df, aggregated from the stored observations.
+    Every observation is also added to `aggregator` (a PriceAggregator), if given.
+    """
+    with metrics.span("load_observations"):
+        observed = store.prices_by_city(run_id)
+    logging.info(f"Loaded observations for {len(observed)} municipalities")
+    if aggregator is not None:
+        aggregate_observations(observed, aggregator)
+    return [aggregate_prices(observed.get((state, city), {}), outlier_std=outlier_std)
+            for state, city in zip(df.state, df.city)]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Re-aggregate stored price observations offline.")
+    parser.add_argument('--observations', default=OBSERVATIONS_FILE, help="Observation store to read")
+    parser.add_argument('--run', default=None, help="Use only this run's observations")
+    parser.add_argument('--outlier-std', type=float, default=OUTLIER_STD,
+                        help="Drop prices further than this many standard deviations from a city's mean")
+    parser.add_argument('--adjustment-factor', type=float, default=REGIONAL_ADJUSTMENT_FACTOR,
+                        help="Multiplier applied to interpolated prices")
+    parser.add_argument('--price-stats', default=PRICE_STATS_FILE,
+                        help="Where to save the price statistics rebuilt from the observations")
+    parser.add_argument('--list-runs', action='store_true', help="List the stored runs and exit")
+    add_output_arguments(parser)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_logging()
+    if not os.path.exists(args.observations):
+        logging.error(f"No observation store at {args.observations}")
+        sys.exit(1)
+    with ObservationStore(args.observations) as store:
+        if args.list_runs:
+            for run in store.runs():
+                print(f"{run['run_id']}: {run['cities']} cities, {run['sites']} sites, {run['observations']} observations")
+            return
+        df, coords = load_cities()
+        aggregator = PriceAggregator()
+        prices = rebuild_prices(store, df, run_id=args.run, outlier_std=args.outlier_std, aggregator=aggregator)
+    save_price_stats(aggregator, args.price_stats)
+    write_output(df, prices, coords, adjustment=args.adjustment_factor, **output_options(args))
+    logging.info("Time per stage:\n" + metrics.summary())
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,10 @@
 import requests
 from bs4 import BeautifulSoup
-from config import SERVICES, SCRAPE_TIMEOUT, RETRY_COUNT, USER_AGENT
+from config import SERVICES, SCRAPE_TIMEOUT, USER_AGENT
 from utils import clean_price
+from google_scraper import resilience
+from resilience import requests_status
 import logging
-import time
 
 HEADERS = {"User-Agent": USER_AGENT}
 
@@ -15,22 +16,25 @@ def fetch_business_pricing(city, state):
     results = {svc: [] for svc in SERVICES}
     # Example: directory listing with known pattern:
     query_url = f"https://www.google.com/search?q=real+estate+photography+pricing+{city}+{state}"
-    for attempt in range(RETRY_COUNT):
-        try:
-            r = requests.get(query_url, headers=HEADERS, timeout=SCRAPE_TIMEOUT)
-            soup = BeautifulSoup(r.text, "html.parser")
-            # Example select: <div class="price">Photography: $300</div>
-            for div in soup.select("div.price"):
-                text = div.get_text()
-                for svc in SERVICES:
-                    if svc.lower() in text.lower():
-                        price = clean_price(text)
-                        if price:
-                            results[svc].append(price)
-            break
-        except Exception as e:
-            logging.warning(f"Fetch failure [{attempt+1}/{RETRY_COUNT}] for {city}, {state}: {e}")
-            time.sleep(1)
+    try:
+        # Retried with backoff (honouring Retry-After) by the shared resilience engine
+        r = resilience.call(
+            "www.google.com",
+            lambda: requests.get(query_url, headers=HEADERS, timeout=SCRAPE_TIMEOUT),
+            status_of=requests_status,
+            retry_on=(requests.RequestException,)
+        )
+        soup = BeautifulSoup(r.text, "html.parser")
+        # Example select: <div class="price">Photography: $300</div>
+        for div in soup.select("div.price"):
+            text = div.get_text()
+            for svc in SERVICES:
+                if svc.lower() in text.lower():
+                    price = clean_price(text)
+                    if price:
+                        results[svc].append(price)
+    except Exception as e:
+        logging.warning(f"Fetch failure for {city}, {state}: {e}")
     # derive median or mean
     aggregated = {}
     for svc, vals in results.items():
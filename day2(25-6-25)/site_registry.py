@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import threading
+
+from http_cache import normalize_url
+
+
+class SiteRegistry:
+    """
+    Run-scoped registry of business websites that have already been scraped.
+
+    Maps a normalized site URL to the per-service prices extracted from it (each with the
+    text it was found in), so neighboring cities that get the same photographers back reuse
+    the parsed result instead of fetching the site again. Concurrent requests for the same
+    URL (from threads or from asyncio tasks) wait for the first scrape instead of starting
+    their own.
+
+    A scrape function returning None is treated as a failure and is not recorded,
+    so a later city can try the site again.
+    """
+
+    def __init__(self):
+        self.results = {}
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.pending_async = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.results)
+
+    def get(self, url):
+        """Return the recorded prices for a URL, or None if it hasn't been scraped yet."""
+        with self.lock:
+            return self.results.get(normalize_url(url))
+
+    def _record(self, key, prices):
+        if prices is not None:
+            self.results[key] = prices
+
+    def get_or_scrape(self, url, scrape):
+        """
+        Return the prices for `url`, calling `scrape(url)` only if no other city has scraped it yet.
+        Thread-safe.
+        """
+        key = normalize_url(url)
+        while True:
+            with self.lock:
+                if key in self.results:
+                    self.hits += 1
+                    logging.info(f"Reusing prices already scraped from {url}")
+                    return self.results[key]
+                event = self.pending.get(key)
+                if event is None:
+                    event = self.pending[key] = threading.Event()
+                    self.misses += 1
+                    break
+            # Another thread is scraping this site; wait and re-check
+            event.wait()
+
+        prices = None
+        try:
+            prices = scrape(url)
+            return prices if prices is not None else {}
+        finally:
+            with self.lock:
+                self._record(key, prices)
+                del self.pending[key]
+            event.set()
+
+    async def get_or_scrape_async(self, url, scrape):
+        """Async variant of get_or_scrape: `scrape(url)` is a coroutine function."""
+        key = normalize_url(url)
+        while True:
+            with self.lock:
+                if key in self.results:
+                    self.hits += 1
+                    logging.info(f"Reusing prices already scraped from {url}")
+                    return self.results[key]
+                future = self.pending_async.get(key)
+                if future is None:
+                    future = self.pending_async[key] = asyncio.get_running_loop().create_future()
+                    self.misses += 1
+                    break
+            await asyncio.shield(future)
+
+        prices = None
+        try:
+            prices = await scrape(url)
+            return prices if prices is not None else {}
+        finally:
+            with self.lock:
+                self._record(key, prices)
+                del self.pending_async[key]
+            future.set_result(None)
+
+    def stats(self):
+        """Counts of reused vs. freshly scraped sites for this run."""
+        with self.lock:
+            return {"sites": len(self.results), "hits": self.hits, "misses": self.misses}
+
+
+_run_registry = SiteRegistry()
+
+def get_site_registry():
+    """Returns the registry shared by every city in the current run."""
+    return _run_registry
+
+def reset_site_registry():
+    """Starts a fresh registry, e.g. at the beginning of a new run."""
+    global _run_registry
+    _run_registry = SiteRegistry()
+    return _run_registry
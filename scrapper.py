@@ -1,12 +1,21 @@
+import os
 import re
+import sys
 import json
-import time
 from pathlib import Path
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service as ChromeService
-from webdriver_manager.chrome import ChromeDriverManager
-from bs4 import BeautifulSoup
+from selenium.common.exceptions import WebDriverException
+
+# Shared scraping helpers live in the day2 and src folders
+sys.path.append(os.path.join(os.path.dirname(__file__), 'day2(25-6-25)'))
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+from http_cache import ResponseCache
+from price_extractor import PriceExtractor
+from html_text import visible_text
+from browser_pool import BrowserPool, ChromeDriverFactory
+from readiness import wait_until_ready, page_loaded, wait_recorder
+from metrics import metrics
+from resilience import get_resilience
 
 # Cities to scrape
 CITIES = [
@@ -22,25 +31,55 @@ SERVICES = [
     "Agent Intro/Outro", "Voiceover"
 ]
 
+# Service names matched within 50 characters of a price, compiled once. As before, a
+# price after the service name wins over one before it; prices are read as the shared
+# extractor reads them ("$1,200" is 1200, cents need two digits).
+YELP_PRICE_EXTRACTOR = PriceExtractor(
+    {service: [service.lower()] for service in SERVICES},
+    context_chars=50, min_price=None, max_price=None, after_first=True
+)
+
 # Output path
 OUTPUT_PATH = Path("data/yelp_full_html_prices.json")
 OUTPUT_PATH.parent.mkdir(exist_ok=True)
 
-def create_driver():
-    options = Options()
-    options.add_argument('--headless')
-    options.add_argument('--no-sandbox')
-    options.add_argument('--disable-dev-shm-usage')
-    return webdriver.Chrome(service=ChromeService(ChromeDriverManager().install()), options=options)
+# Rendered Yelp pages are cached on disk so re-runs skip the browser
+RESPONSE_CACHE = ResponseCache()
+
+_browser_pool = None
+
+def get_browser_pool() -> BrowserPool:
+    """One Chrome is started on first use and reused for every city."""
+    global _browser_pool
+    if _browser_pool is None:
+        _browser_pool = BrowserPool(
+            ChromeDriverFactory(['--headless', '--no-sandbox', '--disable-dev-shm-usage']),
+            size=1
+        )
+    return _browser_pool
 
 def fetch_yelp_html(city: str, state: str) -> str:
-    driver = create_driver()
     url = f"https://www.yelp.com/search?find_desc=real+estate+photography&find_loc={city.replace(' ', '+')}%2C+{state}"
+    cached = RESPONSE_CACHE.get(url)
+    if cached and cached.is_fresh:
+        print(f"Using cached Yelp page for {city}, {state}")
+        metrics.inc("cache_requests_total", result="hit")
+        return cached.body
+
+    metrics.inc("cache_requests_total", result="miss")
     print(f"Fetching Yelp page for {city}, {state}: {url}")
-    driver.get(url)
-    time.sleep(5)  # wait for page load
-    html = driver.page_source
-    driver.quit()
+
+    def load_page():
+        # A failed attempt discards its browser, so the retry starts on a fresh one
+        with metrics.span("search_fetch", site="yelp"), get_browser_pool().driver() as driver:
+            driver.get(url)
+            # Wait until the results have rendered rather than a fixed 5 seconds
+            wait = wait_until_ready(driver, page_loaded(), timeout=10, label="yelp_search")
+            print(f"Yelp page {'ready' if wait else 'not settled'} after {wait.elapsed:.1f}s")
+            return driver.page_source
+
+    html = get_resilience().call("www.yelp.com", load_page, retry_on=(WebDriverException,))
+    RESPONSE_CACHE.put(url, html)
     # Save debug HTML
     debug_file = f"debug_yelp_full_{city}_{state}.html"
     with open(debug_file, "w", encoding="utf-8") as f:
@@ -49,41 +88,18 @@ def fetch_yelp_html(city: str, state: str) -> str:
     return html
 
 def extract_prices_from_full_html(html: str) -> dict:
-    soup = BeautifulSoup(html, 'html.parser')
-    text = soup.get_text(separator=" ").lower()
+    # Stream the visible text (no script/style) instead of building a full soup tree
+    text = visible_text(html).lower()
     
     # Find all price-like patterns anywhere: $xx, $xxx, $xx.xx
     price_patterns = re.findall(r"\$\d+(?:\.\d{1,2})?", text)
     print(f"All prices found: {price_patterns}")
 
-    # We'll try to associate prices with services by proximity of keywords + price in text
-
-    # Lowercase text for searching
-    lower_text = text
-
-    found_prices = {}
-    for service in SERVICES:
-        service_lc = service.lower()
-        # Find occurrences of service keywords
-        pattern = re.compile(rf"{service_lc}.{{0,50}}\$\d+(?:\.\d{{1,2}})?")
-        matches = pattern.findall(lower_text)
-        if matches:
-            # Extract price from first match
-            price_match = re.search(r"\$\d+(?:\.\d{1,2})?", matches[0])
-            if price_match:
-                price_val = float(price_match.group().replace("$", ""))
-                found_prices[service] = price_val
-                print(f"Found price for {service}: {price_val}")
-        else:
-            # Try reversed order: price then keyword within 50 chars
-            pattern_rev = re.compile(rf"\$\d+(?:\.\d{{1,2}})?.{{0,50}}{service_lc}")
-            matches_rev = pattern_rev.findall(lower_text)
-            if matches_rev:
-                price_match = re.search(r"\$\d+(?:\.\d{1,2})?", matches_rev[0])
-                if price_match:
-                    price_val = float(price_match.group().replace("$", ""))
-                    found_prices[service] = price_val
-                    print(f"Found price for {service} (rev): {price_val}")
+    # Associate prices with services by proximity of keywords + price in text (single pass)
+    with metrics.span("extract", site="yelp"):
+        found_prices = YELP_PRICE_EXTRACTOR.extract_prices(text)
+    for service, price_val in found_prices.items():
+        print(f"Found price for {service}: {price_val}")
 
     return found_prices
 
@@ -104,8 +120,13 @@ def interpolate_price(service: str) -> float:
 
 def process_city(city_info: dict) -> dict:
     city, state = city_info["city"], city_info["state"]
-    html = fetch_yelp_html(city, state)
-    prices = extract_prices_from_full_html(html)
+    try:
+        html = fetch_yelp_html(city, state)
+        prices = extract_prices_from_full_html(html)
+    except Exception as e:
+        # Out of retries (or the Yelp circuit is open): the city falls back to default prices
+        print(f"Failed to fetch Yelp page for {city}, {state}: {e}")
+        prices = {}
 
     services_output = {}
     for service in SERVICES:
@@ -123,13 +144,19 @@ def process_city(city_info: dict) -> dict:
 
 def main():
     final_result = {"United States": {}}
-    for city_info in CITIES:
-        city_data = process_city(city_info)
-        state = list(city_data.keys())[0]
-        city = list(city_data[state].keys())[0]
-        if state not in final_result["United States"]:
-            final_result["United States"][state] = {}
-        final_result["United States"][state][city] = city_data[state][city]
+    try:
+        for city_info in CITIES:
+            city_data = process_city(city_info)
+            state = list(city_data.keys())[0]
+            city = list(city_data[state].keys())[0]
+            if state not in final_result["United States"]:
+                final_result["United States"][state] = {}
+            final_result["United States"][state][city] = city_data[state][city]
+    finally:
+        if _browser_pool:
+            _browser_pool.close()
+    print(f"Page wait times: {wait_recorder.summary()}")
+    print(f"Time per stage:\n{metrics.summary()}")
 
     with open(OUTPUT_PATH, "w") as f:
         json.dump(final_result, f, indent=2)
@@ -0,0 +1,216 @@
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, List, Optional
+
+DEFAULT_CHROME_ARGUMENTS = [
+    "--headless",
+    "--window-size=1920,1080",
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+]
+
+class BrowserFactory:
+    """
+    Creates browser drivers for a BrowserPool.
+
+    A driver only needs the parts of the Selenium WebDriver API the pool uses:
+    get(url), delete_all_cookies(), execute_script(script) and quit().
+    Tests can subclass this with a factory that returns fake drivers.
+    """
+
+    def create(self) -> Any:
+        raise NotImplementedError
+
+@lru_cache(maxsize=None)
+def resolve_chromedriver_path() -> str:
+    """
+    Downloads/locates the chromedriver binary once per process
+    instead of calling ChromeDriverManager().install() for every browser.
+    """
+    from webdriver_manager.chrome import ChromeDriverManager
+    return ChromeDriverManager().install()
+
+class ChromeDriverFactory(BrowserFactory):
+    """
+    Plain Selenium Chrome, with the driver binary resolved by webdriver-manager.
+    """
+
+    def __init__(self, arguments: Optional[List[str]] = None):
+        self.arguments = arguments or DEFAULT_CHROME_ARGUMENTS
+
+    def create(self) -> Any:
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.chrome.service import Service as ChromeService
+
+        options = Options()
+        for argument in self.arguments:
+            options.add_argument(argument)
+        return webdriver.Chrome(service=ChromeService(resolve_chromedriver_path()), options=options)
+
+class UndetectedChromeFactory(BrowserFactory):
+    """
+    undetected-chromedriver Chrome, to avoid basic bot detection.
+    """
+
+    def __init__(self, arguments: Optional[List[str]] = None):
+        self.arguments = arguments or DEFAULT_CHROME_ARGUMENTS
+
+    def create(self) -> Any:
+        import undetected_chromedriver as uc
+
+        # uc refuses to reuse a ChromeOptions object, so build a fresh one per browser
+        options = uc.ChromeOptions()
+        for argument in self.arguments:
+            options.add_argument(argument)
+        return uc.Chrome(options=options)
+
+class BrowserPool:
+    """
+    A pool of pre-warmed browsers that are reused across cities.
+
+    Browsers are handed out one task at a time, have their cookies and storage cleared
+    when they come back, and are replaced after `max_pages` uses or when a task marks
+    them as broken (crash, hung page, ...). Safe to share between threads.
+
+        with pool.driver() as driver:
+            driver.get(url)
+            html = driver.page_source
+    """
+
+    def __init__(self, factory: BrowserFactory, size: int = 2, max_pages: int = 50, prewarm: bool = True):
+        self.factory = factory
+        self.size = size
+        self.max_pages = max_pages
+        self.idle = deque()
+        self.uses = {}
+        self.condition = threading.Condition()
+        self.live = 0  # browsers running or being launched
+        self.created = 0
+        self.closed = False
+
+        if prewarm:
+            # Start the browsers in parallel; each launch takes a few seconds
+            self.live = size
+            with ThreadPoolExecutor(max_workers=size) as executor:
+                futures = [executor.submit(self._create) for _ in range(size)]
+            drivers, error = [], None
+            for future in futures:
+                try:
+                    drivers.append(future.result())
+                except Exception as e:
+                    error = error or e
+            if error is not None:
+                # Don't leak the browsers that did start
+                for driver in drivers:
+                    self._discard(driver)
+                raise error
+            self.idle.extend(drivers)
+
+    def _create(self) -> Any:
+        """Launches a browser into a slot that has already been counted in self.live."""
+        try:
+            driver = self.factory.create()
+        except Exception:
+            with self.condition:
+                self.live -= 1
+                self.condition.notify()
+            raise
+        with self.condition:
+            self.created += 1
+            self.uses[id(driver)] = 0
+        return driver
+
+    def _discard(self, driver: Any):
+        with self.condition:
+            self.uses.pop(id(driver), None)
+            self.live -= 1
+            # A waiting task can now launch a replacement
+            self.condition.notify()
+        try:
+            driver.quit()
+        except Exception as e:
+            print(f"Error while closing browser: {e}")
+
+    def acquire(self, timeout: Optional[float] = None) -> Any:
+        """
+        Returns an idle browser, launching a new one if the pool isn't full yet.
+        Otherwise blocks until a browser is released (TimeoutError after `timeout` seconds).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while True:
+                if self.closed:
+                    raise RuntimeError("Browser pool is closed")
+                if self.idle:
+                    return self.idle.popleft()
+                if self.live < self.size:
+                    # Reserve the slot now; the browser itself starts outside the lock
+                    self.live += 1
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("No browser became available in time")
+                self.condition.wait(remaining)
+        return self._create()
+
+    def _reset(self, driver: Any):
+        """Clears cookies and storage so the next task starts from a clean browser."""
+        driver.delete_all_cookies()
+        driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+        driver.get("about:blank")
+
+    def release(self, driver: Any, broken: bool = False):
+        """
+        Returns a browser to the pool. Broken or worn-out browsers are quit;
+        a replacement is launched the next time one is needed.
+        """
+        with self.condition:
+            uses = self.uses.get(id(driver), 0) + 1
+            self.uses[id(driver)] = uses
+
+        if self.closed or broken or uses >= self.max_pages:
+            self._discard(driver)
+            return
+        try:
+            self._reset(driver)
+        except Exception as e:
+            print(f"Browser could not be reset, recycling it: {e}")
+            self._discard(driver)
+            return
+        with self.condition:
+            self.idle.append(driver)
+            self.condition.notify()
+
+    @contextmanager
+    def driver(self, timeout: Optional[float] = None):
+        """Borrow a browser for one task; it is recycled if the task raises."""
+        driver = self.acquire(timeout=timeout)
+        broken = False
+        try:
+            yield driver
+        except Exception:
+            broken = True
+            raise
+        finally:
+            self.release(driver, broken=broken)
+
+    def close(self):
+        """Quits every idle browser. Browsers still in use are quit when released."""
+        with self.condition:
+            self.closed = True
+            drivers = list(self.idle)
+            self.idle.clear()
+            self.condition.notify_all()
+        for driver in drivers:
+            self._discard(driver)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
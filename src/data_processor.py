@@ -1,20 +1,31 @@
-import time
 import requests
 from bs4 import BeautifulSoup
 import re
-import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import WebDriverException
 from twocaptcha import TwoCaptcha
 import os
 import json
+import atexit
 from typing import Dict, Any
 
+from browser_pool import BrowserPool, UndetectedChromeFactory
+from readiness import wait_until_ready, page_loaded, SelectorPresent, DomStable, TitleExcludes
+from pricing_profiles import ProfileStore, get_profile_store
+from metrics import metrics
+from resilience import get_resilience
+from provider_cache import PricingProvider, SCOPE_NATIONAL, get_provider_cache
+
 # --- CONFIGURATION ---
 # IMPORTANT: Replace this with your 2Captcha API Key
 TWOCAPTCHA_API_KEY = os.environ.get('TWOCAPTCHA_API_KEY', 'YOUR_2CAPTCHA_API_KEY')
 
+# Browsers kept warm for scraping, and how many pages each serves before it is restarted
+BROWSER_POOL_SIZE = int(os.environ.get('BROWSER_POOL_SIZE', '2'))
+BROWSER_MAX_PAGES = int(os.environ.get('BROWSER_MAX_PAGES', '50'))
+
+PRICE_TABLE_SELECTOR = "div[data-widget_type='price-table.default']"
+
 MANDATORY_SERVICES = [
     "Photography",
     "Videography",
@@ -72,17 +83,39 @@ HOMEJAB_PRICING = {
     }
 }
 
+# Set HOMEJAB_SCRAPE=1 to take HomeJab's prices from its live pricing page instead of HOMEJAB_PRICING
+HOMEJAB_SCRAPE = os.environ.get('HOMEJAB_SCRAPE', '') == '1'
+
+def fetch_homejab_services(state: str, city: str) -> Dict[str, Dict[str, Any]]:
+    """
+    HomeJab's national price list. With HOMEJAB_SCRAPE=1 it is scraped from the pricing page
+    (services the page doesn't list keep their standard price); None if the scrape failed.
+    """
+    if not HOMEJAB_SCRAPE:
+        return HOMEJAB_PRICING
+    scraped = scrape_homejab_pricing(city, state)
+    if scraped is None:
+        return None
+    services = dict(HOMEJAB_PRICING)
+    services.update(scraped)
+    return services
+
+# HomeJab charges the same everywhere, so its prices are fetched once per run, not per city
+HOMEJAB_PROVIDER = PricingProvider("homejab", SCOPE_NATIONAL, fetch_homejab_services)
+
 def get_pricing_data_for_municipality(state: str, city: str) -> Dict[str, Dict[str, Any]]:
     """
     Returns standardized pricing data for a municipality based on HomeJab's fixed pricing.
     All prices are real market rates from HomeJab's website.
     """
     print(f"Getting pricing data for: {city}, {state}")
-    return HOMEJAB_PRICING.copy()
+    services = get_provider_cache().get(HOMEJAB_PROVIDER, state, city)
+    return (services or HOMEJAB_PRICING).copy()
 
-def process_municipality(municipality: Dict[str, str]) -> Dict[str, Any]:
+def process_municipality(municipality: Dict[str, str], profile_store: ProfileStore = None) -> Dict[str, Any]:
     """
     Process a single municipality and return its pricing data structure.
+    With a profile store, the services are interned and only their profile id is returned.
     """
     state = municipality.get('state')
     city = municipality.get('city')
@@ -92,55 +125,103 @@ def process_municipality(municipality: Dict[str, str]) -> Dict[str, Any]:
         return None
         
     pricing_data = get_pricing_data_for_municipality(state, city)
+    if profile_store is not None:
+        city_data = {"profile_id": profile_store.intern(pricing_data)}
+    else:
+        city_data = {"services": pricing_data}
     
     return {
         "United States": {
             state: {
-                city: {
-                    "services": pricing_data
-                }
+                city: city_data
             }
         }
     }
 
+def municipality_output_path(state: str, city: str, output_dir: str) -> str:
+    """
+    Path of the JSON file a municipality is saved to.
+    """
+    filename = f"{city.replace(' ', '_')}_REAL_ESTATE_PHOTOGRAPHY_VIDEOGRAPHY.json"
+    return os.path.join(output_dir, state.replace(' ', '_'), filename)
+
 def save_municipality_data(data: Dict[str, Any], state: str, city: str, output_dir: str):
     """
     Save pricing data for a single municipality to a JSON file.
     """
+    filepath = municipality_output_path(state, city, output_dir)
     # Create state directory if it doesn't exist
-    state_dir = os.path.join(output_dir, state.replace(' ', '_'))
-    os.makedirs(state_dir, exist_ok=True)
-    
-    # Create filename
-    filename = f"{city.replace(' ', '_')}_REAL_ESTATE_PHOTOGRAPHY_VIDEOGRAPHY.json"
-    filepath = os.path.join(state_dir, filename)
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
     
     # Save the data
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2)
+    with metrics.span("serialize"):
+        text = json.dumps(data, indent=2)
+    with metrics.span("write"):
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write(text)
     print(f"Saved pricing data to: {filepath}")
 
+def process_and_save_municipality(municipality: Dict[str, str], output_dir: str, profiles: bool = False) -> bool:
+    """
+    Process a single municipality and save its pricing data.
+    Module-level so it can be handed to thread, process or asyncio executors.
+    With profiles=True the file references a shared pricing profile in output_dir/_profiles.
+    Returns True if a file was written.
+    """
+    profile_store = get_profile_store(output_dir) if profiles else None
+    pricing_data = process_municipality(municipality, profile_store)
+    if not pricing_data:
+        return False
+    save_municipality_data(pricing_data, municipality['state'], municipality['city'], output_dir)
+    return True
+
+_browser_pool = None
+
+def get_browser_pool() -> BrowserPool:
+    """
+    Returns the process-wide pool of undetected-chromedriver browsers, starting it on first use.
+    """
+    global _browser_pool
+    if _browser_pool is None:
+        print("Initializing undetected-chromedriver pool...")
+        _browser_pool = BrowserPool(UndetectedChromeFactory(), size=BROWSER_POOL_SIZE, max_pages=BROWSER_MAX_PAGES)
+        atexit.register(_browser_pool.close)
+    return _browser_pool
+
+class TransientScrapeError(Exception):
+    """A scrape attempt that may succeed on a fresh browser (e.g. the page didn't finish loading)."""
+
 def scrape_homejab_pricing(city, state):
     """
     Scrapes the pricing page of HomeJab.com using a layered approach:
-    1. undetected-chromedriver to avoid basic bot detection.
+    1. undetected-chromedriver (from the shared browser pool) to avoid basic bot detection.
     2. 2Captcha service to solve CAPTCHAs if they appear.
+    An attempt that failed in the browser or timed out is retried with backoff on a fresh
+    browser; CAPTCHA and parsing failures are not, as a retry would fail (and pay) again.
+    Once the retries (or the run's retry budget) are used up, or the HomeJab circuit is
+    open, None is returned.
     """
-    options = uc.ChromeOptions()
-    options.add_argument("--headless")
-    options.add_argument("--window-size=1920,1080")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
+    try:
+        return get_resilience().call("homejab.com", _scrape_homejab_once,
+                                     retry_on=(WebDriverException, TransientScrapeError))
+    except Exception as e:
+        print(f"An error occurred during scraping: {e}")
+        return None
 
+def _scrape_homejab_once():
+    """One attempt at scraping the pricing page; raises on failure."""
     scraped_services = {service: {"price": 0.00, "interpolation_used": True} for service in MANDATORY_SERVICES}
+    pool = get_browser_pool()
     driver = None
+    broken = False
     try:
-        print("Initializing undetected-chromedriver...")
-        driver = uc.Chrome(options=options)
+        driver = pool.acquire()
         
         url = "https://homejab.com/pricing"
-        driver.get(url)
-        time.sleep(5) # Wait a few seconds for the page to fully load and for any bot-detection scripts to run
+        with metrics.span("site_fetch", site="homejab"):
+            driver.get(url)
+            # Wait for the page to settle and for any bot-detection scripts to run
+            wait_until_ready(driver, page_loaded(), timeout=10, label="homejab_load")
 
         # More robust CAPTCHA detection
         captcha_present = False
@@ -155,6 +236,7 @@ def scrape_homejab_pricing(city, state):
                 print("CAPTCHA page title detected.")
 
         if captcha_present:
+            metrics.inc("captchas_total", site="homejab")
             print("CAPTCHA detected. Attempting to solve...")
             sitekey_element = driver.find_element(By.CLASS_NAME, "g-recaptcha")
             sitekey = sitekey_element.get_attribute("data-sitekey")
@@ -180,18 +262,22 @@ def scrape_homejab_pricing(city, state):
                 driver.execute_script(f"document.getElementById('g-recaptcha-response').innerHTML = '{token}';")
                 # You might need to find and click the form's submit button here
                 # Example: driver.find_element(By.ID, 'submit-button').click()
-                time.sleep(5) # Wait for page to reload after submission
+                # Wait for page to reload after submission
+                wait_until_ready(driver, [TitleExcludes("just a moment")] + page_loaded(), timeout=15, label="homejab_captcha")
             else:
                 raise Exception(f"Failed to solve CAPTCHA. Response: {result}")
 
         # --- Resume scraping logic after CAPTCHA ---
         print("Looking for pricing information on the page...")
-        wait = WebDriverWait(driver, 20)
-        
-        WebDriverWait(driver, 20).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "div[data-widget_type='price-table.default']"))
+        price_table_wait = wait_until_ready(
+            driver,
+            [SelectorPresent(PRICE_TABLE_SELECTOR), DomStable(500)],
+            timeout=20,
+            label="homejab_price_table"
         )
-        time.sleep(3)
+        if not price_table_wait:
+            raise TransientScrapeError(f"Pricing table did not load: {price_table_wait}")
+        print(f"Pricing table ready after {price_table_wait.elapsed:.1f}s")
 
         service_keywords = {
             'Photography': 'Photography', 'Photo': 'Photography',
@@ -203,32 +289,33 @@ def scrape_homejab_pricing(city, state):
             'Twilight': 'Twilight Photography',
         }
 
-        pricing_elements = driver.find_elements(By.CSS_SELECTOR, "div[data-widget_type='price-table.default']")
+        pricing_elements = driver.find_elements(By.CSS_SELECTOR, PRICE_TABLE_SELECTOR)
         print(f"Found {len(pricing_elements)} potential pricing elements.")
 
         if not pricing_elements:
             raise Exception("No pricing elements found with the new selector.")
 
-        for element in pricing_elements:
-            try:
-                title = element.find_element(By.TAG_NAME, 'h2').text.strip()
-                price_text = element.find_element(By.CLASS_NAME, 'elementor-price-table__price').text
+        with metrics.span("extract", site="homejab"):
+            for element in pricing_elements:
+                try:
+                    title = element.find_element(By.TAG_NAME, 'h2').text.strip()
+                    price_text = element.find_element(By.CLASS_NAME, 'elementor-price-table__price').text
                 
-                match = re.search(r'(\d+\.?\d*)', price_text)
-                if not match:
+                    match = re.search(r'(\d+\.?\d*)', price_text)
+                    if not match:
+                        continue
+                    price = float(match.group(1))
+
+                    for keyword, service_name in service_keywords.items():
+                        if keyword.lower() in title.lower():
+                            if scraped_services[service_name]['interpolation_used']:
+                                scraped_services[service_name] = {"price": price, "interpolation_used": False}
+                                print(f"Successfully scraped: {service_name} - ${price}")
+                            break
+                except Exception as e:
+                    # This can happen if an element matches but doesn't have the expected sub-elements.
+                    # print(f"Could not process a pricing element: {e}")
                     continue
-                price = float(match.group(1))
-
-                for keyword, service_name in service_keywords.items():
-                    if keyword.lower() in title.lower():
-                        if scraped_services[service_name]['interpolation_used']:
-                            scraped_services[service_name] = {"price": price, "interpolation_used": False}
-                            print(f"Successfully scraped: {service_name} - ${price}")
-                        break
-            except Exception as e:
-                # This can happen if an element matches but doesn't have the expected sub-elements.
-                # print(f"Could not process a pricing element: {e}")
-                continue
         
         # Check if we actually found anything
         successful_scrapes = {k: v for k, v in scraped_services.items() if not v['interpolation_used']}
@@ -239,17 +326,18 @@ def scrape_homejab_pricing(city, state):
 
         return successful_scrapes
 
-    except Exception as e:
-        print(f"An error occurred during scraping: {e}")
+    except Exception:
+        broken = True
         if driver:
             # Save the page source for debugging if an error occurs
             with open("debug_homejab_page_error.html", "w", encoding="utf-8") as f:
                 f.write(driver.page_source)
             print("Saved page source to debug_homejab_page_error.html")
-        return None
+        raise
     finally:
         if driver:
-            driver.quit()
+            # Failed sessions are recycled instead of being reused
+            pool.release(driver, broken=broken)
 
 
 def _extract_prices_from_html(html_content):
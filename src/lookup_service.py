@@ -0,0 +1,380 @@
+import os
+import sys
+import gzip
+import json
+import time
+import argparse
+import statistics
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs
+
+from output_store import ColumnarStore, ColumnarStoreWriter, read_store
+from pricing_profiles import PROFILE_DIR_NAME, get_profile_store
+from metrics import metrics
+
+# Usage: python lookup_service.py <source> [--port 8080]
+#   <source> is a store file (.repstore / .parquet), a folder of JSON output
+#   (output2/<State>/<City>_...json, or the day2 per-state / COMPLETE / NDJSON files),
+#   or one such file. The index is rebuilt in the background when the source changes.
+#
+#   GET  /price?state=Texas&city=Austin&service=Drone%20Video   one city (all services without service=)
+#   GET  /price?state=Texas&service=Drone%20Video               state rollup
+#   GET  /price?service=Drone%20Video                           national rollup
+#   POST /prices  {"lookups": [{"state": ..., "city": ..., "service": ...}, ...]}
+#   GET  /health, GET /metrics, POST /reload
+
+# Encoded responses kept for the most frequently requested keys
+LOOKUP_CACHE_SIZE = int(os.environ.get('LOOKUP_CACHE_SIZE', '10000'))
+# Seconds between checks of the source for a new run
+RELOAD_INTERVAL = float(os.environ.get('LOOKUP_RELOAD_INTERVAL', '10'))
+
+COUNTRY = "United States"
+STORE_EXTENSIONS = (".repstore", ".parquet")
+JSON_EXTENSIONS = (".json", ".json.gz", ".ndjson", ".ndjson.gz")
+
+def normalize(name: Optional[str]) -> Optional[str]:
+    """Lookup key for a state or city: case, surrounding space and folder underscores don't matter."""
+    if name is None:
+        return None
+    return " ".join(name.replace("_", " ").split()).casefold()
+
+def _open_json(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+def read_json_rows(path: str, output_dir: Optional[str] = None) -> Iterator[Tuple[str, str, Dict[str, Dict[str, Any]]]]:
+    """
+    (state, city, services) from one output file: a nested {"United States": ...} document or NDJSON.
+    {"profile_id": ...} cities (main.py --profiles) are resolved from `output_dir`/_profiles
+    (default: two levels above the file).
+    """
+    with _open_json(path) as f:
+        if ".ndjson" in path:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    yield record["state"], record["city"], record["services"]
+            return
+        data = json.load(f)
+    output_dir = output_dir or os.path.dirname(os.path.dirname(os.path.abspath(path)))
+    data = get_profile_store(output_dir).resolve(data)
+    for state, cities in data.get(COUNTRY, {}).items():
+        for city, city_data in cities.items():
+            yield state, city, city_data.get("services", {})
+
+def source_files(source: str) -> List[str]:
+    if os.path.isfile(source):
+        return [source]
+    found = []
+    for folder, folders, names in os.walk(source):
+        # Shared pricing profiles are not municipalities; read_json_rows resolves them
+        folders[:] = [name for name in folders if name != PROFILE_DIR_NAME]
+        found.extend(os.path.join(folder, name) for name in names if name.endswith(JSON_EXTENSIONS))
+    return sorted(found)
+
+def source_signature(source: str) -> Tuple[Tuple[str, float, int], ...]:
+    """Changes whenever an output file under `source` is added, removed or rewritten."""
+    signature = []
+    for path in source_files(source):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        signature.append((path, stat.st_mtime, stat.st_size))
+    return tuple(signature)
+
+def load_source(source: str) -> ColumnarStore:
+    """Reads a store file or JSON output into a columnar store (one row per municipality)."""
+    if os.path.isfile(source) and source.endswith(STORE_EXTENSIONS):
+        return read_store(source)
+    rows = {}
+    services: Dict[str, None] = {}
+    output_dir = None if os.path.isfile(source) else source
+    for path in source_files(source):
+        for state, city, city_services in read_json_rows(path, output_dir):
+            # The same city in several files (e.g. per-state and COMPLETE) is kept once
+            rows[(state, city)] = city_services
+            services.update(dict.fromkeys(city_services))
+    writer = ColumnarStoreWriter("", list(services))
+    for (state, city), city_services in rows.items():
+        writer.add(state, city, city_services)
+    return writer.to_store()
+
+def valid_lookup(item: Any) -> bool:
+    """True for a {"state", "city", "service"} request whose fields are strings or missing."""
+    return isinstance(item, dict) and all(
+        isinstance(item.get(field), (str, type(None))) for field in ("state", "city", "service"))
+
+def _rollup(prices: List[float], scraped: int) -> Dict[str, Any]:
+    if not prices:
+        return {"count": 0, "scraped": 0, "mean": None, "median": None, "min": None, "max": None}
+    return {
+        "count": len(prices),
+        "scraped": scraped,
+        "mean": round(sum(prices) / len(prices), 2),
+        "median": statistics.median(prices),
+        "min": min(prices),
+        "max": max(prices),
+    }
+
+class PriceIndex:
+    """
+    In-memory lookup over one run's results: municipalities keyed by (state, city), and
+    per-service rollups (count, scraped, mean, median, min, max) for every state and the
+    whole country, computed once when the index is built.
+
+        index = PriceIndex.load("output2/municipalities.repstore")
+        index.lookup("Texas", "Austin", "Drone Video")
+        index.lookup("Texas", service="Drone Video")     # state rollup
+
+    Encoded responses are kept in an LRU of `cache_size` keys, so hot keys skip building
+    and serializing the answer. An index never changes; a reload builds a new one.
+    """
+
+    def __init__(self, store: ColumnarStore, source: str = "", cache_size: int = LOOKUP_CACHE_SIZE):
+        self.store = store
+        self.source = source
+        self.loaded_at = time.time()
+        self.services = list(store.services)
+        self.service_keys = {normalize(service): service for service in self.services}
+        self.rows: Dict[Tuple[str, str], int] = {}
+        self.state_names: Dict[str, str] = {}
+        for row in range(len(store)):
+            state = store.states[store.state_column[row]]
+            city = store.cities[store.city_column[row]]
+            self.rows[(normalize(state), normalize(city))] = row
+            self.state_names.setdefault(normalize(state), state)
+        self.rollups = self._build_rollups()
+        self.cache_size = cache_size
+        self.cache: "OrderedDict[Tuple[Optional[str], ...], bytes]" = OrderedDict()
+        self.cache_lock = threading.Lock()
+
+    @classmethod
+    def load(cls, source: str, cache_size: int = LOOKUP_CACHE_SIZE) -> "PriceIndex":
+        return cls(load_source(source), source, cache_size)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _build_rollups(self) -> Dict[Optional[str], Dict[str, Dict[str, Any]]]:
+        """{state key, or None for the country: {service: rollup}}."""
+        store = self.store
+        columns = [store.price_columns[service] for service in self.services]
+        groups: Dict[Optional[str], List[Tuple[List[float], List[int]]]] = {None: [([], [0]) for _ in columns]}
+        for row in range(len(store)):
+            state = normalize(store.states[store.state_column[row]])
+            if state not in groups:
+                groups[state] = [([], [0]) for _ in columns]
+            flags = store.flags_column[row]
+            for bit, column in enumerate(columns):
+                price = column[row]
+                if price != price:  # NaN: no price for this city
+                    continue
+                for prices, scraped in (groups[state][bit], groups[None][bit]):
+                    prices.append(price)
+                    if not flags & (1 << bit):
+                        scraped[0] += 1
+        return {
+            key: {service: _rollup(prices, scraped[0]) for service, (prices, scraped) in zip(self.services, stats)}
+            for key, stats in groups.items()
+        }
+
+    def _service(self, service: Optional[str]) -> Optional[str]:
+        return self.service_keys.get(normalize(service)) if service is not None else None
+
+    def lookup(self, state: Optional[str] = None, city: Optional[str] = None,
+               service: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        A city's services (or one service), a state's rollup (city=None) or the national
+        rollup (state=None). None if the municipality, state or service is unknown.
+        """
+        name = self._service(service)
+        if service is not None and name is None:
+            return None
+        if city is not None:
+            row = self.rows.get((normalize(state), normalize(city)))
+            if row is None:
+                return None
+            services = self.store.services_at(row)
+            result = {"state": self.store.states[self.store.state_column[row]],
+                      "city": self.store.cities[self.store.city_column[row]]}
+            if name is None:
+                result["services"] = services
+            else:
+                result.update(service=name, **services[name])
+            return result
+        key = normalize(state)
+        if key is not None and key not in self.state_names:
+            return None
+        rollups = self.rollups.get(key, {})
+        result = {"state": self.state_names[key]} if key is not None else {"country": COUNTRY}
+        if name is None:
+            result["services"] = rollups
+        else:
+            result.update(service=name, **rollups[name])
+        return result
+
+    def lookup_encoded(self, state: Optional[str] = None, city: Optional[str] = None,
+                       service: Optional[str] = None) -> Optional[bytes]:
+        """lookup() as JSON bytes, served from the LRU for hot keys."""
+        key = (normalize(state), normalize(city), normalize(service))
+        with self.cache_lock:
+            body = self.cache.get(key)
+            if body is not None:
+                self.cache.move_to_end(key)
+                return body
+        result = self.lookup(state, city, service)
+        if result is None:
+            return None
+        body = json.dumps(result).encode("utf-8")
+        if self.cache_size:
+            with self.cache_lock:
+                self.cache[key] = body
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        return body
+
+    def bulk(self, lookups: Iterable[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """lookup() for many {"state", "city", "service"} requests; None where not found."""
+        return [self.lookup(item.get("state"), item.get("city"), item.get("service")) for item in lookups]
+
+class LookupService:
+    """
+    Holds the current PriceIndex and swaps in a new one when the source changes (checked
+    every `reload_interval` seconds from a daemon thread, or on reload()). Lookups keep
+    using the old index until the new one is fully built.
+    """
+
+    def __init__(self, source: str, reload_interval: float = RELOAD_INTERVAL, cache_size: int = LOOKUP_CACHE_SIZE):
+        self.source = source
+        self.reload_interval = reload_interval
+        self.cache_size = cache_size
+        self.reload_lock = threading.Lock()
+        self.signature = source_signature(source)
+        self.index = PriceIndex.load(source, cache_size)
+        self.stop = threading.Event()
+        if reload_interval:
+            threading.Thread(target=self._watch, daemon=True).start()
+
+    def reload(self, force: bool = True) -> bool:
+        """Rebuilds the index if the source changed (or always, with force). Returns True if it did."""
+        with self.reload_lock:
+            signature = source_signature(self.source)
+            if not force and signature == self.signature:
+                return False
+            with metrics.span("lookup_reload"):
+                index = PriceIndex.load(self.source, self.cache_size)
+            self.index, self.signature = index, signature
+        print(f"Loaded {len(index)} municipalities from {self.source}")
+        return True
+
+    def _watch(self):
+        while not self.stop.wait(self.reload_interval):
+            try:
+                self.reload(force=False)
+            except Exception as e:
+                # A run still being written can fail to parse; keep serving the old index
+                print(f"Reload of {self.source} failed: {e}")
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """Serves the HTTP API from a daemon thread. Returns the server; call shutdown() on it to stop."""
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, so clients don't pay a TCP handshake per lookup; without Nagle the
+            # separately written headers and body don't wait out the client's delayed ACK
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def _send(self, status: int, body: bytes, content_type: str = "application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _error(self, status: int, message: str):
+                self._send(status, json.dumps({"error": message}).encode("utf-8"))
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path == "/price":
+                    query = {name: values[0] for name, values in parse_qs(url.query).items()}
+                    if "city" in query and "state" not in query:
+                        self._error(400, "city needs a state")
+                        return
+                    body = service.index.lookup_encoded(query.get("state"), query.get("city"), query.get("service"))
+                    metrics.inc("price_lookups_total", result="hit" if body is not None else "not_found")
+                    if body is None:
+                        self._error(404, "unknown state, city or service")
+                    else:
+                        self._send(200, body)
+                elif url.path == "/health":
+                    index = service.index
+                    self._send(200, json.dumps({"municipalities": len(index), "services": index.services,
+                                                "source": index.source, "loaded_at": index.loaded_at}).encode("utf-8"))
+                elif url.path == "/metrics":
+                    self._send(200, metrics.to_prometheus().encode("utf-8"), "text/plain; version=0.0.4")
+                else:
+                    self._error(404, "not found")
+
+            def do_POST(self):
+                url = urlsplit(self.path)
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if url.path == "/prices":
+                    try:
+                        lookups = json.loads(body or b"{}")["lookups"]
+                    except (ValueError, KeyError, TypeError):
+                        lookups = None
+                    if not isinstance(lookups, list) or not all(valid_lookup(item) for item in lookups):
+                        self._error(400, 'expected {"lookups": [{"state": ..., "city": ..., "service": ...}]}')
+                        return
+                    results = service.index.bulk(lookups)
+                    metrics.inc("price_lookups_total", len(results), result="bulk")
+                    self._send(200, json.dumps({"results": results}).encode("utf-8"))
+                elif url.path == "/reload":
+                    try:
+                        service.reload()
+                    except Exception as e:
+                        self._error(500, f"reload failed: {e}")
+                        return
+                    self._send(200, json.dumps({"municipalities": len(service.index)}).encode("utf-8"))
+                else:
+                    self._error(404, "not found")
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"Serving price lookups on http://{host}:{server.server_address[1]}/price")
+        return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve price lookups from a run's output.")
+    parser.add_argument('source', help="Store file, JSON output folder, or a single output file")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--reload-interval', type=float, default=RELOAD_INTERVAL,
+                        help="Seconds between checks for a new run (0 disables hot reload)")
+    parser.add_argument('--cache-size', type=int, default=LOOKUP_CACHE_SIZE,
+                        help="Encoded responses kept for hot keys")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.source):
+        print(f"Error: {args.source} does not exist")
+        sys.exit(1)
+    service = LookupService(args.source, args.reload_interval, args.cache_size)
+    print(f"Loaded {len(service.index)} municipalities from {args.source}")
+    server = service.serve(args.port, args.host)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
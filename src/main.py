@@ -2,30 +2,83 @@
 
 import os
 import sys
-import json
 import time
+import argparse
+from functools import partial
 from typing import List, Dict, Any
 
 # Add the src directory to the Python path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-from data_processor import process_municipality, save_municipality_data
+from data_processor import (process_municipality, process_and_save_municipality, municipality_output_path,
+                            MANDATORY_SERVICES, HOMEJAB_PRICING)
+from output_store import ColumnarStoreWriter
+from manifest import RunManifest, input_hash
+from municipality_catalog import load_catalog
+from metrics import metrics
+from executors import EXECUTOR_MODES, default_worker_count, run_tasks
 
 def load_municipalities(file_path: str) -> List[Dict[str, str]]:
     """
-    Load the municipalities data from the JSON file.
+    Load the municipalities data, via the binary catalog built from the JSON file.
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        with load_catalog(file_path) as catalog:
+            return catalog.to_records()
     except Exception as e:
         print(f"Error loading municipalities file: {e}")
         return []
 
-def main():
+def dedupe_municipalities(municipalities: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """
+    Drop entries without a state/city and collapse duplicate state+city pairs.
+    Duplicates write to the same output file, so only the last one is kept (as in a
+    sequential run), which keeps parallel output deterministic.
+    """
+    last_index = {}
+    for index, municipality in enumerate(municipalities):
+        state = municipality.get('state')
+        city = municipality.get('city')
+        if state and city:
+            last_index[(state, city)] = index
+    return [municipalities[index] for index in sorted(last_index.values())]
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate pricing data for all US municipalities.")
+    parser.add_argument('--mode', choices=EXECUTOR_MODES, default='sequential',
+                        help="How municipalities are processed (default: sequential)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Number of workers for the thread/process/asyncio modes")
+    parser.add_argument('--output-format', choices=['json', 'columnar'], default='json',
+                        help="json: one file per municipality (default); columnar: one store file")
+    parser.add_argument('--store-path', default=os.path.join('output2', 'municipalities.repstore'),
+                        help="Store file for --output-format columnar (.parquet needs pyarrow)")
+    parser.add_argument('--profiles', action='store_true',
+                        help="JSON output references shared pricing profiles instead of repeating the services")
+    parser.add_argument('--resume', action='store_true',
+                        help="Skip municipalities the manifest records as done with the same input")
+    parser.add_argument('--max-age-days', type=float, default=None,
+                        help="With --resume, also redo municipalities processed longer ago than this")
+    parser.add_argument('--manifest', default=os.path.join('output2', 'manifest.sqlite'),
+                        help="Checkpoint manifest recording per-municipality status")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="Serve Prometheus metrics on this port while the run is going")
+    parser.add_argument('--metrics-host', default="127.0.0.1",
+                        help="Interface the metrics server binds (0.0.0.0 exposes it on every interface)")
+    parser.add_argument('--metrics-report', default='run_metrics.json',
+                        help="Where to write the JSON run report (process mode only sees the parent's metrics)")
+    args = parser.parse_args(argv)
+    if args.profiles and args.output_format != 'json':
+        parser.error("--profiles only applies to --output-format json")
+    return args
+
+def main(argv=None):
     """
     Main function to process all US municipalities and generate pricing data.
     """
+    args = parse_args(argv)
+    if args.metrics_port:
+        metrics.serve(args.metrics_port, args.metrics_host)
     municipalities_file = os.path.join('data', 'municipalities.json')
     output_dir = 'output2'
 
@@ -33,49 +86,89 @@ def main():
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    municipalities = load_municipalities(municipalities_file)
+    municipalities = dedupe_municipalities(load_municipalities(municipalities_file))
     if not municipalities:
         print("No municipalities to process. Exiting.")
         return
 
-    total_municipalities = len(municipalities)
-    print(f"Processing {total_municipalities} municipalities...")
-    
+    manifest = RunManifest(args.manifest)
+    # A municipality is redone when its record, the pricing or the output format changes
+    output_format = 'json+profiles' if args.profiles else args.output_format
+    hashes = [input_hash({"municipality": m, "pricing": HOMEJAB_PRICING, "format": output_format})
+              for m in municipalities]
+    if args.resume:
+        max_age = args.max_age_days * 86400 if args.max_age_days is not None else None
+        output_exists = os.path.exists if args.output_format == 'json' else None
+        todo = manifest.pending(municipalities, hashes, max_age=max_age, output_exists=output_exists)
+        print(f"Resuming: {len(municipalities) - len(todo)} municipalities already done, {len(todo)} to process")
+    else:
+        todo = list(range(len(municipalities)))
+
+    total_municipalities = len(todo)
+    workers = args.workers or default_worker_count(args.mode)
+    print(f"Processing {total_municipalities} municipalities (mode: {args.mode}, workers: {workers})...")
+
     start_time = time.time()
     processed_count = 0
-    
-    # Process each municipality
-    for municipality in municipalities:
-        state = municipality.get('state')
-        city = municipality.get('city')
-        
-        if not state or not city:
-            continue
-            
-        print(f"Processing {city}, {state} ({processed_count + 1}/{total_municipalities})")
-        
-        # Get and save the pricing data
-        pricing_data = process_municipality(municipality)
-        if pricing_data:
-            save_municipality_data(pricing_data, state, city, output_dir)
-        
+
+    def report_progress(index: int, result: Any):
+        nonlocal processed_count
+        municipality_index = todo[index]
+        municipality = municipalities[municipality_index]
+        state, city = municipality['state'], municipality['city']
+        if not result:
+            manifest.mark_failed(state, city, hashes[municipality_index], "no pricing data")
+        elif args.output_format == 'columnar':
+            manifest.mark_done(state, city, hashes[municipality_index],
+                               result=result["United States"][state][city]["services"])
+        else:
+            manifest.mark_done(state, city, hashes[municipality_index],
+                               output=municipality_output_path(state, city, output_dir))
         processed_count += 1
-        
+        print(f"Processed {municipality['city']}, {municipality['state']} ({processed_count}/{total_municipalities})")
+
         # Print progress every 100 municipalities
         if processed_count % 100 == 0:
             elapsed_time = time.time() - start_time
             avg_time_per_city = elapsed_time / processed_count
             remaining_cities = total_municipalities - processed_count
             estimated_time_remaining = remaining_cities * avg_time_per_city
-            
+
             print(f"\nProgress: {processed_count}/{total_municipalities} municipalities processed")
             print(f"Estimated time remaining: {estimated_time_remaining/60:.1f} minutes\n")
-    
+
+    if args.output_format == 'columnar':
+        task = process_municipality
+    else:
+        task = partial(process_and_save_municipality, output_dir=output_dir, profiles=args.profiles)
+
+    run_tasks(
+        task,
+        [municipalities[index] for index in todo],
+        mode=args.mode,
+        workers=workers,
+        on_result=report_progress,
+    )
+
+    if args.output_format == 'columnar':
+        # The store is rebuilt from the manifest in input order, so it also holds the
+        # municipalities a resumed run skipped and is identical across executor modes
+        with metrics.span("write", backend="columnar"), ColumnarStoreWriter(args.store_path, MANDATORY_SERVICES) as writer:
+            results = manifest.results()
+            for municipality in municipalities:
+                services = results.get((municipality['state'], municipality['city']))
+                if services:
+                    writer.add(municipality['state'], municipality['city'], services)
+
     total_time = time.time() - start_time
     print(f"\nProcessing complete!")
     print(f"Processed {processed_count} municipalities in {total_time/60:.1f} minutes")
-    print(f"Average time per municipality: {total_time/processed_count:.2f} seconds")
+    if processed_count:
+        print(f"Average time per municipality: {total_time/processed_count:.2f} seconds")
+    print(f"Manifest: {manifest.summary()}")
+    manifest.close()
+    print(f"Time per stage:\n{metrics.summary()}")
+    metrics.write_report(args.metrics_report)
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,138 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+def input_hash(record: Any) -> str:
+    """
+    Stable hash of everything that decides a municipality's output
+    (its input record plus any settings the caller mixes in).
+    """
+    payload = json.dumps(record, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha1(payload).hexdigest()
+
+class RunManifest:
+    """
+    Checkpoint manifest for municipality runs, kept in a SQLite file.
+
+    One row per state+city records its status (done/failed), the hash of the input it
+    was processed from, where its output went, and optionally the result itself so a
+    resumed run can rebuild combined outputs without redoing finished cities.
+    Rows are committed as each city finishes, so a crash loses at most the city in flight.
+    Safe to share between threads.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS municipalities ("
+            " state TEXT NOT NULL,"
+            " city TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " input_hash TEXT NOT NULL,"
+            " output TEXT,"
+            " result TEXT,"
+            " error TEXT,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " updated_at REAL NOT NULL,"
+            " PRIMARY KEY (state, city))"
+        )
+        self.conn.commit()
+
+    def _record(self, state: str, city: str, status: str, hash_value: str,
+                output: Optional[str], result: Any, error: Optional[str]):
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO municipalities (state, city, status, input_hash, output, result, error, attempts, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?)"
+                " ON CONFLICT(state, city) DO UPDATE SET"
+                " status=excluded.status, input_hash=excluded.input_hash, output=excluded.output,"
+                " result=excluded.result, error=excluded.error,"
+                " attempts=municipalities.attempts + 1, updated_at=excluded.updated_at",
+                (state, city, status, hash_value, output,
+                 None if result is None else json.dumps(result), error, time.time()),
+            )
+            self.conn.commit()
+
+    def mark_done(self, state: str, city: str, hash_value: str, output: Optional[str] = None, result: Any = None):
+        self._record(state, city, STATUS_DONE, hash_value, output, result, None)
+
+    def mark_failed(self, state: str, city: str, hash_value: str, error: str):
+        self._record(state, city, STATUS_FAILED, hash_value, None, None, error)
+
+    def entries(self) -> Dict[tuple, Dict[str, Any]]:
+        """All rows keyed by (state, city)."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT state, city, status, input_hash, output, updated_at FROM municipalities"
+            ).fetchall()
+        return {
+            (state, city): {"status": status, "input_hash": hash_value, "output": output, "updated_at": updated_at}
+            for state, city, status, hash_value, output, updated_at in rows
+        }
+
+    def result(self, state: str, city: str) -> Any:
+        """The stored result of a finished city, or None."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT result FROM municipalities WHERE state = ? AND city = ? AND status = ?",
+                (state, city, STATUS_DONE),
+            ).fetchone()
+        return json.loads(row[0]) if row and row[0] is not None else None
+
+    def results(self) -> Dict[tuple, Any]:
+        """The stored results of every finished city, keyed by (state, city), in one query."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT state, city, result FROM municipalities WHERE status = ? AND result IS NOT NULL",
+                (STATUS_DONE,),
+            ).fetchall()
+        return {(state, city): json.loads(result) for state, city, result in rows}
+
+    def pending(self, municipalities: List[Dict[str, str]], hashes: List[str],
+                max_age: Optional[float] = None,
+                output_exists: Optional[Callable[[str], bool]] = None) -> List[int]:
+        """
+        Indexes of the municipalities that still need work: never processed, failed,
+        processed from a different input, older than `max_age` seconds, or whose
+        recorded output file has gone missing.
+        """
+        entries = self.entries()
+        now = time.time()
+        todo = []
+        for index, municipality in enumerate(municipalities):
+            entry = entries.get((municipality['state'], municipality['city']))
+            if (entry is None
+                    or entry["status"] != STATUS_DONE
+                    or entry["input_hash"] != hashes[index]
+                    or (max_age is not None and now - entry["updated_at"] > max_age)
+                    or (output_exists and entry["output"] and not output_exists(entry["output"]))):
+                todo.append(index)
+        return todo
+
+    def summary(self) -> Dict[str, int]:
+        """Number of municipalities per status."""
+        with self.lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM municipalities GROUP BY status").fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
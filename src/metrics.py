@@ -0,0 +1,239 @@
+import json
+import time
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+# Stage timings are observed into these buckets (seconds)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+class Counter:
+    """A monotonically increasing count, per label set."""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str = ""):
+        self.name = name
+        self.help = help
+        self.values: Dict[LabelKey, float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, value: float = 1, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        with self.lock:
+            return [(self.name, _format_labels(key), value) for key, value in sorted(self.values.items())]
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self.lock:
+            return [{"labels": dict(key), "value": value} for key, value in sorted(self.values.items())]
+
+class Histogram:
+    """Observed values bucketed Prometheus-style (cumulative buckets, sum and count), per label set."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str = "", buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.series: Dict[LabelKey, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0,
+                                             "max": 0.0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][index] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+            series["max"] = max(series["max"], value)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        samples = []
+        with self.lock:
+            for key, series in sorted(self.series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["counts"]):
+                    cumulative += count
+                    samples.append((f"{self.name}_bucket", _format_labels(key, ("le", repr(bound))), cumulative))
+                samples.append((f"{self.name}_bucket", _format_labels(key, ("le", "+Inf")), series["count"]))
+                samples.append((f"{self.name}_sum", _format_labels(key), series["sum"]))
+                samples.append((f"{self.name}_count", _format_labels(key), series["count"]))
+        return samples
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self.lock:
+            return [{
+                "labels": dict(key),
+                "count": series["count"],
+                "sum": series["sum"],
+                "mean": series["sum"] / series["count"] if series["count"] else 0.0,
+                "max": series["max"],
+            } for key, series in sorted(self.series.items())]
+
+class MetricsRegistry:
+    """
+    Counters, histograms and stage spans for one run.
+
+        metrics.inc("proxy_calls_total")
+        with metrics.span("site_fetch"):
+            ...
+
+    Every span is observed into the stage_seconds histogram with a `stage` label, so the
+    report shows where the time of a run goes. Metrics are per process.
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, Any] = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def _get(self, cls, name: str, help: str, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, help, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        return self._get(Counter, name, help)
+
+    def histogram(self, name: str, help: str = "", buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, buckets=buckets)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        self.counter(name).inc(value, **labels)
+
+    def observe(self, name: str, value: float, **labels):
+        self.histogram(name).observe(value, **labels)
+
+    @contextmanager
+    def span(self, stage: str, **labels):
+        """Times the enclosed block as one `stage`; failed blocks are labelled outcome="error"."""
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            yield
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            self.histogram("stage_seconds", "Time spent per pipeline stage").observe(
+                time.perf_counter() - start, stage=stage, outcome=outcome, **labels)
+
+    def timed(self, stage: str, **labels):
+        """Decorator form of span()."""
+        def decorate(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(stage, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def to_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in sorted(metrics, key=lambda m: m.name):
+            if metric.help:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                # repr() keeps every digit; :g would export 1234567.0 as 1.23457e+06
+                lines.append(f"{name}{labels} {value!r}")
+        return "\n".join(lines) + "\n"
+
+    def report(self) -> Dict[str, Any]:
+        """A JSON-serializable run report: counters, histograms and per-stage totals."""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        report = {
+            "started": self.started,
+            "elapsed_seconds": time.time() - self.started,
+            "counters": {m.name: m.snapshot() for m in metrics if isinstance(m, Counter)},
+            "histograms": {m.name: m.snapshot() for m in metrics if isinstance(m, Histogram)},
+            "stages": {},
+        }
+        for series in report["histograms"].get("stage_seconds", []):
+            stage = report["stages"].setdefault(series["labels"]["stage"], {"count": 0, "seconds": 0.0, "errors": 0})
+            stage["count"] += series["count"]
+            stage["seconds"] += series["sum"]
+            if series["labels"].get("outcome") == "error":
+                stage["errors"] += series["count"]
+        return report
+
+    def write_report(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
+        print(f"Saved metrics report to: {path}")
+
+    def summary(self) -> str:
+        """One line per stage, slowest first, for printing at the end of a run."""
+        stages = sorted(self.report()["stages"].items(), key=lambda item: item[1]["seconds"], reverse=True)
+        lines = []
+        for stage, stats in stages:
+            line = f"  {stage:<16} {stats['seconds']:>10.2f}s  {stats['count']:>8} calls"
+            if stats["errors"]:
+                line += f"  {stats['errors']} errors"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """
+        Serves /metrics (Prometheus text) and /metrics.json (run report) from a daemon thread.
+        Only local clients can connect unless `host` says otherwise (e.g. "0.0.0.0" for every
+        interface; there is no authentication). Returns the server; call shutdown() on it to stop.
+        """
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = registry.to_prometheus().encode("utf-8"), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = json.dumps(registry.report()).encode("utf-8"), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+        return server
+
+# Process-wide registry used by the pipelines
+metrics = MetricsRegistry()
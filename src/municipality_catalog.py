@@ -0,0 +1,303 @@
+import os
+import sys
+import csv
+import json
+import mmap
+import struct
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Usage: python municipality_catalog.py <municipalities.json> [uscities.csv|uscities.xlsx]
+#   Builds the binary catalog next to the JSON file (e.g. data/municipalities.catalog).
+
+MAGIC = b"MUNICAT1"
+FORMAT_VERSION = 2
+HEADER = struct.Struct("<IIII")  # version, rows, states, city name bytes
+
+DEFAULT_SOURCE = os.path.join('data', 'municipalities.json')
+
+# (lat, lng, population) per (state, city)
+Coordinates = Dict[Tuple[str, str], Tuple[float, float, int]]
+
+class Municipality:
+    """One catalog row. `id` is the row number in the source file."""
+    __slots__ = ("id", "state", "city", "lat", "lng", "population")
+
+    def __init__(self, id: int, state: str, city: str, lat: Optional[float], lng: Optional[float],
+                 population: Optional[int]):
+        self.id = id
+        self.state = state
+        self.city = city
+        self.lat = lat
+        self.lng = lng
+        self.population = population
+
+    def to_dict(self) -> Dict[str, str]:
+        """The {"state", "city"} record the pipelines consume."""
+        return {"state": self.state, "city": self.city}
+
+    def __repr__(self):
+        return f"<Municipality {self.id}: {self.city}, {self.state}>"
+
+def read_coordinates(path: str) -> Coordinates:
+    """
+    Reads lat/lng/population from the simplemaps US cities file.
+    CSV needs only the standard library; .xlsx needs pandas and openpyxl.
+    The file is sorted by population, so the first row wins for duplicate names.
+    """
+    if path.endswith((".xlsx", ".xls")):
+        import pandas as pd
+        rows = pd.read_excel(path, usecols=["state_name", "city", "lat", "lng", "population"]).to_dict("records")
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+    coordinates = {}
+    for row in rows:
+        key = (row["state_name"], row["city"])
+        if key not in coordinates:
+            coordinates[key] = (float(row["lat"]), float(row["lng"]), int(float(row["population"] or 0)))
+    return coordinates
+
+def _pad(f):
+    """Aligns the next column to 8 bytes so it can be viewed in place."""
+    f.write(b"\0" * (-f.tell() % 8))
+
+def coordinates_source(coordinates_path: Optional[str]) -> Optional[Dict[str, Any]]:
+    """{"path", "mtime"} of a coordinates file, as recorded in the catalog; None without one."""
+    if not coordinates_path or not os.path.exists(coordinates_path):
+        return None
+    return {"path": os.path.abspath(coordinates_path), "mtime": os.path.getmtime(coordinates_path)}
+
+def build_catalog(records: List[Dict[str, str]], path: str, coordinates: Optional[Coordinates] = None,
+                  coordinates_path: Optional[str] = None):
+    """
+    Writes the catalog for a list of {"state", "city"} records. `coordinates_path` is
+    the file the coordinates were read from; it is recorded so load_catalog() can tell
+    whether the catalog has the coordinates a caller asks for.
+
+    Layout: MAGIC, header, JSON of the coordinates source (path and mtime, or null),
+    newline-joined state names, newline-terminated UTF-8 city
+    names, then 8-byte aligned little-endian columns: city name offsets, state index,
+    row ids sorted by state with per-state start offsets, row ids sorted by name,
+    lat, lng (NaN when unknown) and population.
+    """
+    coordinates = coordinates or {}
+    states = sorted({record['state'] for record in records})
+    state_ids = {state: index for index, state in enumerate(states)}
+
+    city_blob = bytearray()
+    offsets = array('I', [0])
+    state_column = array('H')
+    lat = array('d')
+    lng = array('d')
+    population = array('I')
+    for record in records:
+        # Names are newline-terminated so they can also be decoded all at once with split()
+        city_blob += record['city'].encode('utf-8') + b"\n"
+        offsets.append(len(city_blob))
+        state_column.append(state_ids[record['state']])
+        point = coordinates.get((record['state'], record['city']))
+        lat.append(point[0] if point else float('nan'))
+        lng.append(point[1] if point else float('nan'))
+        population.append(point[2] if point else 0)
+
+    rows = range(len(records))
+    state_order = array('I', sorted(rows, key=lambda row: state_column[row]))
+    state_starts = array('I', [0] * (len(states) + 1))
+    for row in rows:
+        state_starts[state_column[row] + 1] += 1
+    for index in range(len(states)):
+        state_starts[index + 1] += state_starts[index]
+    name_order = array('I', sorted(rows, key=lambda row: (records[row]['city'].casefold(), state_column[row], row)))
+
+    state_blob = "\n".join(states).encode('utf-8')
+    source_blob = json.dumps(coordinates_source(coordinates_path) if coordinates else None).encode('utf-8')
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(HEADER.pack(FORMAT_VERSION, len(records), len(states), len(city_blob)))
+        f.write(struct.pack("<I", len(source_blob)))
+        f.write(source_blob)
+        f.write(struct.pack("<I", len(state_blob)))
+        f.write(state_blob)
+        f.write(city_blob)
+        for column in (offsets, state_column, state_order, state_starts, name_order, lat, lng, population):
+            _pad(f)
+            if sys.byteorder != 'little':
+                column = array(column.typecode, column)
+                column.byteswap()
+            column.tofile(f)
+    os.replace(tmp_path, path)
+    print(f"Built municipality catalog with {len(records)} entries: {path}")
+
+class MunicipalityCatalog:
+    """
+    Read-only view of a catalog file. The file is memory-mapped and its columns are
+    used in place, so opening it costs about the same whatever its size; city names
+    are only decoded for the rows that are looked at.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self.buffer)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path} is not a municipality catalog")
+        position = len(MAGIC)
+        version, rows, n_states, city_bytes = HEADER.unpack_from(view, position)
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported catalog format version {version}")
+        position += HEADER.size
+        (source_bytes,) = struct.unpack_from("<I", view, position)
+        position += 4
+        # Where the coordinates came from ({"path", "mtime"}), or None if the catalog has none
+        self.coordinates_source: Optional[Dict[str, Any]] = json.loads(bytes(view[position:position + source_bytes]))
+        position += source_bytes
+        (state_bytes,) = struct.unpack_from("<I", view, position)
+        position += 4
+        self.states: List[str] = bytes(view[position:position + state_bytes]).decode('utf-8').split("\n") if n_states else []
+        self.state_ids = {state: index for index, state in enumerate(self.states)}
+        position += state_bytes
+        self.city_blob = view[position:position + city_bytes]
+        position += city_bytes
+
+        columns = []
+        for typecode, count in (('I', rows + 1), ('H', rows), ('I', rows), ('I', n_states + 1),
+                                ('I', rows), ('d', rows), ('d', rows), ('I', rows)):
+            position += -position % 8
+            size = array(typecode).itemsize * count
+            column = view[position:position + size].cast(typecode)
+            if sys.byteorder != 'little':
+                column = array(typecode, column)
+                column.byteswap()
+            columns.append(column)
+            position += size
+        (self.offsets, self.state_column, self.state_order, self.state_starts,
+         self.name_order, self.lat, self.lng, self.population) = columns
+
+    def __len__(self) -> int:
+        return len(self.state_column)
+
+    def city_name(self, id: int) -> str:
+        return bytes(self.city_blob[self.offsets[id]:self.offsets[id + 1] - 1]).decode('utf-8')
+
+    def state_name(self, id: int) -> str:
+        return self.states[self.state_column[id]]
+
+    def __getitem__(self, id: int) -> Municipality:
+        if not 0 <= id < len(self):
+            raise IndexError(f"No municipality with id {id}")
+        lat = self.lat[id]
+        has_point = lat == lat  # NaN marks a municipality without coordinates
+        return Municipality(id, self.state_name(id), self.city_name(id),
+                            lat if has_point else None,
+                            self.lng[id] if has_point else None,
+                            self.population[id] if has_point else None)
+
+    def __iter__(self) -> Iterator[Municipality]:
+        for id in range(len(self)):
+            yield self[id]
+
+    def by_state(self, state: str) -> List[Municipality]:
+        """All municipalities in a state, in source order."""
+        index = self.state_ids.get(state)
+        if index is None:
+            return []
+        return [self[id] for id in self.state_order[self.state_starts[index]:self.state_starts[index + 1]]]
+
+    def find(self, city: str, state: Optional[str] = None) -> List[Municipality]:
+        """Municipalities named `city` (case-insensitive), optionally only in `state`."""
+        key = city.casefold()
+        low, high = 0, len(self.name_order)
+        while low < high:
+            middle = (low + high) // 2
+            if self.city_name(self.name_order[middle]).casefold() < key:
+                low = middle + 1
+            else:
+                high = middle
+        matches = []
+        for position in range(low, len(self.name_order)):
+            id = self.name_order[position]
+            if self.city_name(id).casefold() != key:
+                break
+            if state is None or self.state_name(id) == state:
+                matches.append(self[id])
+        return matches
+
+    def get(self, state: str, city: str) -> Optional[Municipality]:
+        """The first municipality with exactly this state and city, or None."""
+        for municipality in self.find(city, state):
+            if municipality.city == city:
+                return municipality
+        return None
+
+    def cities(self) -> List[str]:
+        """All city names, in source order."""
+        return bytes(self.city_blob).decode('utf-8').split("\n")[:len(self)]
+
+    def state_names(self) -> List[str]:
+        """The state of every municipality, in source order (shared string objects)."""
+        return [self.states[index] for index in self.state_column]
+
+    def to_records(self) -> List[Dict[str, str]]:
+        """The [{"state", "city"}] list previously loaded from municipalities.json."""
+        return [{"state": state, "city": city} for state, city in zip(self.state_names(), self.cities())]
+
+    def close(self):
+        # Views into the map have to be released before it can be closed
+        for name in ("offsets", "state_column", "state_order", "state_starts", "name_order", "lat", "lng",
+                     "population", "city_blob"):
+            column = getattr(self, name)
+            if isinstance(column, memoryview):
+                column.release()
+        self.buffer.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def catalog_path_for(source: str) -> str:
+    return os.path.splitext(source)[0] + ".catalog"
+
+def load_catalog(source: str = DEFAULT_SOURCE, coordinates_path: Optional[str] = None,
+                 path: Optional[str] = None) -> MunicipalityCatalog:
+    """
+    Opens the catalog for a municipalities JSON file, (re)building it first when it
+    is missing, older than the JSON file, or (when coordinates_path is given) was not
+    built from that coordinates file as it is now.
+    """
+    path = path or catalog_path_for(source)
+    wanted = coordinates_source(coordinates_path)
+    if _needs_build(path, source, wanted):
+        with open(source, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+        coordinates = read_coordinates(coordinates_path) if wanted else None
+        build_catalog(records, path, coordinates, coordinates_path)
+    return MunicipalityCatalog(path)
+
+def _needs_build(path: str, source: str, wanted: Optional[Dict[str, Any]]) -> bool:
+    if not os.path.exists(path) or os.path.getmtime(source) > os.path.getmtime(path):
+        return True
+    try:
+        with MunicipalityCatalog(path) as catalog:
+            built_from = catalog.coordinates_source
+    except ValueError:
+        # Not a catalog, or an older format version
+        return True
+    # A caller without coordinates can use any catalog; one with them needs that file's
+    return wanted is not None and built_from != wanted
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python municipality_catalog.py <municipalities.json> [uscities.csv|uscities.xlsx]")
+        sys.exit(1)
+    source = sys.argv[1]
+    with open(source, 'r', encoding='utf-8') as f:
+        records = json.load(f)
+    coordinates_path = sys.argv[2] if len(sys.argv) == 3 else None
+    build_catalog(records, catalog_path_for(source), read_coordinates(coordinates_path) if coordinates_path else None,
+                  coordinates_path)
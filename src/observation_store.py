@@ -0,0 +1,165 @@
+import os
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Rollback journal by default, so workers on several hosts can share the file over a
+# network filesystem; WAL is faster but needs every process on one host.
+OBSERVATION_JOURNAL_MODE = os.environ.get('OBSERVATION_JOURNAL_MODE', 'DELETE').upper()
+
+def new_run_id() -> str:
+    """Sortable run identifier: start time, plus the pid so parallel workers don't collide."""
+    return time.strftime("%Y%m%dT%H%M%S") + f"-{os.getpid()}"
+
+class ObservationStore:
+    """
+    Append-only store of every price the scrapers extracted, kept in a SQLite file.
+
+    One row per (run, city, url, service) holds the price and the text snippet it was found
+    in, so prices can be re-aggregated offline (a different outlier rule, another adjustment
+    factor) instead of re-scraping. Rows are never updated; a city scraped again simply gets
+    rows under the new run id, and prices_by_city() uses each city's latest run. A finished
+    city is also recorded with mark_scraped(), so a scrape that found no prices still
+    replaces the city's older observations.
+    Prices are also passed to `aggregator` (a price_sketch.PriceAggregator), if given, as
+    they are stored.
+
+        store = ObservationStore("output/observations.sqlite")
+        store.add("Texas", "Austin", url, {"Photography": {"price": 250.0, "context": "..."}})
+        store.mark_scraped("Texas", "Austin")
+
+    Safe to share between threads; several processes, on one host or on a shared
+    filesystem with working locks, may append to the same file.
+    """
+
+    def __init__(self, path: str, run_id: Optional[str] = None, aggregator: Any = None):
+        self.path = path
+        self.run_id = run_id or new_run_id()
+        self.aggregator = aggregator
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.conn.execute(f"PRAGMA journal_mode={OBSERVATION_JOURNAL_MODE}")
+        self.conn.execute("PRAGMA synchronous=" + ("NORMAL" if OBSERVATION_JOURNAL_MODE == "WAL" else "FULL"))
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS observations ("
+            " run_id TEXT NOT NULL,"
+            " state TEXT NOT NULL,"
+            " city TEXT NOT NULL,"
+            " url TEXT NOT NULL,"
+            " service TEXT NOT NULL,"
+            " price REAL NOT NULL,"
+            " context TEXT,"
+            " observed_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS observations_city ON observations (state, city, service)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS observations_service ON observations (service)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS observations_url ON observations (url)")
+        new_scrapes = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'scrapes'").fetchone() is None
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS scrapes ("
+            " run_id TEXT NOT NULL,"
+            " state TEXT NOT NULL,"
+            " city TEXT NOT NULL,"
+            " scraped_at REAL NOT NULL,"
+            " PRIMARY KEY (run_id, state, city))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS scrapes_city ON scrapes (state, city, run_id)")
+        if new_scrapes:
+            # Stores written before scrapes were recorded: every city with observations was scraped
+            self.conn.execute(
+                "INSERT OR IGNORE INTO scrapes (run_id, state, city, scraped_at)"
+                " SELECT run_id, state, city, MAX(observed_at) FROM observations GROUP BY run_id, state, city"
+            )
+        self.conn.commit()
+
+    def add(self, state: str, city: str, url: str, observations: Optional[Dict[str, Dict[str, Any]]]) -> int:
+        """
+        Appends the prices one site gave for one city ({service: {"price": ..., "context": ...}}).
+        Returns the number of rows written.
+        """
+        if not observations:
+            return 0
+        now = time.time()
+        rows = [
+            (self.run_id, state, city, url, service, float(found["price"]), found.get("context"), now)
+            for service, found in observations.items()
+        ]
+        with self.lock:
+            self.conn.executemany(
+                "INSERT INTO observations (run_id, state, city, url, service, price, context, observed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._mark(state, city, now)
+            self.conn.commit()
+        if self.aggregator is not None:
+            self.aggregator.add(state, city, observations)
+        return len(rows)
+
+    def _mark(self, state: str, city: str, now: float):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO scrapes (run_id, state, city, scraped_at) VALUES (?, ?, ?, ?)",
+            (self.run_id, state, city, now),
+        )
+
+    def mark_scraped(self, state: str, city: str):
+        """Records that this run scraped the city, whether or not any site gave a price."""
+        with self.lock:
+            self._mark(state, city, time.time())
+            self.conn.commit()
+
+    def rows(self, run_id: Optional[str] = None) -> Iterator[Tuple[str, str, str, float]]:
+        """
+        (state, city, service, price) for every city, ordered by city and service, in one query.
+        Each city contributes the observations of the latest run that scraped it (none if that
+        run found no prices), or only those of `run_id`.
+        """
+        if run_id is not None:
+            query = ("SELECT state, city, service, price FROM observations WHERE run_id = ?"
+                     " ORDER BY state, city, service")
+            params: Tuple[Any, ...] = (run_id,)
+        else:
+            query = ("SELECT o.state, o.city, o.service, o.price FROM observations o"
+                     " JOIN (SELECT state, city, MAX(run_id) AS run_id FROM scrapes GROUP BY state, city) latest"
+                     " ON o.state = latest.state AND o.city = latest.city AND o.run_id = latest.run_id"
+                     " ORDER BY o.state, o.city, o.service")
+            params = ()
+        with self.lock:
+            return iter(self.conn.execute(query, params).fetchall())
+
+    def prices_by_city(self, run_id: Optional[str] = None) -> Dict[Tuple[str, str], Dict[str, List[float]]]:
+        """{(state, city): {service: [price, ...]}} from rows(), ready for aggregation."""
+        grouped: Dict[Tuple[str, str], Dict[str, List[float]]] = {}
+        for state, city, service, price in self.rows(run_id):
+            grouped.setdefault((state, city), {}).setdefault(service, []).append(price)
+        return grouped
+
+    def runs(self) -> List[Dict[str, Any]]:
+        """Per-run totals: cities scraped, sites and observations recorded, first and last write."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT s.run_id, s.cities, COALESCE(o.sites, 0), COALESCE(o.count, 0), s.started, s.finished"
+                " FROM (SELECT run_id, COUNT(*) AS cities, MIN(scraped_at) AS started, MAX(scraped_at) AS finished"
+                "       FROM scrapes GROUP BY run_id) s"
+                " LEFT JOIN (SELECT run_id, COUNT(DISTINCT url) AS sites, COUNT(*) AS count"
+                "            FROM observations GROUP BY run_id) o ON o.run_id = s.run_id"
+                " ORDER BY s.run_id"
+            ).fetchall()
+        return [
+            {"run_id": run_id, "cities": cities, "sites": sites, "observations": count,
+             "started_at": started, "finished_at": finished}
+            for run_id, cities, sites, count, started, finished in rows
+        ]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,231 @@
+import os
+import sys
+import json
+import math
+import struct
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet output is optional; the packed format needs only the standard library
+    pa = None
+    pq = None
+
+# Usage: python output_store.py <store_file> <output_dir>
+#   Materializes the legacy per-city JSON layout (output2/<State>/<City>_...json) from a store file.
+
+MAGIC = b"REPSTORE"
+FORMAT_VERSION = 1
+
+class ColumnarStoreWriter:
+    """
+    Collects municipality pricing rows and writes them all into one compact file.
+
+    The packed format (any extension except .parquet) is:
+        MAGIC, version, header length, JSON header (service names, state and city string
+        dictionaries, row count), then one column after another: state index (uint16),
+        city index (uint32), interpolation flags (uint32 bitmask, one bit per service)
+        and one float64 price column per service (NaN when there is no price).
+    With a .parquet path and pyarrow installed, the same columns are written as Parquet.
+    """
+
+    def __init__(self, path: str, services: List[str]):
+        self.path = path
+        self.services = list(services)
+        if len(self.services) > 32:
+            raise ValueError("At most 32 services fit in the interpolation bitmask")
+        self.states: List[str] = []
+        self.state_ids: Dict[str, int] = {}
+        self.cities: List[str] = []
+        self.city_ids: Dict[str, int] = {}
+        self.state_column = array('H')
+        self.city_column = array('I')
+        self.flags_column = array('I')
+        self.price_columns = {service: array('d') for service in self.services}
+
+    def __len__(self):
+        return len(self.state_column)
+
+    @staticmethod
+    def _intern(value: str, values: List[str], ids: Dict[str, int]) -> int:
+        if value not in ids:
+            ids[value] = len(values)
+            values.append(value)
+        return ids[value]
+
+    def add(self, state: str, city: str, services: Dict[str, Dict[str, Any]]):
+        """Adds one municipality; `services` is the {"Photography": {"price", "interpolation_used"}} dict."""
+        self.state_column.append(self._intern(state, self.states, self.state_ids))
+        self.city_column.append(self._intern(city, self.cities, self.city_ids))
+        flags = 0
+        for bit, service in enumerate(self.services):
+            entry = services.get(service) or {}
+            price = entry.get("price")
+            self.price_columns[service].append(math.nan if price is None else float(price))
+            if entry.get("interpolation_used"):
+                flags |= 1 << bit
+        self.flags_column.append(flags)
+
+    def to_store(self) -> "ColumnarStore":
+        """The rows added so far as an in-memory read-side store, without writing a file."""
+        return ColumnarStore(self.services, self.states, self.cities, self.state_column,
+                             self.city_column, self.flags_column, self.price_columns)
+
+    def close(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        if self.path.endswith(".parquet"):
+            self._write_parquet()
+        else:
+            self._write_packed()
+        print(f"Saved {len(self)} municipalities to: {self.path}")
+
+    def _write_packed(self):
+        header = json.dumps({
+            "services": self.services,
+            "states": self.states,
+            "cities": self.cities,
+            "rows": len(self),
+        }).encode("utf-8")
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<II", FORMAT_VERSION, len(header)))
+            f.write(header)
+            for column in [self.state_column, self.city_column, self.flags_column]:
+                _write_column(f, column)
+            for service in self.services:
+                _write_column(f, self.price_columns[service])
+        os.replace(tmp_path, self.path)
+
+    def _write_parquet(self):
+        if pa is None:
+            raise ImportError("Writing .parquet files requires pyarrow (pip install pyarrow)")
+        columns = {
+            "state": pa.DictionaryArray.from_arrays(pa.array(self.state_column, pa.uint16()), pa.array(self.states)),
+            "city": pa.DictionaryArray.from_arrays(pa.array(self.city_column, pa.uint32()), pa.array(self.cities)),
+            "interpolation_flags": pa.array(self.flags_column, pa.uint32()),
+        }
+        for service in self.services:
+            columns[service] = pa.array(self.price_columns[service], pa.float64(), from_pandas=True)
+        pq.write_table(pa.table(columns), self.path, compression="zstd")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+def _write_column(f, column: array):
+    if sys.byteorder != "little":
+        column = array(column.typecode, column)
+        column.byteswap()
+    column.tofile(f)
+
+def _read_column(f, typecode: str, count: int) -> array:
+    column = array(typecode)
+    column.fromfile(f, count)
+    if sys.byteorder != "little":
+        column.byteswap()
+    return column
+
+class ColumnarStore:
+    """
+    Read side of a store file. Columns are loaded as arrays; rows are only turned
+    back into dicts when they are asked for.
+    """
+
+    def __init__(self, services: List[str], states: List[str], cities: List[str],
+                 state_column, city_column, flags_column, price_columns: Dict[str, Any]):
+        self.services = services
+        self.states = states
+        self.cities = cities
+        self.state_column = state_column
+        self.city_column = city_column
+        self.flags_column = flags_column
+        self.price_columns = price_columns
+        self._index: Optional[Dict[Tuple[str, str], int]] = None
+
+    def __len__(self):
+        return len(self.state_column)
+
+    def services_at(self, row: int) -> Dict[str, Dict[str, Any]]:
+        flags = self.flags_column[row]
+        services = {}
+        for bit, service in enumerate(self.services):
+            price = self.price_columns[service][row]
+            services[service] = {
+                "price": None if math.isnan(price) else price,
+                "interpolation_used": bool(flags & (1 << bit)),
+            }
+        return services
+
+    def rows(self) -> Iterator[Tuple[str, str, Dict[str, Dict[str, Any]]]]:
+        """Yields (state, city, services) in the order the rows were written."""
+        for row in range(len(self)):
+            yield self.states[self.state_column[row]], self.cities[self.city_column[row]], self.services_at(row)
+
+    def get(self, state: str, city: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Returns the services dict for one municipality, or None."""
+        if self._index is None:
+            self._index = {
+                (self.states[self.state_column[row]], self.cities[self.city_column[row]]): row
+                for row in range(len(self))
+            }
+        row = self._index.get((state, city))
+        return None if row is None else self.services_at(row)
+
+def read_store(path: str) -> ColumnarStore:
+    """Opens a store file written by ColumnarStoreWriter (packed or Parquet)."""
+    if path.endswith(".parquet"):
+        if pq is None:
+            raise ImportError("Reading .parquet files requires pyarrow (pip install pyarrow)")
+        table = pq.read_table(path)
+        state = table.column("state").combine_chunks()
+        city = table.column("city").combine_chunks()
+        services = [name for name in table.column_names if name not in ("state", "city", "interpolation_flags")]
+        return ColumnarStore(
+            services,
+            state.dictionary.to_pylist(), city.dictionary.to_pylist(),
+            state.indices.to_pylist(), city.indices.to_pylist(),
+            table.column("interpolation_flags").to_pylist(),
+            {service: [math.nan if p is None else p for p in table.column(service).to_pylist()] for service in services},
+        )
+
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a pricing store file")
+        version, header_length = struct.unpack("<II", f.read(8))
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported store format version {version}")
+        header = json.loads(f.read(header_length).decode("utf-8"))
+        rows = header["rows"]
+        state_column = _read_column(f, 'H', rows)
+        city_column = _read_column(f, 'I', rows)
+        flags_column = _read_column(f, 'I', rows)
+        price_columns = {service: _read_column(f, 'd', rows) for service in header["services"]}
+    return ColumnarStore(header["services"], header["states"], header["cities"],
+                         state_column, city_column, flags_column, price_columns)
+
+def export_legacy_json(store_path: str, output_dir: str) -> int:
+    """
+    Writes the legacy one-file-per-municipality layout from a store file.
+    Returns the number of files written.
+    """
+    from data_processor import save_municipality_data
+
+    count = 0
+    for state, city, services in read_store(store_path).rows():
+        data = {"United States": {state: {city: {"services": services}}}}
+        save_municipality_data(data, state, city, output_dir)
+        count += 1
+    return count
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python output_store.py <store_file> <output_dir>")
+        sys.exit(1)
+    written = export_legacy_json(sys.argv[1], sys.argv[2])
+    print(f"Exported {written} municipalities to {sys.argv[2]}")
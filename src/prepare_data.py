@@ -1,6 +1,8 @@
 import csv
 import json
 
+from municipality_catalog import build_catalog, catalog_path_for, read_coordinates
+
 def create_municipalities_json(csv_filepath, json_filepath):
     """
     Reads a CSV file of US cities and creates a JSON file
@@ -27,6 +29,9 @@ def create_municipalities_json(csv_filepath, json_filepath):
     
     print(f"Successfully created {json_filepath} with {len(municipalities)} entries.")
 
+    # Binary catalog with coordinates, shared by the pipelines
+    build_catalog(municipalities, catalog_path_for(json_filepath), read_coordinates(csv_filepath), csv_filepath)
+
 if __name__ == '__main__':
     csv_path = 'data/uscities.csv'
     json_path = 'data/municipalities.json'
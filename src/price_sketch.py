@@ -0,0 +1,284 @@
+import os
+import json
+import random
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Accuracy of the quantile sketches: rank error is roughly 1.7 / SKETCH_K (about 1% at 200)
+SKETCH_K = int(os.environ.get('SKETCH_K', '200'))
+# Prices further than this many scaled MADs from the median are outliers
+MAD_OUTLIER_THRESHOLD = float(os.environ.get('MAD_OUTLIER_THRESHOLD', '3.0'))
+# Scales the MAD to the standard deviation of normally distributed prices
+MAD_SCALE = 1.4826
+# Items kept per level shrink by this factor going down from the top level
+LEVEL_DECAY = 2.0 / 3.0
+
+# Sketches share one generator unless seeded (a Random per sketch would outweigh the sketch)
+_rng = random.Random()
+
+class QuantileSketch:
+    """
+    KLL quantile sketch: a mergeable summary of a stream of numbers whose size stays
+    bounded (a few times k items) however many values are added.
+
+    Level h holds items that each stand for 2**h values. When a level fills up it is
+    sorted and every other item (starting at random) is promoted to the level above, so
+    quantile() answers within about 1.7/k of the true rank. Sketches built on different
+    workers merge into the sketch of the combined stream.
+    """
+
+    __slots__ = ("k", "levels", "count", "size", "max_size", "rng")
+
+    def __init__(self, k: int = SKETCH_K, seed: Optional[int] = None):
+        self.k = k
+        self.levels: List[List[float]] = [[]]
+        self.count = 0
+        self.size = 0
+        self.max_size = self._capacity(0)
+        self.rng = _rng if seed is None else random.Random(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return int(self.k * LEVEL_DECAY ** depth) + 2
+
+    def _grow(self):
+        self.levels.append([])
+        self.max_size = sum(self._capacity(level) for level in range(len(self.levels)))
+
+    def update(self, value: float):
+        self.levels[0].append(float(value))
+        self.count += 1
+        self.size += 1
+        if self.size >= self.max_size:
+            self._compress()
+
+    def _compress(self):
+        while self.size >= self.max_size:
+            # Halve the lowest full level into the one above it
+            level = next(level for level, items in enumerate(self.levels) if len(items) >= self._capacity(level))
+            if level + 1 == len(self.levels):
+                self._grow()
+            items = sorted(self.levels[level])
+            # An odd item out stays behind; every other one of the rest is promoted
+            keep = [items.pop()] if len(items) % 2 else []
+            promoted = items[self.rng.randrange(2)::2]
+            self.levels[level + 1].extend(promoted)
+            self.levels[level] = keep
+            self.size -= len(items) - len(promoted)
+
+    def merge(self, other: "QuantileSketch"):
+        while len(self.levels) < len(other.levels):
+            self._grow()
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.count += other.count
+        self.size += other.size
+        self._compress()
+
+    def weighted(self) -> List[Tuple[float, int]]:
+        """The retained (value, weight) pairs in value order; weights sum to about count."""
+        pairs = [(value, 1 << level) for level, items in enumerate(self.levels) for value in items]
+        pairs.sort()
+        return pairs
+
+    def quantile(self, q: float) -> Optional[float]:
+        return _weighted_quantile(self.weighted(), q)
+
+    def quantiles(self, qs: Iterable[float]) -> List[Optional[float]]:
+        pairs = self.weighted()
+        return [_weighted_quantile(pairs, q) for q in qs]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"k": self.k, "count": self.count, "levels": self.levels}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QuantileSketch":
+        sketch = cls(k=data["k"])
+        for _ in range(len(data["levels"]) - 1):
+            sketch._grow()
+        for level, items in enumerate(data["levels"]):
+            sketch.levels[level] = list(items)
+        sketch.count = data["count"]
+        sketch.size = sum(len(items) for items in sketch.levels)
+        return sketch
+
+def _weighted_quantile(pairs: List[Tuple[float, int]], q: float) -> Optional[float]:
+    if not pairs:
+        return None
+    target = q * sum(weight for _, weight in pairs)
+    seen = 0
+    for value, weight in pairs:
+        seen += weight
+        if seen >= target:
+            return value
+    return pairs[-1][0]
+
+class PriceStats:
+    """
+    Streaming statistics for one service in one group: exact count, mean, min and max,
+    plus a quantile sketch for the median, percentiles and MAD-based outlier bounds.
+    """
+
+    __slots__ = ("count", "total", "low", "high", "sketch")
+
+    def __init__(self, k: int = SKETCH_K):
+        self.count = 0
+        self.total = 0.0
+        self.low: Optional[float] = None
+        self.high: Optional[float] = None
+        self.sketch = QuantileSketch(k)
+
+    def update(self, price: float):
+        price = float(price)
+        self.count += 1
+        self.total += price
+        self.low = price if self.low is None else min(self.low, price)
+        self.high = price if self.high is None else max(self.high, price)
+        self.sketch.update(price)
+
+    def merge(self, other: "PriceStats"):
+        if not other.count:
+            return
+        self.count += other.count
+        self.total += other.total
+        self.low = other.low if self.low is None else min(self.low, other.low)
+        self.high = other.high if self.high is None else max(self.high, other.high)
+        self.sketch.merge(other.sketch)
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def median(self) -> Optional[float]:
+        return self.sketch.quantile(0.5)
+
+    def mad(self) -> Optional[float]:
+        """Median absolute deviation from the median, estimated from the sketch."""
+        pairs = self.sketch.weighted()
+        median = _weighted_quantile(pairs, 0.5)
+        if median is None:
+            return None
+        return _weighted_quantile(sorted((abs(value - median), weight) for value, weight in pairs), 0.5)
+
+    def outlier_bounds(self, threshold: float = MAD_OUTLIER_THRESHOLD) -> Optional[Tuple[float, float]]:
+        """(low, high): prices outside median +/- threshold * scaled MAD are outliers."""
+        median, mad = self.median(), self.mad()
+        if median is None:
+            return None
+        spread = threshold * MAD_SCALE * mad
+        return median - spread, median + spread
+
+    def summary(self) -> Dict[str, Any]:
+        p10, median, p90 = self.sketch.quantiles((0.1, 0.5, 0.9))
+        bounds = self.outlier_bounds()
+        return {
+            "count": self.count,
+            "mean": round(self.mean, 2) if self.count else None,
+            "min": self.low,
+            "p10": p10,
+            "median": median,
+            "p90": p90,
+            "max": self.high,
+            "mad": self.mad(),
+            "outlier_bounds": [round(bound, 2) for bound in bounds] if bounds else None,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"count": self.count, "total": self.total, "min": self.low, "max": self.high,
+                "sketch": self.sketch.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PriceStats":
+        stats = cls()
+        stats.count = data["count"]
+        stats.total = data["total"]
+        stats.low = data["min"]
+        stats.high = data["max"]
+        stats.sketch = QuantileSketch.from_dict(data["sketch"])
+        return stats
+
+class PriceAggregator:
+    """
+    Per-service price statistics rolled up at city, state and national level as prices
+    arrive. Each price updates three groups, and each group keeps a bounded sketch, so
+    memory does not grow with the number of prices.
+
+        aggregator.update("Texas", "Austin", "Drone Video", 350.0)
+        aggregator.summary("Texas")             # {service: {"median": ..., ...}} for the state
+        aggregator.merge(other_worker_aggregator)
+
+    Groups are keyed (state, city); a state rollup is (state, None) and the national
+    rollup (None, None). Safe to share between threads; save()/load() move shards between
+    processes and hosts.
+    """
+
+    def __init__(self, k: int = SKETCH_K):
+        self.k = k
+        self.groups: Dict[Tuple[Optional[str], Optional[str]], Dict[str, PriceStats]] = {}
+        self.lock = threading.Lock()
+
+    def _stats(self, key, service) -> PriceStats:
+        services = self.groups.get(key)
+        if services is None:
+            services = self.groups[key] = {}
+        stats = services.get(service)
+        if stats is None:
+            stats = services[service] = PriceStats(self.k)
+        return stats
+
+    def update(self, state: str, city: str, service: str, price: float):
+        with self.lock:
+            for key in ((state, city), (state, None), (None, None)):
+                self._stats(key, service).update(price)
+
+    def add(self, state: str, city: str, observations: Optional[Dict[str, Dict[str, Any]]]):
+        """Adds one site's prices for a city ({service: {"price": ...}}, as the scrapers return them)."""
+        for service, found in (observations or {}).items():
+            self.update(state, city, service, float(found["price"]))
+
+    def merge(self, other: "PriceAggregator"):
+        with self.lock, other.lock:
+            for key, services in other.groups.items():
+                for service, stats in services.items():
+                    self._stats(key, service).merge(stats)
+
+    def stats(self, state: Optional[str] = None, city: Optional[str] = None) -> Dict[str, PriceStats]:
+        """{service: PriceStats} for a city, a state (city=None) or the whole country (no arguments)."""
+        with self.lock:
+            return dict(self.groups.get((state, city), {}))
+
+    def summary(self, state: Optional[str] = None, city: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        return {service: stats.summary() for service, stats in self.stats(state, city).items()}
+
+    def states(self) -> List[str]:
+        with self.lock:
+            return sorted(state for state, city in self.groups if state is not None and city is None)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"k": self.k, "groups": [
+                {"state": state, "city": city, "services": {svc: stats.to_dict() for svc, stats in services.items()}}
+                for (state, city), services in self.groups.items()
+            ]}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PriceAggregator":
+        aggregator = cls(k=data["k"])
+        for group in data["groups"]:
+            aggregator.groups[(group["state"], group["city"])] = {
+                svc: PriceStats.from_dict(stats) for svc, stats in group["services"].items()
+            }
+        return aggregator
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        payload = json.dumps(self.to_dict(), separators=(",", ":"))
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "PriceAggregator":
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
@@ -0,0 +1,114 @@
+import os
+import json
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+
+# Profiles live in this sub-directory of the output directory, one file per profile
+PROFILE_DIR_NAME = "_profiles"
+
+def profile_id(services: Dict[str, Dict[str, Any]]) -> str:
+    """
+    Content hash of a services payload. Identical prices always get the same id,
+    in any process, so workers can intern profiles without coordinating.
+    """
+    payload = json.dumps(services, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha1(payload).hexdigest()[:16]
+
+class ProfileStore:
+    """
+    Interned pricing profiles.
+
+    Each distinct services payload is kept once in memory and written once to
+    <directory>/<profile_id>.json; municipalities only carry {"profile_id": ...}.
+    resolve() turns such documents back into the full {"services": ...} form.
+    Safe to share between threads; separate processes can share the directory.
+    With directory=None profiles are only kept in memory (e.g. when loaded from MongoDB).
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        self.profiles: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.lock = threading.Lock()
+
+    def path_for(self, pid: str) -> str:
+        return os.path.join(self.directory, f"{pid}.json")
+
+    def intern(self, services: Dict[str, Dict[str, Any]]) -> str:
+        """Stores a services payload (if it is new) and returns its profile id."""
+        pid = profile_id(services)
+        with self.lock:
+            if pid in self.profiles:
+                return pid
+            self.profiles[pid] = json.loads(json.dumps(services))
+
+        if self.directory is None:
+            return pid
+        path = self.path_for(pid)
+        if not os.path.exists(path):
+            os.makedirs(self.directory, exist_ok=True)
+            # Write to a private temp file first so concurrent writers never leave a partial profile
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(services, f, indent=2)
+            os.replace(tmp_path, path)
+        return pid
+
+    def get(self, pid: str) -> Dict[str, Dict[str, Any]]:
+        """The services payload of a profile (shared; copy it before modifying)."""
+        with self.lock:
+            services = self.profiles.get(pid)
+        if services is None:
+            if self.directory is None:
+                raise KeyError(f"Unknown pricing profile {pid}")
+            with open(self.path_for(pid), 'r', encoding='utf-8') as f:
+                services = json.load(f)
+            with self.lock:
+                self.profiles[pid] = services
+        return services
+
+    def load_all(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Every profile in the directory, keyed by id."""
+        if self.directory and os.path.isdir(self.directory):
+            for name in sorted(os.listdir(self.directory)):
+                if name.endswith(".json"):
+                    self.get(name[:-len(".json")])
+        with self.lock:
+            return dict(self.profiles)
+
+    def resolve(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Expands every {"profile_id": ...} city entry of a {"United States": {state: {city: ...}}}
+        document into {"services": ...}. Documents that already have services pass through.
+        """
+        resolved = {}
+        for key, value in document.items():
+            if isinstance(value, dict) and "profile_id" in value:
+                entry = {k: v for k, v in value.items() if k != "profile_id"}
+                entry["services"] = json.loads(json.dumps(self.get(value["profile_id"])))
+                resolved[key] = entry
+            elif isinstance(value, dict):
+                resolved[key] = self.resolve(value)
+            else:
+                resolved[key] = value
+        return resolved
+
+_stores: Dict[str, ProfileStore] = {}
+_stores_lock = threading.Lock()
+
+def get_profile_store(output_dir: str) -> ProfileStore:
+    """The process-wide profile store for an output directory."""
+    directory = os.path.join(output_dir, PROFILE_DIR_NAME)
+    with _stores_lock:
+        if directory not in _stores:
+            _stores[directory] = ProfileStore(directory)
+        return _stores[directory]
+
+def resolve_file(json_path: str, output_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Loads one municipality JSON file with its profiles expanded.
+    Profiles are looked up under `output_dir` (default: two levels above the file).
+    """
+    output_dir = output_dir or os.path.dirname(os.path.dirname(os.path.abspath(json_path)))
+    with open(json_path, 'r', encoding='utf-8') as f:
+        return get_profile_store(output_dir).resolve(json.load(f))
@@ -0,0 +1,129 @@
+import os
+import time
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from metrics import metrics
+
+# How widely one fetch of a provider's prices applies
+SCOPE_NATIONAL = "national"
+SCOPE_STATE = "state"
+SCOPE_METRO = "metro"
+SCOPE_CITY = "city"
+SCOPES = (SCOPE_NATIONAL, SCOPE_STATE, SCOPE_METRO, SCOPE_CITY)
+
+# Memoized provider results are refetched after this many seconds (0 = keep for the whole run)
+PROVIDER_CACHE_TTL = float(os.environ.get('PROVIDER_CACHE_TTL', str(6 * 3600)))
+# A failed fetch is remembered this long, so a provider that is down isn't refetched for
+# every municipality (0 = don't remember failures)
+PROVIDER_FAILURE_TTL = float(os.environ.get('PROVIDER_FAILURE_TTL', '600'))
+
+ServicesFetch = Callable[[str, str], Optional[Dict[str, Dict[str, Any]]]]
+
+class PricingProvider:
+    """
+    A source of service prices and the scope its prices apply to.
+
+    fetch(state, city) returns {service: {"price": ..., "interpolation_used": ...}}, or None
+    on failure. A national provider (one price list for every city, like HomeJab's pricing
+    page) is fetched once per run; state and metro providers once per state / metro area.
+    Metro keys come from the municipality's "metro" field, falling back to the city itself.
+    """
+
+    def __init__(self, name: str, scope: str, fetch: ServicesFetch):
+        if scope not in SCOPES:
+            raise ValueError(f"Unknown scope {scope!r}; expected one of {SCOPES}")
+        self.name = name
+        self.scope = scope
+        self.fetch = fetch
+
+    def scope_key(self, state: str, city: str, metro: Optional[str] = None) -> Tuple[str, ...]:
+        if self.scope == SCOPE_NATIONAL:
+            return (self.name,)
+        if self.scope == SCOPE_STATE:
+            return (self.name, state)
+        if self.scope == SCOPE_METRO and metro:
+            return (self.name, state, "metro", metro)
+        return (self.name, state, city)
+
+class ProviderCache:
+    """
+    Memoizes provider results per scope key, so a national provider costs one fetch
+    (e.g. one browser session) per run instead of one per municipality.
+
+    Entries expire after `ttl` seconds (0 keeps them for the whole run) and can be dropped
+    with invalidate(). Failed fetches (None) are cached for `failure_ttl` seconds, so a
+    provider that is down costs one fetch per failure_ttl, not one per city. Concurrent
+    lookups of the same key wait for the first fetch instead of starting their own. Safe
+    to share between threads; every process of a process pool keeps its own cache.
+    """
+
+    def __init__(self, ttl: float = PROVIDER_CACHE_TTL, failure_ttl: float = PROVIDER_FAILURE_TTL):
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self.entries: Dict[Tuple[str, ...], Tuple[float, Optional[Dict[str, Dict[str, Any]]]]] = {}
+        self.pending: Dict[Tuple[str, ...], threading.Event] = {}
+        self.lock = threading.Lock()
+
+    def _fresh(self, fetched_at: float, services: Optional[Dict[str, Dict[str, Any]]]) -> bool:
+        if services is None:
+            return time.monotonic() - fetched_at < self.failure_ttl
+        return not self.ttl or time.monotonic() - fetched_at < self.ttl
+
+    def get(self, provider: PricingProvider, state: str, city: str,
+            metro: Optional[str] = None) -> Optional[Dict[str, Dict[str, Any]]]:
+        """The provider's prices for a municipality, fetched at most once per scope key."""
+        key = provider.scope_key(state, city, metro)
+        while True:
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry and self._fresh(*entry):
+                    metrics.inc("provider_cache_requests_total", provider=provider.name,
+                                result="hit" if entry[1] is not None else "failed")
+                    return entry[1]
+                event = self.pending.get(key)
+                if event is None:
+                    event = self.pending[key] = threading.Event()
+                    break
+            # Another thread is fetching this scope; wait and re-check
+            event.wait()
+
+        metrics.inc("provider_cache_requests_total", provider=provider.name, result="miss")
+        services = None
+        fetched = False
+        try:
+            with metrics.span("provider_fetch", provider=provider.name):
+                services = provider.fetch(state, city)
+            fetched = True
+            return services
+        finally:
+            with self.lock:
+                # A fetch that raised is not cached; a failed one (None) only if failure_ttl is set
+                if fetched and (services is not None or self.failure_ttl):
+                    self.entries[key] = (time.monotonic(), services)
+                del self.pending[key]
+            event.set()
+
+    def invalidate(self, provider: Optional[PricingProvider] = None, state: Optional[str] = None,
+                   city: Optional[str] = None, metro: Optional[str] = None) -> int:
+        """
+        Drops cached results: everything, one provider's, or (with state/city) the one scope
+        key that municipality maps to. Returns the number of entries dropped.
+        """
+        with self.lock:
+            if provider is None:
+                keys = list(self.entries)
+            elif state is None:
+                keys = [key for key in self.entries if key[0] == provider.name]
+            else:
+                key = provider.scope_key(state, city, metro)
+                keys = [key] if key in self.entries else []
+            for key in keys:
+                del self.entries[key]
+            return len(keys)
+
+_provider_cache = ProviderCache()
+
+def get_provider_cache() -> ProviderCache:
+    """Returns the cache shared by every municipality in the current run."""
+    return _provider_cache
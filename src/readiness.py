@@ -0,0 +1,166 @@
+import time
+import threading
+from typing import Any, Dict, List, Optional
+
+# How often conditions are re-checked while waiting
+DEFAULT_POLL_INTERVAL = 0.1
+
+class ReadinessCondition:
+    """
+    A condition a page has to meet before it is scraped.
+    check() is polled until it returns True or the wait times out.
+    """
+    name = "condition"
+
+    def reset(self):
+        """Clears any state left over from a previous wait."""
+
+    def check(self, driver: Any) -> bool:
+        raise NotImplementedError
+
+class DocumentReady(ReadinessCondition):
+    """document.readyState is 'complete'."""
+    name = "document_ready"
+
+    def check(self, driver: Any) -> bool:
+        return driver.execute_script("return document.readyState") == "complete"
+
+class SelectorPresent(ReadinessCondition):
+    """At least `count` elements match a CSS selector."""
+
+    def __init__(self, selector: str, count: int = 1):
+        self.selector = selector
+        self.count = count
+        self.name = f"selector:{selector}"
+
+    def check(self, driver: Any) -> bool:
+        from selenium.webdriver.common.by import By
+        return len(driver.find_elements(By.CSS_SELECTOR, self.selector)) >= self.count
+
+class TitleExcludes(ReadinessCondition):
+    """The page title no longer contains a marker, e.g. a 'Just a moment...' bot check."""
+
+    def __init__(self, marker: str):
+        self.marker = marker.lower()
+        self.name = f"title_excludes:{marker}"
+
+    def check(self, driver: Any) -> bool:
+        return self.marker not in driver.title.lower()
+
+class _StableFor(ReadinessCondition):
+    """Base for conditions that hold once a probed value stops changing for `stable_ms`."""
+
+    def __init__(self, stable_ms: int = 500):
+        self.stable_ms = stable_ms
+        self.reset()
+
+    def reset(self):
+        self.last_value = None
+        self.stable_since = None
+
+    def probe(self, driver: Any) -> Any:
+        raise NotImplementedError
+
+    def check(self, driver: Any) -> bool:
+        value = self.probe(driver)
+        now = time.monotonic()
+        if value != self.last_value or self.stable_since is None:
+            self.last_value = value
+            self.stable_since = now
+            return False
+        return (now - self.stable_since) * 1000 >= self.stable_ms
+
+class DomStable(_StableFor):
+    """The number of elements and the size of the body stop changing for `stable_ms`."""
+    name = "dom_stable"
+
+    def probe(self, driver: Any) -> Any:
+        return driver.execute_script(
+            "return [document.getElementsByTagName('*').length,"
+            " document.body ? document.body.innerHTML.length : 0]"
+        )
+
+class NetworkIdle(_StableFor):
+    """No new resources (XHR, scripts, images, ...) start loading for `stable_ms`."""
+    name = "network_idle"
+
+    def probe(self, driver: Any) -> Any:
+        return driver.execute_script("return performance.getEntriesByType('resource').length")
+
+class WaitResult:
+    """Outcome of one wait: whether the page got ready and how long it actually took."""
+
+    def __init__(self, label: str, ready: bool, elapsed: float, pending: List[str]):
+        self.label = label
+        self.ready = ready
+        self.elapsed = elapsed
+        self.pending = pending
+
+    def __bool__(self):
+        return self.ready
+
+    def __repr__(self):
+        state = "ready" if self.ready else f"timed out waiting for {', '.join(self.pending)}"
+        return f"<WaitResult {self.label}: {state} after {self.elapsed:.2f}s>"
+
+class WaitRecorder:
+    """Keeps the duration of every wait so per-page latency can be compared with render time."""
+
+    def __init__(self):
+        self.results: List[WaitResult] = []
+        self.lock = threading.Lock()
+
+    def record(self, result: WaitResult):
+        with self.lock:
+            self.results.append(result)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per label: number of waits, timeouts, and mean/max seconds waited."""
+        with self.lock:
+            results = list(self.results)
+        summary = {}
+        for result in results:
+            stats = summary.setdefault(result.label, {"count": 0, "timeouts": 0, "total": 0.0, "max": 0.0})
+            stats["count"] += 1
+            stats["timeouts"] += 0 if result.ready else 1
+            stats["total"] += result.elapsed
+            stats["max"] = max(stats["max"], result.elapsed)
+        for stats in summary.values():
+            stats["mean"] = stats.pop("total") / stats["count"]
+        return summary
+
+wait_recorder = WaitRecorder()
+
+def wait_until_ready(driver: Any, conditions: List[ReadinessCondition], timeout: float = 10.0,
+                     label: str = "page", poll_interval: float = DEFAULT_POLL_INTERVAL,
+                     recorder: Optional[WaitRecorder] = None) -> WaitResult:
+    """
+    Polls until every condition holds or `timeout` seconds pass, whichever comes first.
+    Returns a WaitResult (truthy when ready) and records it in the wait recorder.
+    Errors raised by a condition (e.g. while the page is navigating) count as not ready yet.
+    """
+    for condition in conditions:
+        condition.reset()
+
+    start = time.monotonic()
+    while True:
+        pending = []
+        for condition in conditions:
+            try:
+                if not condition.check(driver):
+                    pending.append(condition.name)
+            except Exception:
+                pending.append(condition.name)
+
+        elapsed = time.monotonic() - start
+        if not pending or elapsed >= timeout:
+            break
+        time.sleep(min(poll_interval, max(0.0, timeout - elapsed)))
+
+    result = WaitResult(label, not pending, time.monotonic() - start, pending)
+    (recorder or wait_recorder).record(result)
+    return result
+
+def page_loaded(stable_ms: int = 500) -> List[ReadinessCondition]:
+    """Default conditions for a page that renders content after the load event."""
+    return [DocumentReady(), DomStable(stable_ms)]
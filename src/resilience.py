@@ -0,0 +1,298 @@
+import os
+import time
+import random
+import asyncio
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Type
+
+from metrics import metrics
+
+# Defaults for the process-wide engine, overridable from the environment
+RETRY_MAX_ATTEMPTS = int(os.environ.get('RETRY_MAX_ATTEMPTS', '3'))
+RETRY_BASE_DELAY = float(os.environ.get('RETRY_BASE_DELAY', '1.0'))
+RETRY_MAX_DELAY = float(os.environ.get('RETRY_MAX_DELAY', '30.0'))
+RETRY_BUDGET_RATIO = float(os.environ.get('RETRY_BUDGET_RATIO', '0.2'))
+RETRY_BUDGET_MIN = int(os.environ.get('RETRY_BUDGET_MIN', '10'))
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', '5'))
+CIRCUIT_RESET_SECONDS = float(os.environ.get('CIRCUIT_RESET_SECONDS', '30'))
+
+# Responses worth retrying: rate limited or a temporary upstream failure
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+# (status, Retry-After header value) for a result; None means the result is a success
+StatusOf = Callable[[Any], Tuple[int, Optional[str]]]
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a host whose circuit breaker is open."""
+
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(f"Circuit open for {host}; retrying in {retry_in:.0f}s")
+        self.host = host
+        self.retry_in = retry_in
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or an HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter: the n-th retry waits a random time between 0 and
+    min(max_delay, base_delay * multiplier ** n). A Retry-After from the server takes
+    precedence (capped at max_retry_after).
+    """
+
+    def __init__(self, max_attempts: int = RETRY_MAX_ATTEMPTS, base_delay: float = RETRY_BASE_DELAY,
+                 max_delay: float = RETRY_MAX_DELAY, multiplier: float = 2.0, max_retry_after: float = 120.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.max_retry_after = max_retry_after
+
+    def delay(self, retry: int, retry_after: Optional[float] = None) -> float:
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        return random.uniform(0, min(self.max_delay, self.base_delay * self.multiplier ** retry))
+
+class CircuitBreaker:
+    """
+    Per-host breaker. After `failure_threshold` consecutive failures the circuit opens and
+    calls fail fast for `reset_timeout` seconds; then one trial call is let through
+    (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, host: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout: float = CIRCUIT_RESET_SECONDS):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    def before_call(self):
+        """Raises CircuitOpenError if the host should not be called right now."""
+        with self.lock:
+            if self.state == self.OPEN:
+                retry_in = self.opened_at + self.reset_timeout - time.monotonic()
+                if retry_in > 0:
+                    metrics.inc("circuit_rejections_total", host=self.host)
+                    raise CircuitOpenError(self.host, retry_in)
+                self.state = self.HALF_OPEN
+                self.trial_in_flight = False
+            if self.state == self.HALF_OPEN:
+                if self.trial_in_flight:
+                    metrics.inc("circuit_rejections_total", host=self.host)
+                    raise CircuitOpenError(self.host, self.reset_timeout)
+                self.trial_in_flight = True
+
+    def release_trial(self):
+        """Ends a half-open trial that neither succeeded nor failed (e.g. it was cancelled)."""
+        with self.lock:
+            self.trial_in_flight = False
+
+    def record_success(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"Circuit opened for {self.host} after {self.failures} failures")
+                    metrics.inc("circuit_opened_total", host=self.host)
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+class RetryBudget:
+    """
+    Caps retries for a whole run at `min_retries` plus `ratio` of all requests made, so a
+    degraded upstream can't multiply the load on it.
+    """
+
+    def __init__(self, ratio: float = RETRY_BUDGET_RATIO, min_retries: int = RETRY_BUDGET_MIN):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.requests = 0
+        self.retries = 0
+        self.lock = threading.Lock()
+
+    def record_request(self):
+        with self.lock:
+            self.requests += 1
+
+    def try_spend(self) -> bool:
+        with self.lock:
+            if self.retries >= self.min_retries + self.ratio * self.requests:
+                return False
+            self.retries += 1
+            return True
+
+class Resilience:
+    """
+    Retries, circuit breakers and the retry budget for outbound calls.
+
+        response = resilience.call("proxy.scrapeops.io", lambda: requests.get(url),
+                                   status_of=requests_status)
+
+    A call is retried when it raises one of `retry_on` or when status_of() reports a
+    retryable status; the last response is returned (or the last error raised) once the
+    attempts or the run's retry budget are used up. Safe to share between threads and
+    usable from asyncio through call_async().
+    """
+
+    def __init__(self, policy: Optional[RetryPolicy] = None, budget: Optional[RetryBudget] = None,
+                 failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_timeout: float = CIRCUIT_RESET_SECONDS):
+        self.policy = policy or RetryPolicy()
+        self.budget = budget or RetryBudget()
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.lock = threading.Lock()
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        with self.lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker(host, self.failure_threshold, self.reset_timeout)
+            return self.breakers[host]
+
+    def _outcome(self, host: str, result: Any, status_of: Optional[StatusOf]) -> Tuple[bool, Optional[float]]:
+        """Records a completed call; returns (should_retry, retry_after_seconds)."""
+        breaker = self.breaker(host)
+        if status_of is None:
+            breaker.record_success()
+            return False, None
+        try:
+            status, retry_after = status_of(result)
+        except BaseException:
+            breaker.release_trial()
+            raise
+        if status in RETRYABLE_STATUSES:
+            breaker.record_failure()
+            return True, parse_retry_after(retry_after)
+        breaker.record_success()
+        return False, None
+
+    def _next_delay(self, host: str, attempt: int, retry_after: Optional[float]) -> Optional[float]:
+        """The wait before the next attempt, or None when the call should give up."""
+        if attempt + 1 >= self.policy.max_attempts or self.breaker(host).state == CircuitBreaker.OPEN:
+            return None
+        if not self.budget.try_spend():
+            metrics.inc("retry_budget_exhausted_total", host=host)
+            return None
+        metrics.inc("retries_total", host=host)
+        return self.policy.delay(attempt, retry_after)
+
+    def call(self, host: str, func: Callable[[], Any], status_of: Optional[StatusOf] = None,
+             retry_on: Tuple[Type[BaseException], ...] = (Exception,)) -> Any:
+        breaker = self.breaker(host)
+        for attempt in range(self.policy.max_attempts):
+            breaker.before_call()
+            self.budget.record_request()
+            try:
+                result = func()
+            except retry_on as e:
+                breaker.record_failure()
+                delay = self._next_delay(host, attempt, None)
+                if delay is None:
+                    raise
+                print(f"{host}: {type(e).__name__}: {e}; retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            except BaseException:
+                # Not retryable (a bug, a cancellation): not held against the host, but it
+                # still ends a half-open trial so a later call can probe the host again
+                breaker.release_trial()
+                raise
+
+            should_retry, retry_after = self._outcome(host, result, status_of)
+            delay = self._next_delay(host, attempt, retry_after) if should_retry else None
+            if delay is None:
+                return result
+            print(f"{host}: status {status_of(result)[0]}; retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+    async def call_async(self, host: str, func: Callable[[], Awaitable[Any]], status_of: Optional[StatusOf] = None,
+                         retry_on: Tuple[Type[BaseException], ...] = (Exception,)) -> Any:
+        """Same as call(), for a coroutine function; waits with asyncio.sleep."""
+        breaker = self.breaker(host)
+        for attempt in range(self.policy.max_attempts):
+            breaker.before_call()
+            self.budget.record_request()
+            try:
+                result = await func()
+            except retry_on as e:
+                breaker.record_failure()
+                delay = self._next_delay(host, attempt, None)
+                if delay is None:
+                    raise
+                print(f"{host}: {type(e).__name__}: {e}; retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Not retryable (a bug, a cancellation): not held against the host, but it
+                # still ends a half-open trial so a later call can probe the host again
+                breaker.release_trial()
+                raise
+
+            should_retry, retry_after = self._outcome(host, result, status_of)
+            delay = self._next_delay(host, attempt, retry_after) if should_retry else None
+            if delay is None:
+                return result
+            print(f"{host}: status {status_of(result)[0]}; retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+def requests_status(response: Any) -> Tuple[int, Optional[str]]:
+    """status_of for requests.Response objects."""
+    return response.status_code, response.headers.get('Retry-After')
+
+def tuple_status(result: Tuple[int, Any, Dict[str, str]]) -> Tuple[int, Optional[str]]:
+    """status_of for (status, body, headers) tuples, as returned by the scrapers' fetch helpers."""
+    status, _, headers = result
+    retry_after = next((value for name, value in (headers or {}).items() if name.lower() == 'retry-after'), None)
+    return status, retry_after
+
+_resilience = None
+_resilience_lock = threading.Lock()
+
+def get_resilience() -> Resilience:
+    """The process-wide engine, so breakers and the retry budget cover the whole run."""
+    global _resilience
+    with _resilience_lock:
+        if _resilience is None:
+            _resilience = Resilience()
+        return _resilience
+
+def configure_resilience(max_attempts: int = RETRY_MAX_ATTEMPTS, base_delay: float = RETRY_BASE_DELAY,
+                         max_delay: float = RETRY_MAX_DELAY, budget_ratio: float = RETRY_BUDGET_RATIO,
+                         budget_min: int = RETRY_BUDGET_MIN, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                         reset_timeout: float = CIRCUIT_RESET_SECONDS) -> Resilience:
+    """Replaces the process-wide engine with one using these settings (e.g. from a config file)."""
+    global _resilience
+    with _resilience_lock:
+        _resilience = Resilience(
+            RetryPolicy(max_attempts=max_attempts, base_delay=base_delay, max_delay=max_delay),
+            RetryBudget(ratio=budget_ratio, min_retries=budget_min),
+            failure_threshold=failure_threshold,
+            reset_timeout=reset_timeout,
+        )
+        return _resilience
@@ -0,0 +1,226 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+STATUS_PENDING = "pending"
+STATUS_LEASED = "leased"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+DEFAULT_VISIBILITY_TIMEOUT = 30 * 60  # seconds a leased job stays invisible to other workers
+DEFAULT_MAX_ATTEMPTS = 3
+# The rollback journal works on a network filesystem shared by several hosts. WAL is faster
+# but only works when every process is on one host (readers share the -shm memory map).
+QUEUE_JOURNAL_MODE = os.environ.get('QUEUE_JOURNAL_MODE', 'DELETE').upper()
+
+class Job:
+    """A leased job. `lease` identifies this lease; it is stale once the job is leased again."""
+    __slots__ = ("id", "key", "payload", "attempts", "lease")
+
+    def __init__(self, id: int, key: str, payload: Any, attempts: int, lease: str):
+        self.id = id
+        self.key = key
+        self.payload = payload
+        self.attempts = attempts
+        self.lease = lease
+
+    def __repr__(self):
+        return f"Job({self.key!r}, attempt {self.attempts})"
+
+class WorkQueue:
+    """
+    Job queue kept in a SQLite file, shared by a coordinator and any number of worker processes.
+
+        queue.enqueue([("TX|Austin", {"state": "TX", "city": "Austin"}), ...])
+        for job in queue.lease("worker-1", count=5):
+            queue.complete(job, result)        # or queue.fail(job, error)
+
+    A leased job is hidden from other workers for `visibility_timeout` seconds; if its worker
+    dies without completing it the lease expires and the job is handed out again. Results of
+    completed jobs are stored with them, so the queue file is also where workers' output is
+    collected for the merge. Every process must open the same file: on one host, or on a
+    shared filesystem with working locks (QUEUE_JOURNAL_MODE=WAL is for one host only).
+    """
+
+    def __init__(self, path: str, visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.lock = threading.Lock()
+        # Transactions are managed explicitly so leases can take the write lock up front
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.execute(f"PRAGMA journal_mode={QUEUE_JOURNAL_MODE}")
+        self.conn.execute("PRAGMA synchronous=" + ("NORMAL" if QUEUE_JOURNAL_MODE == "WAL" else "FULL"))
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " key TEXT NOT NULL UNIQUE,"
+            " payload TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " worker TEXT,"
+            " lease_expires REAL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " result TEXT,"
+            " error TEXT,"
+            " updated_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_expires)")
+
+    def _transaction(self, statements):
+        """Runs statements(cursor) in one write transaction and returns its result."""
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(cursor)
+                cursor.execute("COMMIT")
+                return result
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+
+    def enqueue(self, jobs: Iterable[Tuple[str, Any]]) -> int:
+        """
+        Adds (key, payload) jobs. Existing keys are left alone unless their payload changed,
+        in which case the job is reset to pending. Returns the number of jobs added or reset.
+        """
+        now = time.time()
+        rows = [(key, json.dumps(payload, sort_keys=True), STATUS_PENDING, now) for key, payload in jobs]
+
+        def insert(cursor):
+            before = self.conn.total_changes
+            cursor.executemany(
+                "INSERT INTO jobs (key, payload, status, updated_at) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(key) DO UPDATE SET payload=excluded.payload, status=excluded.status,"
+                " worker=NULL, lease_expires=NULL, attempts=0, result=NULL, error=NULL,"
+                " updated_at=excluded.updated_at"
+                " WHERE jobs.payload != excluded.payload",
+                rows,
+            )
+            return self.conn.total_changes - before
+
+        return self._transaction(insert)
+
+    def lease(self, worker: str, count: int = 1, visibility_timeout: Optional[float] = None) -> List[Job]:
+        """Leases up to `count` pending (or lease-expired) jobs to `worker`."""
+        now = time.time()
+        expires = now + (visibility_timeout or self.visibility_timeout)
+
+        def take(cursor):
+            # Jobs whose last lease expired after max_attempts tries are given up on
+            cursor.execute(
+                "UPDATE jobs SET status=?, error=COALESCE(error, 'lease expired'), worker=NULL, updated_at=?"
+                " WHERE status=? AND lease_expires < ? AND attempts >= ?",
+                (STATUS_FAILED, now, STATUS_LEASED, now, self.max_attempts),
+            )
+            rows = cursor.execute(
+                "SELECT id, key, payload, attempts FROM jobs"
+                " WHERE status=? OR (status=? AND lease_expires < ?)"
+                " ORDER BY id LIMIT ?",
+                (STATUS_PENDING, STATUS_LEASED, now, count),
+            ).fetchall()
+            jobs = []
+            for job_id, key, payload, attempts in rows:
+                cursor.execute(
+                    "UPDATE jobs SET status=?, worker=?, lease_expires=?, attempts=?, updated_at=? WHERE id=?",
+                    (STATUS_LEASED, worker, expires, attempts + 1, now, job_id),
+                )
+                jobs.append(Job(job_id, key, json.loads(payload), attempts + 1, f"{worker}:{attempts + 1}"))
+            return jobs
+
+        return self._transaction(take)
+
+    def _owns(self, cursor, job: Job) -> bool:
+        row = cursor.execute("SELECT status, worker, attempts FROM jobs WHERE id=?", (job.id,)).fetchone()
+        return row is not None and row[0] == STATUS_LEASED and f"{row[1]}:{row[2]}" == job.lease
+
+    def extend(self, job: Job, visibility_timeout: Optional[float] = None) -> bool:
+        """Pushes back the lease expiry of a job still being worked on. False if the lease was lost."""
+        expires = time.time() + (visibility_timeout or self.visibility_timeout)
+
+        def heartbeat(cursor):
+            if not self._owns(cursor, job):
+                return False
+            cursor.execute("UPDATE jobs SET lease_expires=? WHERE id=?", (expires, job.id))
+            return True
+
+        return self._transaction(heartbeat)
+
+    def complete(self, job: Job, result: Any) -> bool:
+        """
+        Stores the result and marks the job done. Returns False (and stores nothing) if the lease
+        expired and the job was handed to another worker in the meantime.
+        """
+        def finish(cursor):
+            if not self._owns(cursor, job):
+                return False
+            cursor.execute(
+                "UPDATE jobs SET status=?, result=?, error=NULL, lease_expires=NULL, updated_at=? WHERE id=?",
+                (STATUS_DONE, json.dumps(result), time.time(), job.id),
+            )
+            return True
+
+        return self._transaction(finish)
+
+    def fail(self, job: Job, error: str) -> bool:
+        """Releases a job that failed: back to pending, or failed once it used up max_attempts."""
+        def release(cursor):
+            if not self._owns(cursor, job):
+                return False
+            status = STATUS_FAILED if job.attempts >= self.max_attempts else STATUS_PENDING
+            cursor.execute(
+                "UPDATE jobs SET status=?, error=?, worker=NULL, lease_expires=NULL, updated_at=? WHERE id=?",
+                (status, error, time.time(), job.id),
+            )
+            return True
+
+        return self._transaction(release)
+
+    def retry_failed(self) -> int:
+        """Puts failed jobs back in the queue with fresh attempts. Returns how many."""
+        def reset(cursor):
+            cursor.execute(
+                "UPDATE jobs SET status=?, attempts=0, updated_at=? WHERE status=?",
+                (STATUS_PENDING, time.time(), STATUS_FAILED),
+            )
+            return cursor.rowcount
+
+        return self._transaction(reset)
+
+    def results(self) -> Iterator[Tuple[str, Any, Any]]:
+        """(key, payload, result) of every completed job."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT key, payload, result FROM jobs WHERE status=? ORDER BY id", (STATUS_DONE,)
+            ).fetchall()
+        for key, payload, result in rows:
+            yield key, json.loads(payload), json.loads(result)
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs per status (expired leases count as pending)."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT CASE WHEN status=? AND lease_expires < ? THEN ? ELSE status END AS s, COUNT(*)"
+                " FROM jobs GROUP BY s",
+                (STATUS_LEASED, time.time(), STATUS_PENDING),
+            ).fetchall()
+        return dict(rows)
+
+    def is_finished(self) -> bool:
+        counts = self.counts()
+        return not counts.get(STATUS_PENDING) and not counts.get(STATUS_LEASED)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The day2 scraper's modules come first; src is appended as day2 itself does
+sys.path.insert(0, os.path.join(ROOT, 'day2(25-6-25)'))
+sys.path.append(os.path.join(ROOT, 'src'))
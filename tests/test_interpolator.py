@@ -0,0 +1,31 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from interpolator import interpolate_missing
+
+
+def frames(states, prices, coords):
+    df = pd.DataFrame({"state": states, "city": [f"City {i}" for i in range(len(prices))], "Photography": prices})
+    coords = pd.DataFrame([(states[i], f"City {i}", lat, lng) for i, (lat, lng) in coords.items()],
+                          columns=["state", "city", "lat", "lng"])
+    return df, coords
+
+
+def test_located_cities_fall_back_to_the_mean_without_located_prices():
+    # The priced cities are in a state with no coordinates at all, so they can't be placed
+    df, coords = frames(["Ohio", "Ohio", "Texas", "Texas"], [100.0, 300.0, np.nan, np.nan],
+                        {2: (30.0, -97.0), 3: (31.0, -96.0)})
+    filled, interpolated = interpolate_missing(df, coords, services=["Photography"], adjustment=1.0)
+    assert filled["Photography"].tolist() == [100.0, 300.0, 200.0, 200.0]
+    assert interpolated["Photography"].tolist() == [False, False, True, True]
+
+
+def test_service_without_any_price_stays_empty():
+    df, coords = frames(["Texas", "Texas"], [np.nan, np.nan], {0: (30.0, -97.0)})
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        filled, interpolated = interpolate_missing(df, coords, services=["Photography"], adjustment=1.0)
+    assert filled["Photography"].isna().all()
+    assert not interpolated["Photography"].any()
@@ -0,0 +1,60 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from config import SERVICES
+from json_writer import StreamingJSONWriter, COUNTRY
+from main import city_records
+
+
+def legacy_master(df, filled, interpolated):
+    """The nested master document as write_output built it before the streaming writer."""
+    master = {COUNTRY: {}}
+    for state, sub in df.groupby("state"):
+        master[COUNTRY][state] = {}
+        for idx, r in sub.iterrows():
+            master[COUNTRY][state][r.city] = {"services": {
+                svc: {"price": None if pd.isna(filled.at[idx, svc]) else float(filled.at[idx, svc]),
+                      "interpolation_used": bool(interpolated.at[idx, svc])}
+                for svc in SERVICES
+            }}
+    return master
+
+
+def sample_frames():
+    # Austin is listed twice with different prices; the last row should win
+    df = pd.DataFrame({"state": ["Texas", "Ohio", "Texas", "Texas"],
+                       "city": ["Austin", "Akron", "Dallas", "Austin"]})
+    values = np.arange(len(df) * len(SERVICES), dtype=float).reshape(len(df), len(SERVICES))
+    values[1, 0] = np.nan
+    filled = pd.concat([df, pd.DataFrame(values, columns=SERVICES)], axis=1)
+    interpolated = pd.concat([df, pd.DataFrame(values > 20, columns=SERVICES)], axis=1)
+    return df, filled, interpolated
+
+
+def test_streaming_output_matches_legacy_write_json(tmp_path):
+    df, filled, interpolated = sample_frames()
+    with StreamingJSONWriter(output_folder=str(tmp_path), by_state=True, complete=True) as writer:
+        for state, city, city_data in city_records(df, filled, interpolated):
+            writer.add(state, city, city_data)
+
+    master = legacy_master(df, filled, interpolated)
+    with open(writer.complete_path(), encoding="utf-8") as f:
+        assert f.read() == json.dumps(master, indent=2)
+    for state, cities in master[COUNTRY].items():
+        with open(writer.state_path(state), encoding="utf-8") as f:
+            assert f.read() == json.dumps({COUNTRY: {state: cities}}, indent=2)
+
+
+def test_repeated_city_is_written_once(tmp_path):
+    df, filled, interpolated = sample_frames()
+    with StreamingJSONWriter(output_folder=str(tmp_path), by_state=False, complete=True, fmt="ndjson") as writer:
+        for state, city, city_data in city_records(df, filled, interpolated):
+            writer.add(state, city, city_data)
+
+    with open(writer.complete_path(), encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert [(r["state"], r["city"]) for r in records] == [("Ohio", "Akron"), ("Texas", "Austin"), ("Texas", "Dallas")]
+    austin = records[1]["services"][SERVICES[0]]["price"]
+    assert austin == filled.at[3, SERVICES[0]]
@@ -0,0 +1,41 @@
+import re
+
+from price_extractor import PriceExtractor
+
+SERVICES = ["Photography", "Drone Video"]
+
+
+def yelp_extractor():
+    # Built as in the root scrapper.py
+    return PriceExtractor({service: [service.lower()] for service in SERVICES},
+                          context_chars=50, min_price=None, max_price=None, after_first=True)
+
+
+def legacy_yelp_prices(text):
+    """The Yelp scraper's regex search before PriceExtractor: forward first, then reversed."""
+    found = {}
+    for service in SERVICES:
+        service_lc = service.lower()
+        matches = re.findall(rf"{service_lc}.{{0,50}}\$\d+(?:\.\d{{1,2}})?", text)
+        if not matches:
+            matches = re.findall(rf"\$\d+(?:\.\d{{1,2}})?.{{0,50}}{service_lc}", text)
+        if matches:
+            found[service] = float(re.search(r"\$\d+(?:\.\d{1,2})?", matches[0]).group()[1:])
+    return found
+
+
+def test_price_after_the_service_name_wins():
+    text = "packages from $199 for photography, or $349 with drone video at $99 extra"
+    assert yelp_extractor().extract_prices(text) == {"Photography": 349.0, "Drone Video": 99.0}
+    assert yelp_extractor().extract_prices(text) == legacy_yelp_prices(text)
+
+
+def test_price_before_the_service_name_is_the_fallback():
+    text = "just $250 for photography. nothing else listed"
+    assert yelp_extractor().extract_prices(text) == {"Photography": 250.0}
+    assert yelp_extractor().extract_prices(text) == legacy_yelp_prices(text)
+
+
+def test_default_extractor_takes_the_first_price_in_the_window():
+    extractor = PriceExtractor({"Photography": ["photography"]}, context_chars=50, min_price=None, max_price=None)
+    assert extractor.extract_prices("from $199 for photography, or $349") == {"Photography": 199.0}